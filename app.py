@@ -1,64 +1,558 @@
 import os
 import json
-from flask import Flask, request, render_template_string, session, redirect, url_for, jsonify
+from flask import Flask, Response, g, request, flash, render_template, send_from_directory, session, redirect, url_for, jsonify, stream_template, stream_with_context
 import gspread
 from google.oauth2.service_account import Credentials
+from google.auth.credentials import AnonymousCredentials
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+import bisect
+import cProfile
+import csv
+import functools
 import hashlib
+import hmac
+import io
+import itertools
+import math
+import pstats
 import sqlite3
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from datetime import datetime
+from markupsafe import Markup
+from werkzeug.security import check_password_hash, generate_password_hash
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'default_secret_key_for_dev')
 
+# --- Templates e Arquivos Estáticos ---
+# Templates são compilados uma vez no boot (sem checar mtime a cada request) e o CSS é
+# servido de /static com URL versionada, então o navegador pode guardá-lo por um ano.
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 31536000
+_versoes_assets = {}
+
+def asset_url(filename):
+    versao = _versoes_assets.get(filename)
+    if versao is None:
+        with open(os.path.join(app.static_folder, filename), 'rb') as f:
+            versao = hashlib.md5(f.read()).hexdigest()[:10]
+        _versoes_assets[filename] = versao
+    return url_for('static', filename=filename, v=versao)
+
+@app.context_processor
+def injetar_asset_url():
+    return {'asset_url': asset_url}
+
+_versao_da_build = []
+
+def versao_da_build():
+    # Identifica o código, os templates e os estáticos em execução (BUILD_ID, se definido no deploy,
+    # ou um hash dos arquivos): entra no ETag das páginas para um deploy não servir 304 antigos
+    if not _versao_da_build:
+        versao = os.getenv('BUILD_ID')
+        if not versao:
+            digest = hashlib.md5()
+            arquivos = [os.path.abspath(__file__)]
+            for pasta in (app.template_folder, app.static_folder):
+                for raiz, _, nomes in os.walk(os.path.join(app.root_path, pasta)):
+                    arquivos.extend(os.path.join(raiz, nome) for nome in nomes)
+            for caminho in sorted(arquivos):
+                with open(caminho, 'rb') as f:
+                    digest.update(f.read())
+            versao = digest.hexdigest()[:10]
+        _versao_da_build.append(versao)
+    return _versao_da_build[0]
+
+def precompilar_templates():
+    nomes = app.jinja_env.list_templates(extensions=['html'])
+    for nome in nomes:
+        app.jinja_env.get_template(nome)
+    log('INFO', f"{len(nomes)} templates pré-compilados (build {versao_da_build()}).")
+
+# --- Logs e Métricas ---
+# Métricas ficam em memória, por processo (cada worker do gunicorn expõe as suas em /metrics,
+# com o pid como label). LOG_FORMAT=json troca as linhas "NIVEL - mensagem" por JSON, uma por linha.
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'texto')
+LOG_REQUESTS = os.getenv('LOG_REQUESTS', '0') == '1'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') # Se definido, /metrics exige ?token= ou Authorization: Bearer
+BUCKETS_REQUEST = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_SQLITE = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5)
+_metricas_lock = threading.Lock()
+_contadores = {}  # (nome, labels) -> valor
+_histogramas = {} # (nome, labels) -> [contagens por bucket, soma, total, buckets]
+
+def log(nivel, mensagem, **campos):
+    if LOG_FORMAT == 'json':
+        print(json.dumps(dict(ts=datetime.now().isoformat(timespec='milliseconds'), nivel=nivel, pid=os.getpid(), msg=mensagem, **campos), ensure_ascii=False, default=str), flush=True)
+    elif campos:
+        print(f"{nivel} - {mensagem} " + ' '.join(f"{k}={v}" for k, v in campos.items()))
+    else:
+        print(f"{nivel} - {mensagem}")
+
+def incrementar(nome, valor=1, **labels):
+    chave = (nome, tuple(sorted(labels.items())))
+    with _metricas_lock:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+def observar(nome, valor, buckets=BUCKETS_REQUEST, **labels):
+    chave = (nome, tuple(sorted(labels.items())))
+    with _metricas_lock:
+        hist = _histogramas.get(chave)
+        if hist is None:
+            hist = _histogramas[chave] = [[0] * len(buckets), 0.0, 0, buckets]
+        for i, limite in enumerate(buckets):
+            if valor <= limite:
+                hist[0][i] += 1
+        hist[1] += valor
+        hist[2] += 1
+
+def _formatar_labels(labels, extra=()):
+    pares = tuple(labels) + (('pid', os.getpid()),) + tuple(extra)
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in pares) + '}'
+
+def _gauges():
+    # Tamanhos e estados lidos na hora da coleta
+    gauges = [
+        ('jgminis_dataset_linhas', {'tabela': 'carros'}, len(carros)),
+        ('jgminis_dataset_linhas', {'tabela': 'usuarios'}, len(usuarios)),
+        ('jgminis_dataset_linhas', {'tabela': 'reservas'}, len(reservas)),
+        ('jgminis_cache_paginas', {}, len(_cache_paginas)),
+        ('jgminis_cache_cards', {}, len(_cache_cards)),
+        ('jgminis_sqlite_conexoes_abertas', {}, pool_status()['conexoes_abertas']),
+        ('jgminis_sheets_conectado', {}, int(sheet is not None)),
+        ('jgminis_sheets_circuito_aberto', {}, int(circuito_sheets['estado'] != 'fechado')),
+    ]
+    for tabela, versao in _versoes_locais.items():
+        gauges.append(('jgminis_cache_versao', {'tabela': tabela}, -1 if versao is None else versao))
+    conn = get_db_connection()
+    try:
+        fila = conn.execute("SELECT COUNT(*), MIN(criado_em) FROM sync_queue").fetchone()
+    finally:
+        liberar_conexao(conn)
+    gauges.append(('jgminis_sync_fila_profundidade', {}, fila[0]))
+    gauges.append(('jgminis_sync_fila_lag_segundos', {}, round(time.time() - fila[1], 3) if fila[1] else 0))
+    return gauges
+
+def metricas_prometheus():
+    linhas = []
+    with _metricas_lock:
+        contadores = sorted(_contadores.items())
+        histogramas = sorted((k, (list(v[0]), v[1], v[2], v[3])) for k, v in _histogramas.items())
+    tipos = set()
+    for (nome, labels), valor in contadores:
+        if nome not in tipos:
+            linhas.append(f"# TYPE {nome} counter")
+            tipos.add(nome)
+        linhas.append(f"{nome}{_formatar_labels(labels)} {valor}")
+    for (nome, labels), (contagens, soma, total, buckets) in histogramas:
+        if nome not in tipos:
+            linhas.append(f"# TYPE {nome} histogram")
+            tipos.add(nome)
+        for limite, contagem in zip(buckets, contagens):
+            linhas.append(f"{nome}_bucket{_formatar_labels(labels, [('le', limite)])} {contagem}")
+        linhas.append(f"{nome}_bucket{_formatar_labels(labels, [('le', '+Inf')])} {total}")
+        linhas.append(f"{nome}_sum{_formatar_labels(labels)} {soma}")
+        linhas.append(f"{nome}_count{_formatar_labels(labels)} {total}")
+    for nome, labels, valor in _gauges():
+        if nome not in tipos:
+            linhas.append(f"# TYPE {nome} gauge")
+            tipos.add(nome)
+        linhas.append(f"{nome}{_formatar_labels(sorted(labels.items()))} {valor}")
+    return '\n'.join(linhas) + '\n'
+
+# Operação e tabela de cada comando SQL, para rotular as métricas (poucos valores possíveis)
+_RE_SQL_TABELA = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+(\w+)', re.IGNORECASE)
+
+class ConexaoInstrumentada(sqlite3.Connection):
+    """Conexão SQLite que mede o tempo de cada execute/executemany/commit."""
+    def _medir(self, metodo, sql, *args):
+        inicio = time.perf_counter()
+        try:
+            return metodo(sql, *args)
+        finally:
+            tabela = _RE_SQL_TABELA.search(sql)
+            observar(
+                'jgminis_sqlite_query_duration_seconds', time.perf_counter() - inicio, buckets=BUCKETS_SQLITE,
+                operacao=sql.split(None, 1)[0].upper(), tabela=tabela.group(1) if tabela else ''
+            )
+
+    def execute(self, sql, *args):
+        return self._medir(super().execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._medir(super().executemany, sql, *args)
+
+    def commit(self):
+        inicio = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            observar('jgminis_sqlite_query_duration_seconds', time.perf_counter() - inicio, buckets=BUCKETS_SQLITE, operacao='COMMIT', tabela='')
+
 # --- Configuração Google Sheets ---
+# O cliente é criado sob demanda, no primeiro uso (worker da fila ou refresh em background),
+# e não no import: um Sheets lento ou fora do ar não atrasa nem derruba o boot dos workers.
 gc = None
 sheet = None
 sheet_id = os.getenv('GOOGLE_SHEET_ID')
+SHEETS_RECONEXAO_INTERVALO = 60 # Segundos entre tentativas de conexão após uma falha
+# Uma sessão HTTP por processo, com conexões keep-alive reaproveitadas entre chamadas (e entre
+# threads/greenlets no modo gthread/gevent, ver gunicorn.conf.py) e timeout para não prender o worker
+SHEETS_HTTP_POOL = int(os.getenv('SHEETS_HTTP_POOL', '4'))
+SHEETS_HTTP_TIMEOUT = float(os.getenv('SHEETS_HTTP_TIMEOUT', '30'))
+# Endereço alternativo da API (ex.: benchmarks/fake_sheets.py); sem credenciais, usa acesso anônimo
+SHEETS_API_URL = os.getenv('SHEETS_API_URL')
+_sheet_conexao_lock = threading.Lock()
+_sheet_falhou_em = None
 
-# Tenta carregar credenciais e autorizar gspread
-try:
+def _sheets_configurado():
+    return sheet is not None or bool(sheet_id and (os.getenv('GOOGLE_CREDENTIALS_JSON') or SHEETS_API_URL))
+
+def _apontar_gspread_para(base_url):
+    # O gspread copia as URLs de gspread.urls para cada módulo no import: troca em todos
+    import gspread.client, gspread.spreadsheet, gspread.urls, gspread.worksheet
+    original = 'https://sheets.googleapis.com/v4/spreadsheets'
+    novo = base_url.rstrip('/') + '/v4/spreadsheets'
+    for modulo in (gspread.urls, gspread.client, gspread.spreadsheet, gspread.worksheet):
+        for nome, valor in list(vars(modulo).items()):
+            if nome.isupper() and isinstance(valor, str) and valor.startswith(original):
+                setattr(modulo, nome, novo + valor[len(original):])
+
+def _conectar_sheets():
+    if SHEETS_API_URL:
+        _apontar_gspread_para(SHEETS_API_URL)
     creds_json_str = os.getenv('GOOGLE_CREDENTIALS_JSON')
     if creds_json_str:
         creds_dict = json.loads(creds_json_str)
-        
+
         # Handling para private_key com newlines escapados
         private_key = creds_dict.get('private_key')
         if private_key:
             creds_dict['private_key'] = private_key.replace('\\n', '\n')
 
         creds = Credentials.from_service_account_info(creds_dict, scopes=['https://www.googleapis.com/auth/spreadsheets'])
-        gc = gspread.authorize(creds)
-        
-        if sheet_id and gc:
-            sheet = gc.open_by_key(sheet_id)
-            print("INFO - gspread: Autenticação e conexão com planilha bem-sucedidas.")
-        else:
-            print("ERROR - gspread: GOOGLE_SHEET_ID ou gc não configurado. Sincronização com Sheets desativada.")
     else:
-        print("ERROR - gspread: GOOGLE_CREDENTIALS_JSON não configurado. Sincronização com Sheets desativada.")
-except Exception as e:
-    print(f"ERROR - Erro na configuração do Google Sheets: {e}. Sincronização com Sheets desativada.")
-    gc = None
-    sheet = None
+        creds = AnonymousCredentials()
+    cliente = gspread.Client(auth=creds, session=_sessao_http_sheets(creds))
+    cliente.set_timeout(SHEETS_HTTP_TIMEOUT)
+    return cliente, cliente.open_by_key(sheet_id)
+
+def _sessao_http_sheets(creds):
+    sessao = AuthorizedSession(creds)
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=SHEETS_HTTP_POOL)
+    sessao.mount('https://', adaptador)
+    sessao.mount('http://', adaptador)
+    return sessao
+
+def get_sheet():
+    """Planilha conectada, autenticando na primeira chamada. None se o Sheets estiver desativado ou fora do ar."""
+    global gc, sheet, _sheet_falhou_em
+    if sheet is not None:
+        return sheet
+    if not _sheets_configurado():
+        return None
+    if _sheet_falhou_em is not None and time.time() - _sheet_falhou_em < SHEETS_RECONEXAO_INTERVALO:
+        return None
+    with _sheet_conexao_lock:
+        if sheet is None:
+            try:
+                gc, sheet = _conectar_sheets()
+                _sheet_falhou_em = None
+                log('INFO', "gspread: Autenticação e conexão com planilha bem-sucedidas.")
+            except Exception as e:
+                _sheet_falhou_em = time.time()
+                log('ERROR', f"Erro na configuração do Google Sheets: {e}. Nova tentativa em {SHEETS_RECONEXAO_INTERVALO}s.")
+    return sheet
 
 # --- Configuração do Banco de Dados SQLite ---
 DATABASE_PATH = os.getenv('DATABASE_PATH', 'jgminis.db')
+# Arquivo onde o antigo reset_users.py gravava a tabela 'usuario' (caminho relativo, como no script)
+DATABASE_LEGADO_PATH = os.getenv('DATABASE_LEGADO_PATH', 'database.db')
 
-# Dados em memória (sincronizados com Sheets ou DB local)
-carros = []
-usuarios = []
-reservas = []
+# Cache em memória dos dados do DB local (o SQLite é a fonte da verdade).
+# Dicionários indexados por id: acesso/remoção em O(1) e iteração na ordem de exibição.
+carros = {}
+usuarios = {}
+reservas = {}
 
 # --- Funções de Manipulação do DB Local ---
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
+# Cada thread do SO (worker sync, threads do gthread e threads de background) mantém uma conexão
+# própria e duradoura, configurada uma única vez e com cache de statements preparados.
+# Os chamadores não fecham a conexão: liberar_conexao() só descarta transações deixadas abertas.
+# O pool é indexado pelo ident nativo da thread, não por threading.local: com gevent, threading.local
+# e threading.get_ident() passam a ser por greenlet e cada request abriria (e configuraria) uma
+# conexão nova. Os greenlets de um worker compartilham a conexão da thread do hub, como as requests
+# de um worker sync: o sqlite3 não cede o hub no meio de uma chamada, e nenhuma transação do app
+# faz I/O cooperativo entre o BEGIN e o commit.
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_CACHED_STATEMENTS = 256
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(64 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '16384'))
+_pool_lock = threading.Lock()
+_pool_conexoes = {} # ident nativo da thread -> {'conn', 'pid', 'caminho', 'thread'}
+pool_stats = {'criadas': 0, 'reusos': 0, 'transacoes_descartadas': 0}
+_get_ident_nativo = []
+
+def _ident_da_thread():
+    if not _get_ident_nativo:
+        monkey = sys.modules.get('gevent.monkey')
+        if monkey is None or not monkey.is_module_patched('threading'):
+            return threading.get_ident() # Sem gevent (ainda): nada a guardar, o patch pode vir depois
+        _get_ident_nativo.append(monkey.get_original('_thread', 'get_ident'))
+    return _get_ident_nativo[0]()
+
+def _podar_conexoes_mortas():
+    # Conexões de threads que já terminaram; sys._current_frames() lista as threads do SO
+    vivas = set(sys._current_frames())
+    with _pool_lock:
+        for ident in [i for i in _pool_conexoes if i not in vivas]:
+            del _pool_conexoes[ident] # Fechada pelo coletor (close() só vale na thread dona)
+
+def _abrir_conexao():
+    conn = sqlite3.connect(DATABASE_PATH, cached_statements=SQLITE_CACHED_STATEMENTS, factory=ConexaoInstrumentada)
     conn.row_factory = sqlite3.Row
+    # Com WAL leitores não esperam escritores; NORMAL é seguro em WAL
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}") # Negativo = KiB
     return conn
 
-def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def _conexao_da_thread():
+    # Conexões não atravessam fork: a herdada do master é ignorada
+    atual = _pool_conexoes.get(_ident_da_thread())
+    return atual if atual is not None and atual['pid'] == os.getpid() else None
+
+def get_db_connection():
+    atual = _conexao_da_thread()
+    # Trocar DATABASE_PATH (testes/benchmarks) abre outra
+    if atual is not None and atual['caminho'] == DATABASE_PATH:
+        pool_stats['reusos'] += 1
+        return atual['conn']
+    if atual is not None:
+        atual['conn'].close()
+    else:
+        _podar_conexoes_mortas()
+    conn = _abrir_conexao()
+    with _pool_lock:
+        pool_stats['criadas'] += 1
+        _pool_conexoes[_ident_da_thread()] = {
+            'conn': conn, 'pid': os.getpid(), 'caminho': DATABASE_PATH, 'thread': threading.current_thread().name
+        }
+    return conn
+
+def liberar_conexao(conn):
+    # Fim do uso pelo chamador: a conexão volta ao pool da thread sem transação pendente
+    if conn.in_transaction:
+        conn.rollback()
+        pool_stats['transacoes_descartadas'] += 1
+
+def fechar_conexao_da_thread():
+    atual = _conexao_da_thread()
+    if atual is not None:
+        atual['conn'].close()
+    with _pool_lock:
+        _pool_conexoes.pop(_ident_da_thread(), None)
+
+def pool_status():
+    _podar_conexoes_mortas()
+    with _pool_lock:
+        threads = sorted(c['thread'] for c in _pool_conexoes.values() if c['pid'] == os.getpid())
+    return dict(
+        pool_stats,
+        conexoes_abertas=len(threads),
+        threads=threads,
+        cached_statements=SQLITE_CACHED_STATEMENTS,
+        mmap_size=SQLITE_MMAP_SIZE,
+        cache_size_kb=SQLITE_CACHE_SIZE_KB
+    )
+
+@app.teardown_appcontext
+def liberar_conexao_do_request(exc):
+    atual = _conexao_da_thread()
+    if atual is not None:
+        liberar_conexao(atual['conn'])
+
+# --- Senhas ---
+# Todas as senhas novas usam scrypt (hashlib.scrypt, no formato do werkzeug.security), com custo
+# ajustável por SENHA_SCRYPT_N. Hashes antigos (SHA-256 sem salt do app e bcrypt do antigo
+# reset_users.py) continuam aceitos e são trocados pelo atual no primeiro login bem-sucedido.
+# O hash é caro de propósito, então roda em um pool limitado por processo (o scrypt libera o
+# GIL): no máximo SENHA_POOL_WORKERS cálculos ao mesmo tempo e SENHA_FILA_MAX logins em
+# andamento; acima disso o login falha na hora em vez de prender as threads de request.
+SENHA_SCRYPT_N = int(os.getenv('SENHA_SCRYPT_N', str(2 ** 14)))
+SENHA_SCRYPT_R = 8
+SENHA_SCRYPT_P = 1
+METODO_SENHA = f'scrypt:{SENHA_SCRYPT_N}:{SENHA_SCRYPT_R}:{SENHA_SCRYPT_P}'
+SENHA_POOL_WORKERS = int(os.getenv('SENHA_POOL_WORKERS', str(os.cpu_count() or 1)))
+SENHA_FILA_MAX = int(os.getenv('SENHA_FILA_MAX', str(SENHA_POOL_WORKERS * 8)))
+SENHA_TIMEOUT = float(os.getenv('SENHA_TIMEOUT', '10')) # Segundos esperando o pool antes de desistir
+BUCKETS_SENHA = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_SHA256_LEGADO = re.compile(r'[0-9a-f]{64}')
+
+try:
+    # Nos requirements: usuários migrados da tabela legada 'usuario' (migrações 3 e 6) mantêm o hash
+    # bcrypt do antigo reset_users.py até o primeiro login
+    import bcrypt
+except ImportError:
+    bcrypt = None
+
+class SenhaOcupada(Exception):
+    """Pool de senhas cheio ou lento demais: o login deve ser tentado de novo em instantes."""
+
+_pool_senhas = {'executor': None, 'pid': None}
+_pool_senhas_lock = threading.Lock()
+_vagas_senhas = threading.BoundedSemaphore(SENHA_FILA_MAX)
+
+def _gevent_ativo():
+    # Com gevent, threads do pool viram greenlets e o scrypt travaria o hub: usa o threadpool nativo dele
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+def _executor_de_senhas():
+    with _pool_senhas_lock:
+        if _pool_senhas['pid'] != os.getpid(): # Executor herdado do master após o fork não tem threads
+            _pool_senhas['executor'] = ThreadPoolExecutor(max_workers=SENHA_POOL_WORKERS, thread_name_prefix='senhas')
+            _pool_senhas['pid'] = os.getpid()
+        return _pool_senhas['executor']
+
+def _no_pool_de_senhas(operacao, func, *args):
+    if not _vagas_senhas.acquire(blocking=False):
+        incrementar('jgminis_senhas_recusadas_total')
+        raise SenhaOcupada('Muitos logins em andamento.')
+    inicio = time.perf_counter()
+    try:
+        if _gevent_ativo():
+            import gevent
+            try:
+                return gevent.get_hub().threadpool.apply(func, args)
+            finally:
+                _vagas_senhas.release()
+        try:
+            futuro = _executor_de_senhas().submit(func, *args)
+        except BaseException:
+            _vagas_senhas.release()
+            raise
+        # A vaga só volta quando o cálculo termina, mesmo se quem pediu desistiu antes
+        futuro.add_done_callback(lambda _: _vagas_senhas.release())
+        try:
+            return futuro.result(timeout=SENHA_TIMEOUT)
+        except FuturesTimeout:
+            incrementar('jgminis_senhas_recusadas_total')
+            raise SenhaOcupada('Pool de senhas não respondeu a tempo.')
+    finally:
+        observar('jgminis_senha_segundos', time.perf_counter() - inicio, buckets=BUCKETS_SENHA, operacao=operacao)
+
+def hash_senha(senha):
+    return generate_password_hash(senha, method=METODO_SENHA)
+
+def _senha_confere(senha, senha_hash):
+    if not senha_hash:
+        return False
+    if senha_hash.startswith('$2'):
+        if bcrypt is None:
+            log('WARNING', "Hash bcrypt de usuário legado sem o pacote bcrypt instalado (veja requirements.txt).")
+            return False
+        return bcrypt.checkpw(senha.encode(), senha_hash.encode())
+    if _SHA256_LEGADO.fullmatch(senha_hash):
+        return hmac.compare_digest(senha_hash, hashlib.sha256(senha.encode()).hexdigest())
+    return check_password_hash(senha_hash, senha)
+
+def verificar_senha(senha, senha_hash):
+    """True se a senha confere com o hash (qualquer formato aceito). Levanta SenhaOcupada com o pool cheio."""
+    return _no_pool_de_senhas('verificar', _senha_confere, senha, senha_hash)
+
+def senha_precisa_rehash(senha_hash):
+    return not (senha_hash or '').startswith(METODO_SENHA + '$')
+
+_hash_ficticio = []
+
+def autenticar(email, senha):
+    """Usuário dono do email se a senha confere, senão None. Troca hashes antigos pelo atual."""
+    usuario = buscar_usuario_por_email(email)
+    if usuario is None:
+        # Mesmo custo de um email existente, para o tempo de resposta não revelar quem tem conta
+        if not _hash_ficticio:
+            _hash_ficticio.append(hash_senha(os.urandom(16).hex()))
+        verificar_senha(senha, _hash_ficticio[0])
+        return None
+    if not verificar_senha(senha, usuario['senha_hash']):
+        return None
+    if senha_precisa_rehash(usuario['senha_hash']):
+        try:
+            db_atualizar_usuario(usuario['id'], {'senha_hash': _no_pool_de_senhas('hash', hash_senha, senha)})
+            incrementar('jgminis_senhas_rehash_total')
+            log('INFO', f"Hash de senha do usuário {usuario['id']} atualizado para {METODO_SENHA}.")
+        except Exception as e: # O login vale mesmo assim; a troca fica para o próximo
+            log('WARNING', f"Não foi possível atualizar o hash de senha do usuário {usuario['id']}: {e}.")
+    return usuario
+
+ADMIN_EMAIL = 'admin@jgminis.com.br'
+
+_hash_admin = []
+
+def hash_admin_padrao():
+    # Calculado só quando o admin padrão vai ser criado, uma vez por processo e sempre antes de abrir
+    # a transação: o scrypt dentro dela seguraria o lock de escrita do SQLite (e as reservas de todos
+    # os workers) por dezenas de ms, e no boot atrasaria cada worker à toa
+    if not _hash_admin:
+        _hash_admin.append(hash_senha('admin123'))
+    return _hash_admin[0]
+
+def _admin_padrao_existe(conn):
+    return conn.execute("SELECT 1 FROM usuarios WHERE email = ?", (ADMIN_EMAIL,)).fetchone() is not None
+
+def _garantir_admin_padrao(cursor, senha_hash):
+    # Adiciona usuário admin padrão se não existir; senha_hash vem de hash_admin_padrao(). Retorna
+    # None se o admin falta e senha_hash também (quem chama calcula o hash fora da transação)
+    cursor.execute("SELECT id FROM usuarios WHERE email = ?", (ADMIN_EMAIL,))
+    if cursor.fetchone() is None:
+        if senha_hash is None:
+            return None
+        cursor.execute(
+            "INSERT INTO usuarios (nome, email, senha_hash, is_admin, data_cadastro) VALUES (?, ?, ?, ?, ?)",
+            ('Admin', ADMIN_EMAIL, senha_hash, 1, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        log('INFO', f"Usuário admin '{ADMIN_EMAIL}' criado no DB local.")
+        return True
+    log('INFO', f"Usuário admin '{ADMIN_EMAIL}' já existe no DB local.")
+    return False
 
+def _criar_admin_padrao_se_faltar(conn):
+    """Cria o admin padrão se ele não existir; o hash só é calculado nesse caso. Retorna se criou."""
+    senha_hash = None if _admin_padrao_existe(conn) else hash_admin_padrao()
+    with conn:
+        criado = _garantir_admin_padrao(conn.cursor(), senha_hash)
+    if criado is None: # Removido por outro processo entre a checagem e a transação
+        return _criar_admin_padrao_se_faltar(conn)
+    return criado
+
+# --- Migrações do Esquema ---
+# A versão do esquema fica em PRAGMA user_version. Cada migração roda uma única vez, na ordem,
+# dentro de uma transação BEGIN IMMEDIATE (workers subindo juntos esperam em vez de duplicar).
+def _colunas(cursor, tabela):
+    return {row[1] for row in cursor.execute(f"PRAGMA table_info({tabela})")}
+
+def _adicionar_coluna(cursor, tabela, coluna, tipo):
+    if coluna in _colunas(cursor, tabela):
+        return False
+    cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+    log('INFO', f"Coluna '{coluna}' adicionada à tabela '{tabela}'.")
+    return True
+
+def _migracao_esquema_base(cursor):
     # Tabela de Usuários
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS usuarios (
@@ -87,12 +581,8 @@ def init_db():
             max_reservas INTEGER
         )
     ''')
-    # Adiciona coluna thumbnail_url se não existir (para compatibilidade)
-    try:
-        cursor.execute("ALTER TABLE carros ADD COLUMN thumbnail_url TEXT")
-        print("INFO - Coluna 'thumbnail_url' adicionada à tabela 'carros'.")
-    except sqlite3.OperationalError:
-        pass # Coluna já existe
+    # DBs anteriores à coluna thumbnail_url
+    _adicionar_coluna(cursor, 'carros', 'thumbnail_url', 'TEXT')
 
     # Tabela de Reservas
     cursor.execute('''
@@ -105,705 +595,2730 @@ def init_db():
             hora_fim TEXT,
             status TEXT,
             observacoes TEXT,
+            criado_em REAL,
             FOREIGN KEY (usuario_id) REFERENCES usuarios (id),
             FOREIGN KEY (carro_id) REFERENCES carros (id)
         )
     ''')
+    # criado_em (epoch) conta o prazo das reservas pendentes; as antigas contam a partir de agora
+    if _adicionar_coluna(cursor, 'reservas', 'criado_em', 'REAL'):
+        cursor.execute("UPDATE reservas SET criado_em = ? WHERE criado_em IS NULL", (time.time(),))
 
-    # Adiciona usuário admin padrão se não existir
-    admin_email = 'admin@jgminis.com.br'
-    admin_senha_hash = hashlib.sha256('admin123'.encode()).hexdigest() # SHA256 de 'admin123'
-    cursor.execute("SELECT id FROM usuarios WHERE email = ?", (admin_email,))
-    if cursor.fetchone() is None:
-        cursor.execute(
-            "INSERT INTO usuarios (nome, email, senha_hash, is_admin, data_cadastro) VALUES (?, ?, ?, ?, ?)",
-            ('Admin', admin_email, admin_senha_hash, 1, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    # Fila durável de alterações pendentes de envio ao Sheets (write-behind)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            aba TEXT NOT NULL,
+            operacao TEXT NOT NULL,
+            registro_id INTEGER,
+            criado_em REAL NOT NULL,
+            tentativas INTEGER DEFAULT 0,
+            proxima_tentativa REAL DEFAULT 0
+        )
+    ''')
+
+    # Último envio bem-sucedido de cada aba e o processo que o fez
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_estado (
+            aba TEXT PRIMARY KEY,
+            ultimo_pid INTEGER,
+            ultimo_flush REAL,
+            ultimo_erro TEXT
         )
-        print(f"INFO - Usuário admin '{admin_email}' criado no DB local.")
+    ''')
+
+    # Estado da última leitura do Sheets (checksum de cada aba), compartilhado entre os workers
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sheets_pull (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            ultimo_pull REAL,
+            ultimo_pid INTEGER,
+            checksums TEXT
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO sheets_pull (id) VALUES (1)")
+
+    # Versão de cada tabela; incrementada a cada alteração para os outros workers recarregarem o cache
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_versao (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.executemany("INSERT OR IGNORE INTO cache_versao (tabela, versao) VALUES (?, 0)", [('carros',), ('usuarios',), ('reservas',)])
+
+def _migracao_indices(cursor):
+    # "Minhas reservas" e limite por usuário
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reservas_usuario ON reservas (usuario_id)")
+    # Reservas ativas de um carro (estoque / max_reservas)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reservas_carro_status ON reservas (carro_id, status)")
+    # Varredura de expiração: só as pendentes mais antigas
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reservas_status_criado_em ON reservas (status, criado_em)")
+    # Filtro do catálogo por marca
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_carros_marca ON carros (marca)")
+    # A busca por email do login já usa o índice implícito do UNIQUE de usuarios.email
+
+def _migracao_usuarios_legados(cursor):
+    # O antigo reset_users.py criava uma tabela 'usuario' (email, senha bcrypt, nome) à parte;
+    # os usuários dela passam para 'usuarios' e a tabela antiga é removida
+    existe = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'usuario'").fetchone()
+    if not existe:
+        return
+    agora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute('''
+        INSERT OR IGNORE INTO usuarios (nome, email, senha_hash, data_cadastro, is_admin)
+        SELECT nome, email, senha, ?, CASE WHEN email = ? THEN 1 ELSE 0 END FROM usuario
+    ''', (agora, ADMIN_EMAIL))
+    log('INFO', f"{cursor.rowcount} usuários migrados da tabela legada 'usuario'.")
+    cursor.execute("DROP TABLE usuario")
+    cursor.execute("UPDATE cache_versao SET versao = versao + 1 WHERE tabela = 'usuarios'")
+
+def _migracao_usuarios_database_db(cursor):
+    # O antigo reset_users.py gravava a tabela 'usuario' em outro arquivo (database.db), que a
+    # migração 3 não enxerga. Lido por uma conexão somente leitura à parte (ATTACH não é permitido
+    # dentro da transação da migração); o arquivo antigo é mantido como está.
+    if not os.path.exists(DATABASE_LEGADO_PATH) or os.path.abspath(DATABASE_LEGADO_PATH) == os.path.abspath(DATABASE_PATH):
+        return
+    legado = sqlite3.connect(f"file:{os.path.abspath(DATABASE_LEGADO_PATH)}?mode=ro", uri=True)
+    try:
+        if not legado.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'usuario'").fetchone():
+            return
+        linhas = legado.execute("SELECT nome, email, senha FROM usuario").fetchall()
+    finally:
+        legado.close()
+    agora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    antes = cursor.execute("SELECT COUNT(*) FROM usuarios").fetchone()[0]
+    cursor.executemany(
+        "INSERT OR IGNORE INTO usuarios (nome, email, senha_hash, data_cadastro, is_admin) VALUES (?, ?, ?, ?, ?)",
+        [(nome, email, senha, agora, int(email == ADMIN_EMAIL)) for nome, email, senha in linhas]
+    )
+    migrados = cursor.execute("SELECT COUNT(*) FROM usuarios").fetchone()[0] - antes
+    log('INFO', f"{migrados} usuários migrados da tabela 'usuario' de '{DATABASE_LEGADO_PATH}'.")
+    if migrados:
+        # Vão também para a planilha; sem isso a próxima leitura do Sheets os removeria
+        enqueue_sync('Usuarios', 'insert', conn=cursor.connection)
+        cursor.execute("UPDATE cache_versao SET versao = versao + 1 WHERE tabela = 'usuarios'")
+
+def _migracao_prontidao(cursor):
+    # sheets_pull.ultimo_pull marca também a reivindicação do refresh; o sucesso fica à parte
+    _adicionar_coluna(cursor, 'sheets_pull', 'ultimo_sucesso', 'REAL')
+    # Linha usada pelo /ready para medir a latência de escrita no DB (hoje ele só testa o lock, sem gravar)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS prontidao (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            verificado_em REAL,
+            ultimo_pid INTEGER
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO prontidao (id) VALUES (1)")
+
+def _migracao_backups(cursor):
+    # Último backup agendado, compartilhado entre os workers (só um faz o backup de cada intervalo)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS backup_estado (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            ultimo_inicio REAL,
+            ultimo_pid INTEGER,
+            ultimo_backup TEXT
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO backup_estado (id) VALUES (1)")
+
+def _migracao_estoque_retido(cursor):
+    # Marca as reservas que de fato baixaram o estoque (feitas por reservar_carro). Só elas devolvem
+    # a unidade ao expirar ou ao ser canceladas; as legadas e as vindas da planilha nunca baixaram.
+    # As existentes não têm como ser distinguidas e ficam sem retenção (nunca inflam o estoque).
+    _adicionar_coluna(cursor, 'reservas', 'estoque_retido', 'INTEGER NOT NULL DEFAULT 0')
+
+MIGRACOES = [
+    (1, 'esquema base', _migracao_esquema_base),
+    (2, 'índices de reservas, carros e expiração', _migracao_indices),
+    (3, "usuários da tabela legada 'usuario'", _migracao_usuarios_legados),
+    (4, 'estado de prontidão (/ready)', _migracao_prontidao),
+    (5, 'estado dos backups agendados', _migracao_backups),
+    (6, f"usuários da tabela legada 'usuario' em {DATABASE_LEGADO_PATH}", _migracao_usuarios_database_db),
+    (7, 'reservas que retêm estoque', _migracao_estoque_retido),
+]
+
+def versao_do_esquema(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def aplicar_migracoes(conn):
+    """Aplica as migrações pendentes. Retorna a lista de versões aplicadas."""
+    aplicadas = []
+    for versao, descricao, migracao in MIGRACOES:
+        if versao_do_esquema(conn) >= versao:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Outro worker pode ter aplicado enquanto esperávamos o lock
+            if versao_do_esquema(conn) < versao:
+                migracao(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {versao}")
+                aplicadas.append(versao)
+                log('INFO', f"Migração {versao} aplicada: {descricao}.")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return aplicadas
+
+def init_db():
+    conn = get_db_connection()
+    try:
+        aplicar_migracoes(conn)
+        _criar_admin_padrao_se_faltar(conn)
+    finally:
+        liberar_conexao(conn)
+    log('INFO', f"DB inicializado com sucesso (esquema v{MIGRACOES[-1][0]}).")
+
+# --- Camada de Acesso a Dados ---
+# O SQLite é a fonte da verdade: toda alteração é comitada no banco (junto com a entrada
+# da fila de sincronização) e só depois aplicada aos dicionários em memória, que são um cache.
+CAMPOS_TABELA = {
+    'carros': ['thumbnail_url', 'modelo', 'marca', 'ano', 'quantidade_disponivel', 'preco_diaria', 'observacoes', 'max_reservas'],
+    'usuarios': ['nome', 'email', 'senha_hash', 'cpf', 'telefone', 'data_cadastro', 'is_admin'],
+    'reservas': ['usuario_id', 'carro_id', 'data_reserva', 'hora_inicio', 'hora_fim', 'status', 'observacoes'],
+}
+ABA_DA_TABELA = {'carros': 'Carros', 'usuarios': 'Usuarios', 'reservas': 'Reservas'}
+# Colunas que só existem no SQLite (não vão para o Sheets) e são preenchidas na criação
+COLUNAS_LOCAIS = {'carros': [], 'usuarios': [], 'reservas': ['criado_em', 'estoque_retido']}
+
+def _valor_local_padrao(coluna, agora):
+    # estoque_retido só é 1 nas reservas criadas por reservar_carro, que baixam o estoque
+    return agora if coluna == 'criado_em' else 0
+
+def _cache_da_tabela(tabela):
+    return {'carros': carros, 'usuarios': usuarios, 'reservas': reservas}[tabela]
+
+# Geração local de cada cache: muda sempre que o conteúdo em memória muda neste processo
+# (índices derivados, como as ordenações do catálogo, usam para saber quando se refazer).
+geracao_cache = {'carros': 0, 'usuarios': 0, 'reservas': 0}
+
+def _tocar_cache(tabela):
+    geracao_cache[tabela] += 1
+
+def _definir_cache(tabela, registros):
+    global carros, usuarios, reservas, usuarios_por_email
+    _tocar_cache(tabela)
+    por_id = {r['id']: r for r in registros}
+    if tabela == 'carros':
+        carros = por_id
+    elif tabela == 'usuarios':
+        usuarios = por_id
+        usuarios_por_email = {u['email']: u for u in por_id.values()}
     else:
-        print(f"INFO - Usuário admin '{admin_email}' já existe no DB local.")
+        reservas = por_id
+    _recalcular_agregados(tabela, por_id.values())
 
-    conn.commit()
-    conn.close()
-    print("INFO - DB inicializado com sucesso.")
+# Índice de usuários por email, mantido junto com `usuarios` (login em O(1))
+usuarios_por_email = {}
 
-# --- Funções de Sincronização com Google Sheets ---
-def load_data_from_sheets():
-    global carros, usuarios, reservas
-    if not sheet:
-        print("WARNING - Cliente gspread não inicializado. Carregando dados apenas do DB local.")
-        return False
+def db_buscar_usuario_por_email(email):
+    # Usa o índice UNIQUE da coluna email
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT * FROM usuarios WHERE email = ?", (email,)).fetchone()
+    finally:
+        liberar_conexao(conn)
+    return dict(row) if row else None
+
+def buscar_usuario_por_email(email):
+    usuario = usuarios_por_email.get(email)
+    if usuario is None:
+        # Cache ainda não viu o usuário (ex.: criado por outro worker neste instante)
+        usuario = db_buscar_usuario_por_email(email)
+    return usuario
+
+def _ler_tabela(conn, tabela):
+    return [dict(row) for row in conn.execute(f"SELECT * FROM {tabela} ORDER BY id")]
+
+# --- Agregados do Painel Admin ---
+# Totais do /admin mantidos junto com os caches: cada alteração desconta a contribuição antiga
+# do registro e soma a nova, sem varrer as listas. Só o reload completo de uma tabela (alterada
+# por outro worker) recalcula a parte dela. O valor do estoque é somado em centavos, para que
+# descontar e somar de novo não acumule erro de ponto flutuante.
+CHAVES_AGREGADOS = {
+    'carros': ('estoque_unidades', 'estoque_valor_centavos'),
+    'usuarios': (),
+    'reservas': ('reservas_por_status', 'reservas_por_carro', 'reservas_ativas_por_carro', 'reservas_ativas_por_usuario'),
+}
+_agregados_lock = threading.Lock()
+
+def _agregados_vazios():
+    return {
+        'estoque_unidades': 0,
+        'estoque_valor_centavos': 0,     # soma de quantidade_disponivel * preco_diaria
+        'reservas_por_status': {},       # status -> quantidade
+        'reservas_por_carro': {},        # carro_id -> quantidade (qualquer status)
+        'reservas_ativas_por_carro': {}, # carro_id -> quantidade (pendente/confirmada)
+        'reservas_ativas_por_usuario': {},
+    }
+
+agregados = _agregados_vazios()
+
+def _como_numero(valor):
+    try:
+        return float(valor or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _somar_em(contagens, chave, delta):
+    total = contagens.get(chave, 0) + delta
+    if total:
+        contagens[chave] = total
+    else:
+        contagens.pop(chave, None)
+
+def _contabilizar_em(destino, tabela, registro, sinal):
+    if tabela == 'carros':
+        quantidade = int(_como_numero(registro.get('quantidade_disponivel')))
+        destino['estoque_unidades'] += sinal * quantidade
+        destino['estoque_valor_centavos'] += sinal * round(quantidade * _como_numero(registro.get('preco_diaria')) * 100)
+    elif tabela == 'reservas':
+        _somar_em(destino['reservas_por_status'], registro.get('status') or '', sinal)
+        _somar_em(destino['reservas_por_carro'], registro.get('carro_id'), sinal)
+        if registro.get('status') in STATUS_RESERVA_ATIVA:
+            _somar_em(destino['reservas_ativas_por_carro'], registro.get('carro_id'), sinal)
+            _somar_em(destino['reservas_ativas_por_usuario'], registro.get('usuario_id'), sinal)
+
+def _contabilizar(tabela, registro, sinal):
+    """Soma (sinal=1) ou desconta (sinal=-1) um registro do cache nos agregados."""
+    if registro is not None:
+        with _agregados_lock:
+            _contabilizar_em(agregados, tabela, registro, sinal)
+
+def _alterar_no_cache(tabela, registro, mudancas):
+    # Alteração no lugar de um registro do cache, refletida nos agregados
+    _contabilizar(tabela, registro, -1)
+    registro.update(mudancas)
+    _contabilizar(tabela, registro, 1)
+
+def _recalcular_agregados(tabela, registros):
+    novos = _agregados_vazios()
+    for registro in registros:
+        _contabilizar_em(novos, tabela, registro, 1)
+    with _agregados_lock:
+        agregados.update({chave: novos[chave] for chave in CHAVES_AGREGADOS[tabela]})
+
+def resumo_admin():
+    """Números do painel admin, lidos dos agregados em tempo constante."""
+    with _agregados_lock:
+        por_status = dict(agregados['reservas_por_status'])
+        unidades = agregados['estoque_unidades']
+        valor_centavos = agregados['estoque_valor_centavos']
+        usuarios_com_reserva = len(agregados['reservas_ativas_por_usuario'])
+        carros_reservados = len(agregados['reservas_ativas_por_carro'])
+    return {
+        'carros': len(carros),
+        'usuarios': len(usuarios),
+        'reservas': len(reservas),
+        'estoque_unidades': unidades,
+        'estoque_valor': valor_centavos / 100,
+        'reservas_por_status': dict(sorted(por_status.items())),
+        'reservas_pendentes': por_status.get('pendente', 0),
+        'reservas_ativas': sum(por_status.get(status, 0) for status in STATUS_RESERVA_ATIVA),
+        'carros_com_reserva_ativa': carros_reservados,
+        'usuarios_com_reserva_ativa': usuarios_com_reserva,
+    }
+
+def pagina_da_tabela(tabela, pagina, por_pagina):
+    """Uma página dos registros em cache, na ordem de exibição (id), no formato de consultar_catalogo."""
+    cache = _cache_da_tabela(tabela)
+    total = len(cache)
+    paginas = max(1, -(-total // por_pagina))
+    pagina = min(max(1, pagina), paginas)
+    inicio = (pagina - 1) * por_pagina
+    return {
+        'itens': list(itertools.islice(cache.values(), inicio, inicio + por_pagina)),
+        'total': total,
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'paginas': paginas,
+    }
+
+# --- Coerência do Cache entre Workers ---
+# Cada processo do gunicorn tem sua cópia das listas. A tabela cache_versao guarda um contador
+# por tabela; a cada request o worker compara com as versões que carregou e recarrega só o que mudou.
+_versoes_locais = {}
+_cache_lock = threading.RLock() # Alterações locais seguram o lock também ao marcar a versão
+
+def _incrementar_versao(conn, tabela):
+    conn.execute("UPDATE cache_versao SET versao = versao + 1 WHERE tabela = ?", (tabela,))
+    return conn.execute("SELECT versao FROM cache_versao WHERE tabela = ?", (tabela,)).fetchone()['versao']
+
+def _marcar_versao(tabela, nova_versao):
+    # O cache só fica em dia se estava exatamente na versão anterior à nossa alteração;
+    # caso contrário outro worker alterou a tabela no meio e o próximo request recarrega.
+    # Quem chama aplica a alteração ao dicionário e marca a versão sob _cache_lock: senão um
+    # reload com snapshot anterior à escrita pode trocar o dicionário entre os dois passos.
+    with _cache_lock:
+        if _versoes_locais.get(tabela) == nova_versao - 1:
+            _versoes_locais[tabela] = nova_versao
+        else:
+            # Conteúdo local não corresponde a nenhuma versão conhecida: força reload e
+            # impede que páginas sejam cacheadas com esse carimbo até lá
+            _versoes_locais[tabela] = None
+
+def _recarregar_tabelas(tabelas=None):
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN") # Lê versões e dados no mesmo snapshot
+        versoes = {row['tabela']: row['versao'] for row in conn.execute("SELECT tabela, versao FROM cache_versao")}
+        for tabela in (tabelas or CAMPOS_TABELA):
+            _definir_cache(tabela, _ler_tabela(conn, tabela))
+            _versoes_locais[tabela] = versoes.get(tabela, 0)
+        conn.rollback()
+    finally:
+        liberar_conexao(conn)
+
+def verificar_cache():
+    """Recarrega do SQLite apenas as tabelas alteradas por outros workers. Retorna as recarregadas."""
+    conn = get_db_connection()
+    try:
+        versoes = {row['tabela']: row['versao'] for row in conn.execute("SELECT tabela, versao FROM cache_versao")}
+    finally:
+        liberar_conexao(conn)
+    desatualizadas = [t for t, v in versoes.items() if _versoes_locais.get(t) != v]
+    if not desatualizadas:
+        return []
+    with _cache_lock:
+        desatualizadas = [t for t in desatualizadas if _versoes_locais.get(t) != versoes[t]]
+        if desatualizadas:
+            _recarregar_tabelas(desatualizadas)
+    return desatualizadas
+
+def carregar_dados_do_db():
+    with _cache_lock:
+        _recarregar_tabelas()
+    log('INFO', f"Dados carregados do DB local: {len(carros)} carros, {len(usuarios)} usuários, {len(reservas)} reservas.")
+
+def _db_inserir(tabela, dados):
+    campos = CAMPOS_TABELA[tabela] + COLUNAS_LOCAIS[tabela]
+    registro = {campo: dados.get(campo) for campo in campos}
+    agora = time.time()
+    for coluna in COLUNAS_LOCAIS[tabela]:
+        if registro[coluna] is None:
+            registro[coluna] = _valor_local_padrao(coluna, agora)
+    conn = get_db_connection()
+    try:
+        with conn:
+            cursor = conn.execute(
+                f"INSERT INTO {tabela} ({', '.join(campos)}) VALUES ({', '.join('?' for _ in campos)})",
+                [registro[campo] for campo in campos]
+            )
+            registro['id'] = cursor.lastrowid
+            enqueue_sync(ABA_DA_TABELA[tabela], 'insert', registro['id'], conn=conn)
+            versao = _incrementar_versao(conn, tabela)
+    finally:
+        liberar_conexao(conn)
+    # Ids do AUTOINCREMENT são crescentes, então o novo registro entra no fim da ordem de exibição
+    with _cache_lock:
+        _cache_da_tabela(tabela)[registro['id']] = registro
+        _contabilizar(tabela, registro, 1)
+        _tocar_cache(tabela)
+        if tabela == 'usuarios':
+            usuarios_por_email[registro['email']] = registro
+        _marcar_versao(tabela, versao)
+    return registro
+
+def _db_atualizar(tabela, registro_id, dados):
+    campos = [campo for campo in CAMPOS_TABELA[tabela] if campo in dados]
+    conn = get_db_connection()
+    try:
+        with conn:
+            cursor = conn.execute(
+                f"UPDATE {tabela} SET {', '.join(f'{campo} = ?' for campo in campos)} WHERE id = ?",
+                [dados[campo] for campo in campos] + [registro_id]
+            )
+            if cursor.rowcount == 0:
+                return None
+            enqueue_sync(ABA_DA_TABELA[tabela], 'update', registro_id, conn=conn)
+            versao = _incrementar_versao(conn, tabela)
+    finally:
+        liberar_conexao(conn)
+    with _cache_lock:
+        registro = _cache_da_tabela(tabela).get(registro_id)
+        if registro is not None:
+            email_anterior = registro.get('email')
+            _alterar_no_cache(tabela, registro, {campo: dados[campo] for campo in campos})
+            _tocar_cache(tabela)
+            if tabela == 'usuarios' and registro['email'] != email_anterior:
+                usuarios_por_email.pop(email_anterior, None)
+                usuarios_por_email[registro['email']] = registro
+        _marcar_versao(tabela, versao)
+    return registro
+
+def _db_remover(tabela, registro_id):
+    conn = get_db_connection()
+    try:
+        with conn:
+            cursor = conn.execute(f"DELETE FROM {tabela} WHERE id = ?", (registro_id,))
+            if cursor.rowcount == 0:
+                return False
+            enqueue_sync(ABA_DA_TABELA[tabela], 'delete', registro_id, conn=conn)
+            versao = _incrementar_versao(conn, tabela)
+    finally:
+        liberar_conexao(conn)
+    with _cache_lock:
+        registro = _cache_da_tabela(tabela).pop(registro_id, None)
+        _contabilizar(tabela, registro, -1)
+        _tocar_cache(tabela)
+        if tabela == 'usuarios' and registro is not None:
+            usuarios_por_email.pop(registro['email'], None)
+        _marcar_versao(tabela, versao)
+    return True
+
+def db_inserir_carro(dados):
+    return _db_inserir('carros', dados)
+
+def db_atualizar_carro(carro_id, dados):
+    return _db_atualizar('carros', carro_id, dados)
+
+def db_remover_carro(carro_id):
+    return _db_remover('carros', carro_id)
+
+def db_inserir_usuario(dados):
+    return _db_inserir('usuarios', dados)
+
+def db_atualizar_usuario(usuario_id, dados):
+    return _db_atualizar('usuarios', usuario_id, dados)
+
+def db_remover_usuario(usuario_id):
+    return _db_remover('usuarios', usuario_id)
+
+def db_inserir_reserva(dados):
+    return _db_inserir('reservas', dados)
+
+def db_atualizar_reserva(reserva_id, dados):
+    return _db_atualizar('reservas', reserva_id, dados)
 
+def db_remover_reserva(reserva_id):
+    return _db_remover('reservas', reserva_id)
+
+def db_mesclar_tabela(tabela, registros, versao_lida=None):
+    """
+    Aplica ao DB e ao cache apenas as linhas vindas do Sheets que diferem das atuais (e remove
+    as que sumiram da planilha), em uma única transação. Retorna quantas linhas mudaram.
+    Com `versao_lida` (cache_versao da tabela antes de baixar a planilha), não grava nada e
+    retorna None se a tabela foi alterada desde então: a leitura é mais velha que o DB.
+    """
+    cache = _cache_da_tabela(tabela)
+    ids_planilha = {r['id'] for r in registros}
+    campos = ['id'] + CAMPOS_TABELA[tabela]
+    alterados = [
+        r for r in registros
+        if r['id'] not in cache or any(cache[r['id']].get(campo) != r.get(campo) for campo in campos)
+    ]
+    removidos = [
+        registro_id for registro_id, atual in list(cache.items())
+        if registro_id not in ids_planilha
+        # O admin padrão é garantido pelo DB mesmo que não esteja na planilha
+        and not (tabela == 'usuarios' and atual.get('email') == ADMIN_EMAIL)
+    ]
+    if not alterados and not removidos:
+        return 0
+
+    agora = time.time()
+    locais = COLUNAS_LOCAIS[tabela]
+    if tabela == 'usuarios':
+        # REPLACE resolve também conflitos no UNIQUE do email
+        sql = f"INSERT OR REPLACE INTO {tabela} ({', '.join(campos)}) VALUES ({', '.join('?' for _ in campos)})"
+    else:
+        # Upsert preserva as colunas locais (ex.: criado_em) das linhas que já existem
+        sql = (
+            f"INSERT INTO {tabela} ({', '.join(campos + locais)}) VALUES ({', '.join('?' for _ in campos + locais)}) "
+            f"ON CONFLICT (id) DO UPDATE SET {', '.join(f'{campo} = excluded.{campo}' for campo in campos[1:])}"
+        )
+    senha_admin = None
+    if tabela == 'usuarios':
+        # O admin padrão só some se ainda não existe ou se uma linha da planilha com o id dele o
+        # substituir; só então o hash é calculado (fora da transação)
+        admin = usuarios_por_email.get(ADMIN_EMAIL)
+        if admin is None or any(r['id'] == admin['id'] and r.get('email') != ADMIN_EMAIL for r in alterados):
+            senha_admin = hash_admin_padrao()
+    conn = get_db_connection()
+    try:
+        while True:
+            conn.execute("BEGIN IMMEDIATE") # Checagem da versão e gravação sem outra escrita no meio
+            try:
+                if versao_lida is not None:
+                    versao_atual = conn.execute("SELECT versao FROM cache_versao WHERE tabela = ?", (tabela,)).fetchone()['versao']
+                    if versao_atual != versao_lida:
+                        conn.rollback()
+                        return None
+                conn.executemany(sql, [[r.get(campo) for campo in campos] + [_valor_local_padrao(coluna, agora) for coluna in locais] for r in alterados])
+                conn.executemany(f"DELETE FROM {tabela} WHERE id = ?", [(registro_id,) for registro_id in removidos])
+                # Uma linha da planilha com o mesmo id pode ter substituído o admin padrão: recria e envia
+                if tabela == 'usuarios':
+                    criado = _garantir_admin_padrao(conn.cursor(), senha_admin)
+                    if criado is None: # O cache não previa a falta do admin: hash fora da transação e refaz
+                        conn.rollback()
+                        senha_admin = hash_admin_padrao()
+                        continue
+                    if criado:
+                        enqueue_sync('Usuarios', 'insert', conn=conn)
+                versao = _incrementar_versao(conn, tabela)
+                conn.commit()
+                break
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        liberar_conexao(conn)
+
+    if tabela == 'usuarios':
+        # INSERT OR REPLACE pode ter removido outro usuário com o mesmo email: relê a tabela
+        with _cache_lock:
+            _recarregar_tabelas(['usuarios'])
+        return len(alterados) + len(removidos)
+    with _cache_lock:
+        cache = _cache_da_tabela(tabela) # Um reload pode ter trocado o dicionário durante a transação
+        for registro in alterados:
+            atual = cache.get(registro['id'])
+            if atual is not None:
+                _alterar_no_cache(tabela, atual, registro)
+            else:
+                cache[registro['id']] = dict(registro, **{coluna: _valor_local_padrao(coluna, agora) for coluna in locais})
+                _contabilizar(tabela, cache[registro['id']], 1)
+        for registro_id in removidos:
+            _contabilizar(tabela, cache.pop(registro_id, None), -1)
+        _tocar_cache(tabela)
+        _marcar_versao(tabela, versao)
+    return len(alterados) + len(removidos)
+
+# --- Reservas ---
+# Checagem de estoque, limite por usuário e baixa do estoque acontecem em uma única transação
+# BEGIN IMMEDIATE: o SQLite serializa os compradores de todos os workers no lock de escrita do
+# arquivo (curto, só duas instruções), sem lock global em Python e sem vender além do estoque.
+STATUS_RESERVA_ATIVA = ('pendente', 'confirmada')
+RESERVA_BUSY_TIMEOUT_MS = int(os.getenv('RESERVA_BUSY_TIMEOUT_MS', '15000'))
+
+def _conexao_de_reserva():
+    conn = get_db_connection()
+    conn.execute(f"PRAGMA busy_timeout = {RESERVA_BUSY_TIMEOUT_MS}") # Fila de compradores em um drop
+    return conn
+
+def _liberar_conexao_de_reserva(conn):
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    liberar_conexao(conn)
+
+def _aplicar_reserva_no_cache(reserva, carro_id, quantidade_disponivel, versoes):
+    with _cache_lock:
+        carro = carros.get(carro_id)
+        if carro is not None and quantidade_disponivel is not None:
+            _alterar_no_cache('carros', carro, {'quantidade_disponivel': quantidade_disponivel})
+            _tocar_cache('carros')
+        _contabilizar('reservas', reservas.get(reserva['id']), -1)
+        reservas[reserva['id']] = reserva
+        _contabilizar('reservas', reserva, 1)
+        _tocar_cache('reservas')
+        _marcar_versao('carros', versoes['carros'])
+        _marcar_versao('reservas', versoes['reservas'])
+
+def reservar_carro(usuario_id, carro_id, observacoes=''):
+    """
+    Cria uma reserva pendente e baixa uma unidade do estoque do carro. Levanta ValueError com o
+    motivo quando o carro não existe, está esgotado ou o usuário já atingiu `max_reservas`.
+    """
+    agora = datetime.now()
+    placeholders = ', '.join('?' for _ in STATUS_RESERVA_ATIVA)
+    conn = _conexao_de_reserva()
     try:
-        # Carregar aba 'Carros'
+        conn.execute("BEGIN IMMEDIATE")
         try:
-            carros_sheet = sheet.worksheet('Carros')
-        except gspread.WorksheetNotFound:
-            print("WARNING - Aba 'Carros' não encontrada. Criando nova aba 'Carros'.")
-            carros_sheet = sheet.add_worksheet('Carros', rows=1000, cols=10)
-            carros_sheet.append_row(['ID', 'IMAGEM', 'NOME DA MINIATURA', 'MARCA/FABRICANTE', 'PREVISÃO DE CHEGADA', 'QUANTIDADE DISPONIVEL', 'VALOR', 'OBSERVAÇÕES', 'MAX_RESERVAS_POR_USUARIO'])
-            carros_sheet.format('A1:I1', {'textFormat': {'bold': True}}) # Formata cabeçalho
-            print("INFO - Aba 'Carros' criada com cabeçalhos padrão.")
-            return False # Recarregar após criação
-
-        data_carros = carros_sheet.get_all_records()
-        carros_temp = []
-        for i, row in enumerate(data_carros):
-            # Mapeamento exato das colunas da planilha do usuário
-            carro = {
-                'id': int(row.get('ID', i + 1)), # Gera ID se não existir
-                'thumbnail_url': row.get('IMAGEM', ''),
-                'modelo': row.get('NOME DA MINIATURA', ''),
-                'marca': row.get('MARCA/FABRICANTE', ''),
-                'ano': row.get('PREVISÃO DE CHEGADA', ''),
-                'quantidade_disponivel': int(row.get('QUANTIDADE DISPONIVEL', 0)),
-                'preco_diaria': float(row.get('VALOR', 0.0)),
-                'observacoes': row.get('OBSERVAÇÕES', ''),
-                'max_reservas': int(row.get('MAX_RESERVAS_POR_USUARIO', 1))
+            # Baixa condicional: só acontece se houver estoque e o limite do usuário permitir
+            cursor = conn.execute(f'''
+                UPDATE carros SET quantidade_disponivel = quantidade_disponivel - 1
+                WHERE id = ? AND quantidade_disponivel > 0
+                  AND (SELECT COUNT(*) FROM reservas
+                       WHERE usuario_id = ? AND carro_id = carros.id AND status IN ({placeholders})
+                      ) < COALESCE(max_reservas, 1)
+            ''', (carro_id, usuario_id, *STATUS_RESERVA_ATIVA))
+            if cursor.rowcount == 0:
+                carro = conn.execute("SELECT quantidade_disponivel FROM carros WHERE id = ?", (carro_id,)).fetchone()
+                if carro is None:
+                    raise ValueError("Miniatura não encontrada.")
+                if (carro['quantidade_disponivel'] or 0) <= 0:
+                    raise ValueError("Miniatura esgotada.")
+                raise ValueError("Você já atingiu o limite de reservas para esta miniatura.")
+
+            reserva = {
+                'usuario_id': usuario_id,
+                'carro_id': carro_id,
+                'data_reserva': agora.strftime('%Y-%m-%d'),
+                'hora_inicio': agora.strftime('%H:%M:%S'),
+                'hora_fim': '',
+                'status': 'pendente',
+                'observacoes': observacoes,
+                'criado_em': time.time(),
+                'estoque_retido': 1
             }
-            carros_temp.append(carro)
-        carros = carros_temp
-        print(f"INFO - Dados carregados da planilha 'Carros': {len(carros)} itens.")
+            campos = CAMPOS_TABELA['reservas'] + COLUNAS_LOCAIS['reservas']
+            cursor = conn.execute(
+                f"INSERT INTO reservas ({', '.join(campos)}) VALUES ({', '.join('?' for _ in campos)})",
+                [reserva[campo] for campo in campos]
+            )
+            reserva['id'] = cursor.lastrowid
+            quantidade = conn.execute("SELECT quantidade_disponivel FROM carros WHERE id = ?", (carro_id,)).fetchone()[0]
+            enqueue_sync('Carros', 'update', carro_id, conn=conn)
+            enqueue_sync('Reservas', 'insert', reserva['id'], conn=conn)
+            versoes = {tabela: _incrementar_versao(conn, tabela) for tabela in ('carros', 'reservas')}
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        _liberar_conexao_de_reserva(conn)
+    _aplicar_reserva_no_cache(reserva, carro_id, quantidade, versoes)
+    log('INFO', f"Reserva {reserva['id']} criada: usuário {usuario_id}, carro {carro_id} ({quantidade} restantes).")
+    return reserva
 
-        # Carregar aba 'Usuarios'
+def cancelar_reserva_ativa(reserva_id, usuario_id=None):
+    """
+    Cancela uma reserva ativa e, se ela retinha estoque, devolve a unidade na mesma transação. Com
+    `usuario_id`, só cancela reservas desse usuário. Retorna a reserva cancelada ou None.
+    """
+    placeholders = ', '.join('?' for _ in STATUS_RESERVA_ATIVA)
+    filtro_usuario = " AND usuario_id = ?" if usuario_id is not None else ""
+    parametros = (reserva_id, *STATUS_RESERVA_ATIVA) + ((usuario_id,) if usuario_id is not None else ())
+    conn = _conexao_de_reserva()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
         try:
-            usuarios_sheet = sheet.worksheet('Usuarios')
-        except gspread.WorksheetNotFound:
-            print("WARNING - Aba 'Usuarios' não encontrada. Criando nova aba 'Usuarios'.")
-            usuarios_sheet = sheet.add_worksheet('Usuarios', rows=100, cols=8)
-            usuarios_sheet.append_row(['ID', 'Nome', 'Email', 'Senha_hash', 'CPF', 'Telefone', 'Data_Cadastro', 'Is_Admin'])
-            usuarios_sheet.format('A1:H1', {'textFormat': {'bold': True}})
-            print("INFO - Aba 'Usuarios' criada com cabeçalhos padrão.")
-            return False # Recarregar após criação
-
-        data_usuarios = usuarios_sheet.get_all_records()
-        usuarios_temp = []
-        for i, row in enumerate(data_usuarios):
-            usuario = {
-                'id': int(row.get('ID', i + 1)),
-                'nome': row.get('Nome', ''),
-                'email': row.get('Email', ''),
-                'senha_hash': row.get('Senha_hash', ''),
-                'cpf': row.get('CPF', ''),
-                'telefone': row.get('Telefone', ''),
-                'data_cadastro': row.get('Data_Cadastro', ''),
-                'is_admin': int(row.get('Is_Admin', 0))
-            }
-            usuarios_temp.append(usuario)
-        usuarios = usuarios_temp
-        print(f"INFO - Dados carregados da planilha 'Usuarios': {len(usuarios)} itens.")
+            row = conn.execute(
+                f"SELECT * FROM reservas WHERE id = ? AND status IN ({placeholders}){filtro_usuario}", parametros
+            ).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            reserva = dict(row)
+            conn.execute("UPDATE reservas SET status = 'cancelada', estoque_retido = 0 WHERE id = ?", (reserva_id,))
+            carro = None
+            if reserva['estoque_retido']:
+                conn.execute(
+                    "UPDATE carros SET quantidade_disponivel = quantidade_disponivel + 1 WHERE id = ?", (reserva['carro_id'],)
+                )
+                carro = conn.execute("SELECT quantidade_disponivel FROM carros WHERE id = ?", (reserva['carro_id'],)).fetchone()
+            enqueue_sync('Reservas', 'update', reserva_id, conn=conn)
+            if carro is not None:
+                enqueue_sync('Carros', 'update', reserva['carro_id'], conn=conn)
+            versoes = {tabela: _incrementar_versao(conn, tabela) for tabela in ('carros', 'reservas')}
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        _liberar_conexao_de_reserva(conn)
+    devolvido = bool(reserva['estoque_retido'])
+    reserva.update(status='cancelada', estoque_retido=0)
+    _aplicar_reserva_no_cache(reserva, reserva['carro_id'], carro[0] if carro is not None else None, versoes)
+    if devolvido:
+        log('INFO', f"Reserva {reserva_id} cancelada; estoque do carro {reserva['carro_id']} devolvido.")
+    else:
+        log('INFO', f"Reserva {reserva_id} cancelada (não retinha estoque).")
+    return reserva
+
+def confirmar_reserva_pendente(reserva_id):
+    """
+    Confirma uma reserva pendente: a unidade continua baixada e a varredura de expiração deixa de
+    considerá-la. Retorna a reserva confirmada ou None se ela não estava pendente.
+    """
+    conn = _conexao_de_reserva()
+    try:
+        with conn:
+            # Condicional no status: não confirma uma reserva que a varredura acabou de expirar
+            cursor = conn.execute("UPDATE reservas SET status = 'confirmada' WHERE id = ? AND status = 'pendente'", (reserva_id,))
+            if cursor.rowcount == 0:
+                return None
+            reserva = dict(conn.execute("SELECT * FROM reservas WHERE id = ?", (reserva_id,)).fetchone())
+            enqueue_sync('Reservas', 'update', reserva_id, conn=conn)
+            versao = _incrementar_versao(conn, 'reservas')
+    finally:
+        _liberar_conexao_de_reserva(conn)
+    with _cache_lock:
+        _contabilizar('reservas', reservas.get(reserva_id), -1)
+        reservas[reserva_id] = reserva
+        _contabilizar('reservas', reserva, 1)
+        _tocar_cache('reservas')
+        _marcar_versao('reservas', versao)
+    log('INFO', f"Reserva {reserva_id} confirmada.")
+    return reserva
 
-        # Carregar aba 'Reservas'
+def reservas_do_usuario(usuario_id):
+    # Mais recentes primeiro, pelo índice de reservas.usuario_id, com o modelo do carro para exibição
+    conn = get_db_connection()
+    try:
+        rows = conn.execute("SELECT * FROM reservas WHERE usuario_id = ? ORDER BY id DESC", (usuario_id,)).fetchall()
+    finally:
+        liberar_conexao(conn)
+    return [
+        dict(row, carro_modelo=(carros.get(row['carro_id']) or {}).get('modelo', 'Miniatura removida'))
+        for row in rows
+    ]
+
+# --- Expiração de Reservas Pendentes ---
+# Reservas 'pendente' feitas pelo site seguram uma unidade do estoque por RESERVA_TTL_MINUTOS, até o
+# admin confirmá-las (/admin/confirmar_reserva). A varredura lê só as pendentes vencidas que retêm
+# estoque (legadas e vindas da planilha nunca o baixaram e não expiram) pelo índice (status,
+# criado_em), expira em lotes (uma transação por lote, devolvendo o estoque de cada carro com um
+# UPDATE) e dorme até o próximo vencimento.
+RESERVA_TTL_MINUTOS = float(os.getenv('RESERVA_TTL_MINUTOS', '30')) # 0 desativa
+RESERVA_EXPIRACAO_LOTE = int(os.getenv('RESERVA_EXPIRACAO_LOTE', '500'))
+RESERVA_VARREDURA_MAXIMA = 60 # Segundos máximos entre varreduras
+_expiracao_worker = None
+expiracao_status = {'expiradas_total': 0, 'ultima_varredura': None, 'ultimo_erro': None}
+
+def _expirar_lote(limite_criacao, tamanho_lote):
+    conn = _conexao_de_reserva()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
         try:
-            reservas_sheet = sheet.worksheet('Reservas')
-        except gspread.WorksheetNotFound:
-            print("WARNING - Aba 'Reservas' não encontrada. Criando nova aba 'Reservas'.")
-            reservas_sheet = sheet.add_worksheet('Reservas', rows=1000, cols=8)
-            reservas_sheet.append_row(['ID', 'Usuario_id', 'Carro_id', 'Data_reserva', 'Hora_inicio', 'Hora_fim', 'Status', 'Observacoes'])
-            reservas_sheet.format('A1:H1', {'textFormat': {'bold': True}})
-            print("INFO - Aba 'Reservas' criada com cabeçalhos padrão.")
-            return False # Recarregar após criação
-
-        data_reservas = reservas_sheet.get_all_records()
-        reservas_temp = []
-        for i, row in enumerate(data_reservas):
-            reserva = {
-                'id': int(row.get('ID', i + 1)),
-                'usuario_id': int(row.get('Usuario_id', 0)),
-                'carro_id': int(row.get('Carro_id', 0)),
-                'data_reserva': row.get('Data_reserva', ''),
-                'hora_inicio': row.get('Hora_inicio', ''),
-                'hora_fim': row.get('Hora_fim', ''),
-                'status': row.get('Status', 'pendente'),
-                'observacoes': row.get('Observacoes', '')
+            vencidas = conn.execute(
+                "SELECT id, carro_id FROM reservas WHERE status = 'pendente' AND estoque_retido = 1 AND criado_em <= ? "
+                "ORDER BY criado_em LIMIT ?",
+                (limite_criacao, tamanho_lote)
+            ).fetchall()
+            if not vencidas:
+                conn.rollback()
+                return [], {}
+            ids = [row['id'] for row in vencidas]
+            devolver = {}
+            for row in vencidas:
+                devolver[row['carro_id']] = devolver.get(row['carro_id'], 0) + 1
+            conn.executemany("UPDATE reservas SET status = 'expirada', estoque_retido = 0 WHERE id = ?", [(i,) for i in ids])
+            conn.executemany(
+                "UPDATE carros SET quantidade_disponivel = quantidade_disponivel + ? WHERE id = ?",
+                [(quantidade, carro_id) for carro_id, quantidade in devolver.items()]
+            )
+            placeholders = ', '.join('?' for _ in devolver)
+            estoque = {
+                row['id']: row['quantidade_disponivel']
+                for row in conn.execute(f"SELECT id, quantidade_disponivel FROM carros WHERE id IN ({placeholders})", list(devolver))
             }
-            reservas_temp.append(reserva)
-        reservas = reservas_temp
-        print(f"INFO - Dados carregados da planilha 'Reservas': {len(reservas)} itens.")
+            for reserva_id in ids:
+                enqueue_sync('Reservas', 'update', reserva_id, conn=conn)
+            for carro_id in estoque:
+                enqueue_sync('Carros', 'update', carro_id, conn=conn)
+            versoes = {tabela: _incrementar_versao(conn, tabela) for tabela in ('carros', 'reservas')}
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        _liberar_conexao_de_reserva(conn)
+
+    with _cache_lock:
+        for reserva_id in ids:
+            reserva = reservas.get(reserva_id)
+            if reserva is not None:
+                _alterar_no_cache('reservas', reserva, {'status': 'expirada', 'estoque_retido': 0})
+        for carro_id, quantidade in estoque.items():
+            carro = carros.get(carro_id)
+            if carro is not None:
+                _alterar_no_cache('carros', carro, {'quantidade_disponivel': quantidade})
+        _tocar_cache('reservas')
+        _tocar_cache('carros')
+        _marcar_versao('carros', versoes['carros'])
+        _marcar_versao('reservas', versoes['reservas'])
+    return ids, estoque
+
+def expirar_reservas_vencidas(agora=None, tamanho_lote=None):
+    """Expira as reservas pendentes mais velhas que o TTL e devolve o estoque. Retorna quantas expirou."""
+    if RESERVA_TTL_MINUTOS <= 0:
+        return 0
+    agora = agora or time.time()
+    tamanho_lote = tamanho_lote or RESERVA_EXPIRACAO_LOTE
+    limite_criacao = agora - RESERVA_TTL_MINUTOS * 60
+    total = 0
+    while True:
+        ids, estoque = _expirar_lote(limite_criacao, tamanho_lote)
+        total += len(ids)
+        if ids:
+            log('INFO', f"{len(ids)} reservas pendentes expiradas; estoque devolvido a {len(estoque)} carros.")
+        if len(ids) < tamanho_lote:
+            break
+    expiracao_status['expiradas_total'] += total
+    expiracao_status['ultima_varredura'] = agora
+    return total
+
+def _proximo_vencimento():
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT MIN(criado_em) FROM reservas WHERE status = 'pendente' AND estoque_retido = 1").fetchone()
+    finally:
+        liberar_conexao(conn)
+    return row[0] + RESERVA_TTL_MINUTOS * 60 if row[0] is not None else None
+
+def _expiracao_loop():
+    while True:
+        try:
+            expirar_reservas_vencidas()
+            vencimento = _proximo_vencimento()
+            espera = RESERVA_VARREDURA_MAXIMA if vencimento is None else vencimento - time.time()
+            espera = min(RESERVA_VARREDURA_MAXIMA, max(1.0, espera))
+        except Exception as e:
+            expiracao_status['ultimo_erro'] = str(e)
+            log('ERROR', f"Erro na expiração de reservas: {e}.")
+            espera = RESERVA_VARREDURA_MAXIMA
+        time.sleep(espera)
+
+def iniciar_expiracao_reservas():
+    global _expiracao_worker
+    if RESERVA_TTL_MINUTOS <= 0 or (_expiracao_worker is not None and _expiracao_worker.is_alive()):
+        return
+    _expiracao_worker = threading.Thread(target=_expiracao_loop, name='expira-reservas', daemon=True)
+    _expiracao_worker.start()
+    log('INFO', f"Expiração de reservas pendentes após {RESERVA_TTL_MINUTOS:.0f} min iniciada.")
+
+# --- Consultas ao Catálogo (paginação, filtros e ordenação) ---
+# As ordenações são pré-calculadas por (marca, só disponíveis, ordem) e reaproveitadas até o
+# catálogo mudar; uma página custa um slice, e o filtro de preço usa busca binária.
+ORDENS_CATALOGO = {
+    'id': lambda c: c['id'],
+    'preco': lambda c: (c.get('preco_diaria') or 0.0, c['id']),
+    'marca': lambda c: ((c.get('marca') or '').lower(), c['id']),
+    'chegada': lambda c: (str(c.get('ano') or ''), c['id']),
+}
+POR_PAGINA_PADRAO = 24
+POR_PAGINA_MAX = 100
+POR_PAGINA_ADMIN = int(os.getenv('POR_PAGINA_ADMIN', '50')) # Linhas por tabela no /admin
+
+_indice_catalogo = {'geracao': None, 'marcas': [], 'marcas_chave': set(), 'ordens': {}}
+_indice_catalogo_lock = threading.Lock()
+
+def _ordem_catalogo(marca, disponivel, ordem):
+    """Lista de carros (ordem crescente) para a combinação de filtros indexados, com memo."""
+    with _indice_catalogo_lock:
+        if _indice_catalogo['geracao'] != geracao_cache['carros']:
+            todos = list(carros.values())
+            _indice_catalogo['geracao'] = geracao_cache['carros']
+            _indice_catalogo['marcas'] = sorted({c['marca'] for c in todos if c.get('marca')}, key=str.lower)
+            _indice_catalogo['marcas_chave'] = {m.lower() for m in _indice_catalogo['marcas']}
+            _indice_catalogo['ordens'] = {(None, False, 'id'): todos}
+        # A marca vem da query string: só as do catálogo entram no memo (limitado ao nº de marcas);
+        # qualquer outra não casa com nenhum carro
+        if marca is not None and marca not in _indice_catalogo['marcas_chave']:
+            return []
+        ordens = _indice_catalogo['ordens']
+        chave = (marca, disponivel, ordem)
+        if chave not in ordens:
+            base = ordens[(None, False, 'id')]
+            if marca is not None or disponivel:
+                base = [
+                    c for c in base
+                    if (marca is None or (c.get('marca') or '').lower() == marca)
+                    and (not disponivel or (c.get('quantidade_disponivel') or 0) > 0)
+                ]
+            ordens[chave] = sorted(base, key=ORDENS_CATALOGO[ordem])
+        return ordens[chave]
+
+def marcas_do_catalogo():
+    _ordem_catalogo(None, False, 'id')
+    return _indice_catalogo['marcas']
+
+def filtros_catalogo_da_request(args):
+    """Lê os parâmetros de consulta do catálogo. Levanta ValueError para valores inválidos."""
+    ordem = args.get('ordem', 'id')
+    direcao = args.get('direcao', 'asc')
+    if ordem not in ORDENS_CATALOGO or direcao not in ('asc', 'desc'):
+        raise ValueError('ordem/direcao inválida')
+    preco_min = args.get('preco_min', '')
+    preco_max = args.get('preco_max', '')
+    preco_min = float(preco_min) if preco_min != '' else None
+    preco_max = float(preco_max) if preco_max != '' else None
+    # float() aceita 'nan' e 'inf'; nan desligaria o filtro na busca binária
+    if any(preco is not None and not math.isfinite(preco) for preco in (preco_min, preco_max)):
+        raise ValueError('preço inválido')
+    return {
+        'marca': (args.get('marca') or '').strip().lower() or None,
+        'disponivel': args.get('disponivel') in ('1', 'true', 'on'),
+        'preco_min': preco_min,
+        'preco_max': preco_max,
+        'ordem': ordem,
+        'direcao': direcao,
+        'pagina': max(1, int(args.get('pagina', 1))),
+        'por_pagina': min(POR_PAGINA_MAX, max(1, int(args.get('por_pagina', POR_PAGINA_PADRAO)))),
+    }
+
+def consultar_catalogo(marca=None, disponivel=False, preco_min=None, preco_max=None,
+                       ordem='id', direcao='asc', pagina=1, por_pagina=POR_PAGINA_PADRAO):
+    lista = _ordem_catalogo(marca, disponivel, ordem)
+    if preco_min is not None or preco_max is not None:
+        por_preco = lista if ordem == 'preco' else _ordem_catalogo(marca, disponivel, 'preco')
+        precos = [c.get('preco_diaria') or 0.0 for c in por_preco]
+        inicio = bisect.bisect_left(precos, preco_min) if preco_min is not None else 0
+        fim = bisect.bisect_right(precos, preco_max) if preco_max is not None else len(precos)
+        if ordem == 'preco':
+            lista = por_preco[inicio:fim]
+        else:
+            ids = {c['id'] for c in por_preco[inicio:fim]}
+            lista = [c for c in lista if c['id'] in ids]
+
+    total = len(lista)
+    a, b = (pagina - 1) * por_pagina, pagina * por_pagina
+    if direcao == 'desc':
+        itens = lista[max(0, total - b):max(0, total - a)][::-1]
+    else:
+        itens = lista[a:b]
+    return {
+        'itens': itens,
+        'total': total,
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'paginas': max(1, -(-total // por_pagina)),
+    }
+
+# --- Cache de Páginas e Fragmentos ---
+# /home, /api/carros e /admin dependem só dos dados e de o usuário ser admin. A resposta fica guardada sob
+# um carimbo com as versões das tabelas usadas (cache_versao), que toda alteração incrementa;
+# o mesmo carimbo (com a versão da build) vira o ETag, então o navegador recebe 304 enquanto nada mudar.
+CACHE_PAGINAS_MAX = int(os.getenv('CACHE_PAGINAS_MAX', '256'))
+_cache_paginas = OrderedDict()
+_cache_paginas_lock = threading.Lock()
+_cache_cards = {} # carro_id -> (assinatura dos campos, HTML do card)
+
+def carimbo_de_dados(tabelas):
+    versoes = tuple(_versoes_locais.get(t) for t in tabelas)
+    return None if None in versoes else versoes
+
+def _guardar_pagina(chave, corpo, mimetype):
+    with _cache_paginas_lock:
+        _cache_paginas[chave] = (corpo, mimetype)
+        _cache_paginas.move_to_end(chave)
+        while len(_cache_paginas) > CACHE_PAGINAS_MAX:
+            _cache_paginas.popitem(last=False)
+
+def _buscar_pagina(chave):
+    with _cache_paginas_lock:
+        pagina = _cache_paginas.get(chave)
+        if pagina is not None:
+            _cache_paginas.move_to_end(chave)
+        return pagina
+
+def _guardar_ao_final(partes, chave, mimetype):
+    # Repassa a página em streaming e só a guarda depois de gerada por completo
+    corpo = []
+    for parte in partes:
+        corpo.append(parte.encode() if isinstance(parte, str) else parte)
+        yield parte
+    _guardar_pagina(chave, b''.join(corpo), mimetype)
+
+def chave_de_pagina(caminho, args_itens, is_admin, carimbo):
+    return (caminho, tuple(sorted(args_itens)), bool(is_admin), carimbo)
+
+def etag_de_pagina(chave):
+    return hashlib.sha1(repr((versao_da_build(), chave)).encode()).hexdigest()[:20]
+
+# endpoint -> tabelas de que a página depende; usado também pelo adaptador de edge (functions/)
+tabelas_de_pagina = {}
+
+def pagina_do_cache(endpoint, caminho, args_itens, is_admin):
+    """(corpo, mimetype, etag) da página já gerada para estes dados, ou None. Não renderiza nada."""
+    tabelas = tabelas_de_pagina.get(endpoint)
+    carimbo = carimbo_de_dados(tabelas) if tabelas else None
+    if carimbo is None:
+        return None
+    chave = chave_de_pagina(caminho, args_itens, is_admin, carimbo)
+    pagina = _buscar_pagina(chave)
+    incrementar('jgminis_cache_paginas_total', resultado='hit' if pagina is not None else 'miss')
+    return None if pagina is None else pagina + (etag_de_pagina(chave),)
+
+def cache_de_pagina(*tabelas):
+    def decorador(view):
+        tabelas_de_pagina[view.__name__] = tabelas
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            carimbo = carimbo_de_dados(tabelas)
+            # Mensagens flash são da sessão, não dos dados: a página com elas não vai para o cache
+            if not session.get('logged_in') or carimbo is None or '_flashes' in session:
+                return view(*args, **kwargs)
+            chave = chave_de_pagina(request.path, request.args.items(multi=True), session.get('is_admin'), carimbo)
+            etag = etag_de_pagina(chave)
+            if request.if_none_match.contains(etag):
+                resposta = Response(status=304)
+            else:
+                pagina = _buscar_pagina(chave)
+                incrementar('jgminis_cache_paginas_total', resultado='hit' if pagina is not None else 'miss')
+                if pagina is not None:
+                    resposta = Response(pagina[0], mimetype=pagina[1])
+                else:
+                    resposta = app.make_response(view(*args, **kwargs))
+                    if resposta.status_code != 200:
+                        return resposta
+                    if resposta.is_streamed:
+                        resposta.response = _guardar_ao_final(resposta.response, chave, resposta.mimetype)
+                    else:
+                        _guardar_pagina(chave, resposta.get_data(), resposta.mimetype)
+            resposta.set_etag(etag)
+            resposta.headers['Cache-Control'] = 'private, no-cache'
+            resposta.vary.add('Cookie')
+            return resposta
+        return wrapper
+    return decorador
+
+def card_carro_html(carro):
+    """HTML do card de um carro, re-renderizado só quando os campos do carro mudam."""
+    assinatura = tuple(carro.get(campo) for campo in CAMPOS_TABELA['carros'])
+    guardado = _cache_cards.get(carro['id'])
+    if guardado is not None and guardado[0] == assinatura:
+        return guardado[1]
+    html = Markup(render_template('_card_carro.html', carro=carro))
+    if len(_cache_cards) > len(carros) + 1000:
+        _cache_cards.clear() # Descarta cards de carros removidos
+    _cache_cards[carro['id']] = (assinatura, html)
+    return html
+
+# --- Layout das Abas do Google Sheets ---
+CARROS_HEADERS = ['ID', 'IMAGEM', 'NOME DA MINIATURA', 'MARCA/FABRICANTE', 'PREVISÃO DE CHEGADA', 'QUANTIDADE DISPONIVEL', 'VALOR', 'OBSERVAÇÕES', 'MAX_RESERVAS_POR_USUARIO']
+USUARIOS_HEADERS = ['ID', 'Nome', 'Email', 'Senha_hash', 'CPF', 'Telefone', 'Data_Cadastro', 'Is_Admin']
+RESERVAS_HEADERS = ['ID', 'Usuario_id', 'Carro_id', 'Data_reserva', 'Hora_inicio', 'Hora_fim', 'Status', 'Observacoes']
+
+def carro_para_linha(carro):
+    return [
+        carro.get('id', ''),
+        carro.get('thumbnail_url', ''),
+        carro.get('modelo', ''),
+        carro.get('marca', ''),
+        carro.get('ano', ''),
+        carro.get('quantidade_disponivel', 0),
+        carro.get('preco_diaria', 0.0),
+        carro.get('observacoes', ''),
+        carro.get('max_reservas', 1)
+    ]
+
+def usuario_para_linha(usuario):
+    return [
+        usuario.get('id', ''),
+        usuario.get('nome', ''),
+        usuario.get('email', ''),
+        usuario.get('senha_hash', ''),
+        usuario.get('cpf', ''),
+        usuario.get('telefone', ''),
+        usuario.get('data_cadastro', ''),
+        usuario.get('is_admin', 0)
+    ]
+
+def reserva_para_linha(reserva):
+    return [
+        reserva.get('id', ''),
+        reserva.get('usuario_id', ''),
+        reserva.get('carro_id', ''),
+        reserva.get('data_reserva', ''),
+        reserva.get('hora_inicio', ''),
+        reserva.get('hora_fim', ''),
+        reserva.get('status', ''),
+        reserva.get('observacoes', '')
+    ]
+
+def _abas_sheets():
+    # Lido a cada chamada porque os caches globais são substituídos nos reloads
+    return {
+        'Carros': (CARROS_HEADERS, list(carros.values()), carro_para_linha),
+        'Usuarios': (USUARIOS_HEADERS, list(usuarios.values()), usuario_para_linha),
+        'Reservas': (RESERVAS_HEADERS, list(reservas.values()), reserva_para_linha),
+    }
+
+# Último conteúdo conhecido de cada aba (linha 0 = cabeçalho), já normalizado para comparação.
+# Preenchido ao carregar do Sheets e após cada sincronização bem-sucedida.
+sheets_snapshot = {}
+_worksheets_cache = {}
+_sheets_lock = threading.RLock()
+ultima_sincronizacao = {}
+
+def _normalizar_linha(linha):
+    return ['' if valor is None else str(valor) for valor in linha]
+
+# --- Cliente Sheets: quota, novas tentativas e circuit breaker ---
+# Toda chamada à API passa por _sheets_call, que:
+#  - consome um token do balde de leitura ou de escrita (as quotas do Google são 60 leituras e
+#    60 escritas por minuto por usuário; o padrão divide isso entre os workers do gunicorn);
+#  - repete 429/5xx e falhas de rede com backoff exponencial com jitter (respeitando Retry-After);
+#  - abre o circuito após falhas seguidas: as chamadas falham na hora, sem esperar a API, até
+#    uma chamada de teste passar depois de SHEETS_CIRCUITO_ESPERA segundos.
+_WORKERS = max(1, int(os.getenv('WEB_CONCURRENCY', '1'))) # gunicorn.conf.py exporta o número real de workers
+SHEETS_QUOTA_LEITURA_POR_MINUTO = float(os.getenv('SHEETS_QUOTA_LEITURA_POR_MINUTO', str(60 / _WORKERS))) # 0 desativa
+SHEETS_QUOTA_ESCRITA_POR_MINUTO = float(os.getenv('SHEETS_QUOTA_ESCRITA_POR_MINUTO', str(60 / _WORKERS))) # 0 desativa
+SHEETS_QUOTA_RAJADA = float(os.getenv('SHEETS_QUOTA_RAJADA', '10'))
+SHEETS_QUOTA_ESPERA_MAX = float(os.getenv('SHEETS_QUOTA_ESPERA_MAX', '30'))
+SHEETS_RETRY_TENTATIVAS = int(os.getenv('SHEETS_RETRY_TENTATIVAS', '4'))
+SHEETS_RETRY_BASE = float(os.getenv('SHEETS_RETRY_BASE', '1'))
+SHEETS_RETRY_MAX = float(os.getenv('SHEETS_RETRY_MAX', '32'))
+SHEETS_CIRCUITO_FALHAS = int(os.getenv('SHEETS_CIRCUITO_FALHAS', '5'))
+SHEETS_CIRCUITO_ESPERA = float(os.getenv('SHEETS_CIRCUITO_ESPERA', '60'))
+STATUS_SHEETS_TRANSITORIOS = (429, 500, 502, 503, 504)
+# Chamadas de escrita (quota de escrita); as demais contam como leitura
+OPERACOES_SHEETS_ESCRITA = {'batch_update', 'resize', 'add_worksheet', 'append_row', 'format', 'update'}
+# Escritas que não podem ser repetidas às cegas se o resultado for incerto (timeout, 5xx)
+OPERACOES_SHEETS_NAO_IDEMPOTENTES = {'add_worksheet', 'append_row'}
+
+class SheetsIndisponivel(gspread.exceptions.GSpreadException):
+    """Chamada recusada sem ir à API: circuito aberto ou quota esgotada por tempo demais."""
+
+_sheets_cliente_lock = threading.Lock()
+_baldes_sheets = {} # 'leitura' / 'escrita' -> {'tokens', 'atualizado'}
+circuito_sheets = {'estado': 'fechado', 'falhas': 0, 'aberto_em': None, 'ultimo_erro': None, 'aberturas': 0}
+
+def _taxa_quota(tipo):
+    por_minuto = SHEETS_QUOTA_ESCRITA_POR_MINUTO if tipo == 'escrita' else SHEETS_QUOTA_LEITURA_POR_MINUTO
+    return por_minuto / 60
+
+def _consumir_quota(tipo):
+    """Espera até haver um token no balde. Retorna os segundos esperados."""
+    taxa = _taxa_quota(tipo)
+    if taxa <= 0:
+        return 0.0
+    capacidade = max(1.0, min(SHEETS_QUOTA_RAJADA, taxa * 60))
+    esperado = 0.0
+    while True:
+        with _sheets_cliente_lock:
+            agora = time.monotonic()
+            balde = _baldes_sheets.setdefault(tipo, {'tokens': capacidade, 'atualizado': agora})
+            balde['tokens'] = min(capacidade, balde['tokens'] + (agora - balde['atualizado']) * taxa)
+            balde['atualizado'] = agora
+            if balde['tokens'] >= 1:
+                balde['tokens'] -= 1
+                return esperado
+            espera = (1 - balde['tokens']) / taxa
+        if esperado + espera > SHEETS_QUOTA_ESPERA_MAX:
+            raise SheetsIndisponivel(f"Quota de {tipo} do Sheets esgotada (espera maior que {SHEETS_QUOTA_ESPERA_MAX:.0f}s)")
+        time.sleep(espera)
+        esperado += espera
+
+def _esvaziar_balde(tipo):
+    # Depois de um 429 o Google já está contando contra nós: as próximas chamadas esperam
+    with _sheets_cliente_lock:
+        if tipo in _baldes_sheets:
+            _baldes_sheets[tipo]['tokens'] = min(0.0, _baldes_sheets[tipo]['tokens'])
+
+def _status_do_erro(erro):
+    if isinstance(erro, gspread.exceptions.APIError):
+        return getattr(erro.response, 'status_code', None)
+    return None
+
+def _erro_transitorio(erro, operacao):
+    status = _status_do_erro(erro)
+    if status == 429:
+        return True # Recusada antes de executar: sempre pode repetir
+    if operacao in OPERACOES_SHEETS_NAO_IDEMPOTENTES:
+        return False
+    return status in STATUS_SHEETS_TRANSITORIOS or isinstance(erro, RequestException)
+
+def _espera_retry(erro, tentativa):
+    resposta = getattr(erro, 'response', None)
+    retry_after = resposta.headers.get('Retry-After') if resposta is not None and hasattr(resposta, 'headers') else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), SHEETS_RETRY_MAX)
+    # Full jitter: workers que falharam juntos não voltam juntos
+    return random.uniform(0, min(SHEETS_RETRY_MAX, SHEETS_RETRY_BASE * 2 ** tentativa))
+
+def _liberar_circuito(reservar_teste=True):
+    """
+    Levanta SheetsIndisponivel se o circuito está aberto. Após a espera, deixa passar uma chamada
+    de teste e retorna True para ela; com reservar_teste=False só checa, sem passar a meio_aberto.
+    """
+    with _sheets_cliente_lock:
+        if circuito_sheets['estado'] == 'fechado':
+            return False
+        if circuito_sheets['estado'] == 'aberto' and time.time() - circuito_sheets['aberto_em'] >= SHEETS_CIRCUITO_ESPERA:
+            if reservar_teste:
+                circuito_sheets['estado'] = 'meio_aberto' # Esta chamada é o teste
+                return True
+            return False
+        raise SheetsIndisponivel(f"Circuito do Sheets aberto após falhas seguidas: {circuito_sheets['ultimo_erro']}")
+
+def _cancelar_teste_do_circuito():
+    # A chamada de teste terminou sem resultado da API: volta a aberto, e a próxima chamada testa de novo
+    with _sheets_cliente_lock:
+        if circuito_sheets['estado'] == 'meio_aberto':
+            circuito_sheets['estado'] = 'aberto'
+
+def _registrar_resultado_circuito(erro=None):
+    with _sheets_cliente_lock:
+        if erro is None:
+            if circuito_sheets['estado'] != 'fechado':
+                log('INFO', "Circuito do Sheets fechado: API respondendo novamente.")
+            circuito_sheets.update(estado='fechado', falhas=0, aberto_em=None)
+            return
+        circuito_sheets['falhas'] += 1
+        circuito_sheets['ultimo_erro'] = str(erro)
+        if circuito_sheets['estado'] == 'meio_aberto' or circuito_sheets['falhas'] >= SHEETS_CIRCUITO_FALHAS:
+            if circuito_sheets['estado'] != 'aberto':
+                circuito_sheets['aberturas'] += 1
+                log('WARNING', f"Circuito do Sheets aberto por {SHEETS_CIRCUITO_ESPERA:.0f}s após {circuito_sheets['falhas']} falhas: {erro}.")
+            circuito_sheets.update(estado='aberto', aberto_em=time.time())
+
+def circuito_sheets_aberto():
+    with _sheets_cliente_lock:
+        return circuito_sheets['estado'] == 'aberto' and time.time() - circuito_sheets['aberto_em'] < SHEETS_CIRCUITO_ESPERA
+
+def sheets_cliente_status():
+    with _sheets_cliente_lock:
+        return {
+            'circuito': dict(circuito_sheets),
+            'tokens': {tipo: round(balde['tokens'], 2) for tipo, balde in _baldes_sheets.items()},
+            'quota_por_minuto': {'leitura': SHEETS_QUOTA_LEITURA_POR_MINUTO, 'escrita': SHEETS_QUOTA_ESCRITA_POR_MINUTO},
+        }
+
+def _sheets_call(stats, func, *args, **kwargs):
+    """
+    Executa uma chamada à API do Sheets dentro da quota, com novas tentativas e circuit breaker,
+    contabilizando-a nas estatísticas da sincronização.
+    """
+    operacao = getattr(func, '__name__', 'desconhecida')
+    tipo = 'escrita' if operacao in OPERACOES_SHEETS_ESCRITA else 'leitura'
+    tentativa = 0
+    while True:
+        _liberar_circuito(reservar_teste=False) # Circuito aberto falha na hora, sem esperar quota
+        espera_quota = _consumir_quota(tipo)
+        if espera_quota:
+            incrementar('jgminis_sheets_quota_espera_segundos_total', espera_quota, tipo=tipo)
+        # Só agora, com o token na mão, a chamada pode virar o teste: daqui em diante todo
+        # desfecho é registrado, para o circuito nunca ficar preso em meio_aberto
+        teste = _liberar_circuito()
+        if stats is not None:
+            stats['api_calls'] += 1
+        inicio = time.perf_counter()
+        try:
+            resultado = func(*args, **kwargs)
+        except (gspread.exceptions.APIError, RequestException) as e:
+            incrementar('jgminis_sheets_api_erros_total', operacao=operacao, status=_status_do_erro(e) or 'rede')
+            if _status_do_erro(e) == 429:
+                _esvaziar_balde(tipo)
+            if not _erro_transitorio(e, operacao):
+                _registrar_resultado_circuito() # A API respondeu: erro do pedido, não do serviço
+                raise
+            if teste or tentativa + 1 >= SHEETS_RETRY_TENTATIVAS: # O teste não é repetido
+                _registrar_resultado_circuito(e)
+                raise
+            espera = _espera_retry(e, tentativa)
+            tentativa += 1
+            incrementar('jgminis_sheets_api_retries_total', operacao=operacao)
+            log('WARNING', f"Chamada '{operacao}' ao Sheets falhou ({e}); tentativa {tentativa + 1} em {espera:.1f}s.")
+            time.sleep(espera)
+            continue
+        except gspread.exceptions.GSpreadException:
+            _registrar_resultado_circuito() # A API respondeu (ex.: WorksheetNotFound)
+            raise
+        except BaseException:
+            _cancelar_teste_do_circuito()
+            raise
+        finally:
+            incrementar('jgminis_sheets_api_chamadas_total', operacao=operacao)
+            incrementar('jgminis_sheets_api_segundos_total', time.perf_counter() - inicio, operacao=operacao)
+        _registrar_resultado_circuito()
+        return resultado
+
+def _get_worksheet(titulo, stats=None):
+    worksheet = _worksheets_cache.get(titulo)
+    if worksheet is None:
+        worksheet = _sheets_call(stats, sheet.worksheet, titulo)
+        _worksheets_cache[titulo] = worksheet
+    return worksheet
+
+def _intervalos_alterados(anterior, atual):
+    """
+    Compara dois snapshots normalizados e retorna os blocos contíguos de linhas que mudaram,
+    como tuplas (indice_inicial, indice_final), 0-based e inclusivas. Linhas que existiam
+    antes e não existem mais também entram, para serem apagadas na planilha.
+    """
+    intervalos = []
+    inicio = None
+    for i in range(max(len(anterior), len(atual))):
+        velha = anterior[i] if i < len(anterior) else None
+        nova = atual[i] if i < len(atual) else None
+        if velha != nova:
+            if inicio is None:
+                inicio = i
+        elif inicio is not None:
+            intervalos.append((inicio, i - 1))
+            inicio = None
+    if inicio is not None:
+        intervalos.append((inicio, max(len(anterior), len(atual)) - 1))
+    return intervalos
+
+def _sincronizar_aba(titulo, headers, registros, para_linha, modo, stats):
+    """
+    Grava a aba com uma única chamada values:batchUpdate, que a API aplica inteira ou não aplica:
+    uma falha no meio (quota, rede) nunca deixa a aba vazia ou pela metade. Em caso de erro o
+    snapshot da aba é descartado (ver sync_data_to_sheets) e o próximo envio a reescreve inteira.
+    """
+    anterior = sheets_snapshot.get(titulo)
+    if modo == 'completo' or anterior is None:
+        # O tamanho da aba guardado pode ser de antes de outro worker acrescentar linhas: relê
+        _worksheets_cache.pop(titulo, None)
+    worksheet = _get_worksheet(titulo, stats)
+    num_colunas = len(headers)
+    linha_vazia = [''] * num_colunas
+    valores = [headers] + [para_linha(r) for r in registros]
+    atual = [_normalizar_linha(v) for v in valores]
+
+    if modo == 'completo' or anterior is None:
+        # Reescrita completa em uma única chamada; todas as linhas excedentes da aba (inclusive as
+        # gravadas por outro worker além do nosso snapshot) são sobrescritas com vazio em vez de
+        # usar clear(), para a aba nunca ficar vazia entre duas chamadas.
+        total_linhas = max(len(valores), worksheet.row_count)
+        blocos = [(0, total_linhas - 1)]
+    else:
+        total_linhas = len(valores)
+        blocos = _intervalos_alterados(anterior, atual)
+
+    aba_stats = {'intervalos': len(blocos), 'linhas': sum(fim - inicio + 1 for inicio, fim in blocos)}
+    stats['abas'][titulo] = aba_stats
+    if not blocos:
+        return
+
+    if total_linhas > worksheet.row_count:
+        # resize (tamanho absoluto) em vez de add_rows: pode ser repetido sem crescer a aba de novo
+        _sheets_call(stats, worksheet.resize, rows=total_linhas)
+
+    data = []
+    for inicio, fim in blocos:
+        linhas = [valores[i] if i < len(valores) else linha_vazia for i in range(inicio, fim + 1)]
+        data.append({
+            'range': f"A{inicio + 1}:{gspread.utils.rowcol_to_a1(fim + 1, num_colunas)}",
+            'values': linhas
+        })
+    _sheets_call(stats, worksheet.batch_update, data, value_input_option='RAW')
+    sheets_snapshot[titulo] = atual
+
+# --- Leitura Incremental do Google Sheets ---
+# As três abas vêm em uma única chamada values_batch_get. Abas cujo conteúdo não mudou desde a
+# última leitura (mesmo checksum) são ignoradas; nas demais só as linhas diferentes são gravadas.
+# Um refresh em background repete a leitura periodicamente, coordenado entre os workers pelo DB.
+SHEETS_REFRESH_INTERVAL = float(os.getenv('SHEETS_REFRESH_INTERVAL', '300')) # 0 desativa
+_sheets_refresher = None
+ultimo_pull = {}
+
+ABAS_PADRAO = {
+    # titulo: (cabeçalhos, linhas, colunas, intervalo do cabeçalho)
+    'Carros': (CARROS_HEADERS, 1000, 10, 'A1:I1'),
+    'Usuarios': (USUARIOS_HEADERS, 100, 8, 'A1:H1'),
+    'Reservas': (RESERVAS_HEADERS, 1000, 8, 'A1:H1'),
+}
+
+def _carro_do_registro(row, i):
+    # Mapeamento exato das colunas da planilha do usuário
+    return {
+        'id': int(row.get('ID') or i + 1), # Gera ID se não existir
+        'thumbnail_url': str(row.get('IMAGEM', '')),
+        'modelo': str(row.get('NOME DA MINIATURA', '')),
+        'marca': str(row.get('MARCA/FABRICANTE', '')),
+        'ano': str(row.get('PREVISÃO DE CHEGADA', '')),
+        'quantidade_disponivel': int(row.get('QUANTIDADE DISPONIVEL') or 0),
+        'preco_diaria': float(row.get('VALOR') or 0.0),
+        'observacoes': str(row.get('OBSERVAÇÕES', '')),
+        'max_reservas': int(row.get('MAX_RESERVAS_POR_USUARIO') or 1)
+    }
+
+def _usuario_do_registro(row, i):
+    return {
+        'id': int(row.get('ID') or i + 1),
+        'nome': str(row.get('Nome', '')),
+        'email': str(row.get('Email', '')),
+        'senha_hash': str(row.get('Senha_hash', '')),
+        'cpf': str(row.get('CPF', '')),
+        'telefone': str(row.get('Telefone', '')),
+        'data_cadastro': str(row.get('Data_Cadastro', '')),
+        'is_admin': int(row.get('Is_Admin') or 0)
+    }
+
+def _reserva_do_registro(row, i):
+    return {
+        'id': int(row.get('ID') or i + 1),
+        'usuario_id': int(row.get('Usuario_id') or 0),
+        'carro_id': int(row.get('Carro_id') or 0),
+        'data_reserva': str(row.get('Data_reserva', '')),
+        'hora_inicio': str(row.get('Hora_inicio', '')),
+        'hora_fim': str(row.get('Hora_fim', '')),
+        'status': str(row.get('Status') or 'pendente'),
+        'observacoes': str(row.get('Observacoes', ''))
+    }
+
+ABAS_PULL = {
+    'Carros': ('carros', CARROS_HEADERS, _carro_do_registro, carro_para_linha),
+    'Usuarios': ('usuarios', USUARIOS_HEADERS, _usuario_do_registro, usuario_para_linha),
+    'Reservas': ('reservas', RESERVAS_HEADERS, _reserva_do_registro, reserva_para_linha),
+}
+
+def _registros_da_aba(valores):
+    # Equivalente ao get_all_records() do gspread, a partir dos valores já baixados
+    if not valores:
+        return []
+    headers = valores[0]
+    registros = []
+    for linha in valores[1:]:
+        linha = (linha + [''] * len(headers))[:len(headers)]
+        registros.append(dict(zip(headers, gspread.utils.numericise_all(linha))))
+    return registros
+
+def _criar_abas_faltantes(stats=None):
+    existentes = {ws.title for ws in _sheets_call(stats, sheet.worksheets)}
+    criadas = []
+    for titulo, (headers, linhas, colunas, intervalo_cabecalho) in ABAS_PADRAO.items():
+        if titulo in existentes:
+            continue
+        log('WARNING', f"Aba '{titulo}' não encontrada. Criando nova aba '{titulo}'.")
+        worksheet = _sheets_call(stats, sheet.add_worksheet, titulo, rows=linhas, cols=colunas)
+        _sheets_call(stats, worksheet.batch_update, [{'range': intervalo_cabecalho, 'values': [headers]}], value_input_option='RAW')
+        _sheets_call(stats, worksheet.format, intervalo_cabecalho, {'textFormat': {'bold': True}}) # Formata cabeçalho
+        log('INFO', f"Aba '{titulo}' criada com cabeçalhos padrão.")
+        criadas.append(titulo)
+    return criadas
+
+def _ler_estado_pull():
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT checksums FROM sheets_pull WHERE id = 1").fetchone()
+    finally:
+        liberar_conexao(conn)
+    return json.loads(row['checksums']) if row and row['checksums'] else {}
+
+def _gravar_estado_pull(checksums):
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.execute(
+                "UPDATE sheets_pull SET checksums = ?, ultimo_pull = ?, ultimo_sucesso = ?, ultimo_pid = ? WHERE id = 1",
+                (json.dumps(checksums), time.time(), time.time(), os.getpid())
+            )
+    finally:
+        liberar_conexao(conn)
+
+def _estado_antes_do_pull():
+    # Versões das tabelas e abas com envio pendente, lidas juntas antes de baixar a planilha
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN")
+        versoes = {row['tabela']: row['versao'] for row in conn.execute("SELECT tabela, versao FROM cache_versao")}
+        pendentes = {row['aba'] for row in conn.execute("SELECT DISTINCT aba FROM sync_queue")}
+        conn.rollback()
+        return versoes, pendentes
+    finally:
+        liberar_conexao(conn)
+
+def load_data_from_sheets():
+    global ultimo_pull
+    if not get_sheet():
+        log('WARNING', "Cliente gspread não inicializado. Carregando dados apenas do DB local.")
+        return False
+
+    stats = {'api_calls': 0, 'duracao_ms': 0.0, 'abas': {}, 'erro': None}
+    inicio = time.perf_counter()
+    try:
+        with _sheets_lock:
+            # Marca d'água antes da leitura: uma alteração local (e até o envio dela ao Sheets) feita
+            # enquanto a resposta não chega muda a versão da tabela, e a aba não é aplicada
+            versoes, pendentes = _estado_antes_do_pull()
+            verificar_cache() # As linhas comparadas com a planilha são as dessas versões
+            try:
+                resposta = _sheets_call(stats, sheet.values_batch_get, list(ABAS_PULL))
+            except gspread.exceptions.APIError:
+                # Range inválido = alguma aba não existe; cria e deixa a leitura para a próxima vez
+                if _criar_abas_faltantes(stats):
+                    return False # Recarregar após criação
+                raise
+            checksums = _ler_estado_pull()
+            for titulo, value_range in zip(ABAS_PULL, resposta.get('valueRanges', [])):
+                valores = value_range.get('values', [])
+                checksum = hashlib.sha1(json.dumps(valores, ensure_ascii=False).encode()).hexdigest()
+                if checksum == checksums.get(titulo) and titulo in sheets_snapshot:
+                    stats['abas'][titulo] = 'inalterada'
+                    continue
+                # Abas com alterações locais ainda não enviadas não são sobrescritas pela planilha
+                if titulo in pendentes:
+                    stats['abas'][titulo] = 'envio pendente'
+                    continue
+                tabela, headers, do_registro, para_linha = ABAS_PULL[titulo]
+                registros = [do_registro(row, i) for i, row in enumerate(_registros_da_aba(valores))]
+                alterados = db_mesclar_tabela(tabela, registros, versao_lida=versoes.get(tabela))
+                if alterados is None:
+                    # Sem checksum nem snapshot novos: a próxima leitura tenta de novo
+                    stats['abas'][titulo] = 'alterada localmente durante a leitura'
+                    continue
+                stats['abas'][titulo] = alterados
+                sheets_snapshot[titulo] = [_normalizar_linha(headers)] + [_normalizar_linha(para_linha(r)) for r in registros]
+                checksums[titulo] = checksum
+                log('INFO', f"Dados carregados da planilha '{titulo}': {len(registros)} itens, {stats['abas'][titulo]} alterados.")
+            _gravar_estado_pull(checksums)
         return True # Sucesso no carregamento
 
     except Exception as e:
-        print(f"ERROR - Erro ao carregar dados do Sheets: {e}. Carregando dados apenas do DB local.")
+        stats['erro'] = str(e)
+        log('ERROR', f"Erro ao carregar dados do Sheets: {e}. Carregando dados apenas do DB local.")
         return False
+    finally:
+        stats['duracao_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+        ultimo_pull = stats
+
+def _reivindicar_refresh_sheets():
+    # Só um worker por intervalo faz a leitura; os outros recebem os dados pelo cache_versao
+    conn = get_db_connection()
+    try:
+        with conn:
+            cursor = conn.execute(
+                "UPDATE sheets_pull SET ultimo_pull = ?, ultimo_pid = ? WHERE id = 1 AND COALESCE(ultimo_pull, 0) <= ?",
+                (time.time(), os.getpid(), time.time() - SHEETS_REFRESH_INTERVAL * 0.9)
+            )
+            return cursor.rowcount == 1
+    finally:
+        liberar_conexao(conn)
 
-def sync_data_to_sheets():
-    if not sheet:
-        print("WARNING - Cliente gspread não inicializado. Sincronização para Sheets desativada.")
+def _sheets_refresh_loop(uma_vez=False):
+    # A primeira leitura roda logo após o boot, já com o worker atendendo a partir do SQLite
+    while True:
+        try:
+            if _sheets_configurado() and _reivindicar_refresh_sheets() and get_sheet():
+                load_data_from_sheets()
+        except Exception as e:
+            log('ERROR', f"Erro no refresh periódico do Sheets: {e}.")
+        if uma_vez:
+            return
+        time.sleep(SHEETS_REFRESH_INTERVAL)
+
+def iniciar_sheets_refresher():
+    global _sheets_refresher
+    if _sheets_refresher is not None and _sheets_refresher.is_alive():
         return
+    if SHEETS_REFRESH_INTERVAL <= 0:
+        # Refresh periódico desativado: só importa do Sheets quando o DB local ainda está vazio
+        if not carros:
+            _sheets_refresher = threading.Thread(target=_sheets_refresh_loop, args=(True,), name='refresh-sheets', daemon=True)
+            _sheets_refresher.start()
+        return
+    _sheets_refresher = threading.Thread(target=_sheets_refresh_loop, name='refresh-sheets', daemon=True)
+    _sheets_refresher.start()
+    log('INFO', f"Refresh periódico do Sheets a cada {SHEETS_REFRESH_INTERVAL:.0f}s iniciado.")
+
+# --- Funções de Sincronização com Google Sheets ---
+def sync_data_to_sheets(modo='incremental', abas=None):
+    """
+    Envia para o Sheets apenas as linhas que mudaram desde o último snapshot de cada aba,
+    com uma única chamada batch_update por aba alterada. modo='completo' reescreve a aba
+    inteira (também em uma chamada). Retorna as estatísticas da sincronização.
+    """
+    global ultima_sincronizacao
+    stats = {'modo': modo, 'api_calls': 0, 'duracao_ms': 0.0, 'abas': {}, 'erro': None}
+    if not get_sheet():
+        log('WARNING', "Cliente gspread não inicializado. Sincronização para Sheets desativada.")
+        stats['erro'] = 'Sheets desativado'
+        return stats
+
+    inicio = time.perf_counter()
+    with _sheets_lock: # Rotas e worker da fila não podem mexer no snapshot ao mesmo tempo
+        for titulo, (headers, registros, para_linha) in _abas_sheets().items():
+            if abas is not None and titulo not in abas:
+                continue
+            try:
+                _sincronizar_aba(titulo, headers, registros, para_linha, modo, stats)
+            except Exception as e:
+                # Estado da aba na planilha é incerto: a próxima sincronização reescreve tudo
+                sheets_snapshot.pop(titulo, None)
+                _worksheets_cache.pop(titulo, None)
+                stats['erro'] = f"{titulo}: {e}"
+                log('ERROR', f"Erro ao sincronizar aba '{titulo}' para Sheets: {e}.")
+    stats['duracao_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+    ultima_sincronizacao = stats
+    if stats['erro'] is None:
+        log('INFO', f"Sincronização de dados para Sheets concluída ({modo}): {stats['api_calls']} chamadas à API em {stats['duracao_ms']} ms.")
+    return stats
+
+# --- Fila de Sincronização com o Sheets (write-behind) ---
+# As rotas só registram a alteração na fila (SQLite) e retornam; um worker em background
+# agrupa as entradas por aba e envia ao Sheets, com novas tentativas e backoff exponencial.
+SYNC_FLUSH_INTERVAL = float(os.getenv('SYNC_FLUSH_INTERVAL', '2'))
+SYNC_MAX_BACKOFF = float(os.getenv('SYNC_MAX_BACKOFF', '300'))
+SYNC_CLAIM_TIMEOUT = 120 # Segundos que uma entrada fica reservada para o worker que a pegou
+
+_sync_evento = threading.Event()
+_sync_worker = None
+sync_status = {
+    'ultimo_flush': None,
+    'ultimo_erro': None,
+    'ultimo_erro_em': None,
+    'flushes': 0,
+    'falhas': 0
+}
 
+def enqueue_sync(aba, operacao, registro_id=None, conn=None):
+    """
+    Registra uma alteração pendente para a aba. Se `conn` for passado, a entrada entra na
+    transação do chamador (que faz o commit); senão é gravada e comitada aqui.
+    """
+    propria = conn is None
+    if propria:
+        conn = get_db_connection()
     try:
-        # Sincronizar Carros
-        carros_sheet = sheet.worksheet('Carros')
-        carros_sheet.clear()
-        carros_sheet.append_row(['ID', 'IMAGEM', 'NOME DA MINIATURA', 'MARCA/FABRICANTE', 'PREVISÃO DE CHEGADA', 'QUANTIDADE DISPONIVEL', 'VALOR', 'OBSERVAÇÕES', 'MAX_RESERVAS_POR_USUARIO'])
-        for carro in carros:
-            carros_sheet.append_row([
-                carro.get('id', ''),
-                carro.get('thumbnail_url', ''),
-                carro.get('modelo', ''),
-                carro.get('marca', ''),
-                carro.get('ano', ''),
-                carro.get('quantidade_disponivel', 0),
-                carro.get('preco_diaria', 0.0),
-                carro.get('observacoes', ''),
-                carro.get('max_reservas', 1)
-            ])
-        
-        # Sincronizar Usuarios
-        usuarios_sheet = sheet.worksheet('Usuarios')
-        usuarios_sheet.clear()
-        usuarios_sheet.append_row(['ID', 'Nome', 'Email', 'Senha_hash', 'CPF', 'Telefone', 'Data_Cadastro', 'Is_Admin'])
-        for usuario in usuarios:
-            usuarios_sheet.append_row([
-                usuario.get('id', ''),
-                usuario.get('nome', ''),
-                usuario.get('email', ''),
-                usuario.get('senha_hash', ''),
-                usuario.get('cpf', ''),
-                usuario.get('telefone', ''),
-                usuario.get('data_cadastro', ''),
-                usuario.get('is_admin', 0)
-            ])
-        
-        # Sincronizar Reservas
-        reservas_sheet = sheet.worksheet('Reservas')
-        reservas_sheet.clear()
-        reservas_sheet.append_row(['ID', 'Usuario_id', 'Carro_id', 'Data_reserva', 'Hora_inicio', 'Hora_fim', 'Status', 'Observacoes'])
-        for reserva in reservas:
-            reservas_sheet.append_row([
-                reserva.get('id', ''),
-                reserva.get('usuario_id', ''),
-                reserva.get('carro_id', ''),
-                reserva.get('data_reserva', ''),
-                reserva.get('hora_inicio', ''),
-                reserva.get('hora_fim', ''),
-                reserva.get('status', ''),
-                reserva.get('observacoes', '')
-            ])
-        print("INFO - Sincronização de dados para Sheets concluída.")
-    except Exception as e:
-        print(f"ERROR - Erro ao sincronizar dados para Sheets: {e}.")
+        conn.execute(
+            "INSERT INTO sync_queue (aba, operacao, registro_id, criado_em) VALUES (?, ?, ?, ?)",
+            (aba, operacao, registro_id, time.time())
+        )
+        if propria:
+            conn.commit()
+    finally:
+        if propria:
+            liberar_conexao(conn)
+    _sync_evento.set()
 
-# --- Inicialização do App ---
-with app.app_context():
-    init_db()
-    if not load_data_from_sheets():
-        print("WARNING - Carregamento do Sheets falhou ou foi desativado. Usando dados do DB local.")
-        # Fallback para carregar do DB local se Sheets falhar
+def _backoff_sync(tentativas):
+    atraso = min(SYNC_MAX_BACKOFF, SYNC_FLUSH_INTERVAL * (2 ** tentativas))
+    return atraso * random.uniform(0.5, 1.0)
+
+def _reivindicar_entradas_sync():
+    """Reserva, para este processo, as entradas vencidas da fila, agrupadas por aba."""
+    agora = time.time()
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        grupos = conn.execute('''
+            SELECT aba, MAX(id) AS max_id, MAX(tentativas) AS tentativas, COUNT(*) AS total
+            FROM sync_queue WHERE proxima_tentativa <= ? GROUP BY aba
+        ''', (agora,)).fetchall()
+        for grupo in grupos:
+            conn.execute(
+                "UPDATE sync_queue SET proxima_tentativa = ? WHERE aba = ? AND id <= ?",
+                (agora + SYNC_CLAIM_TIMEOUT, grupo['aba'], grupo['max_id'])
+            )
+        conn.commit()
+        ultimos_pids = {row['aba']: row['ultimo_pid'] for row in conn.execute("SELECT aba, ultimo_pid FROM sync_estado")}
+        return [dict(g) for g in grupos], ultimos_pids
+    finally:
+        liberar_conexao(conn)
+
+def flush_sync_queue():
+    """Envia ao Sheets as abas com alterações pendentes. Retorna quantas abas foram enviadas."""
+    if not get_sheet() or circuito_sheets_aberto():
+        return 0 # Entradas continuam na fila até a API voltar
+    grupos, ultimos_pids = _reivindicar_entradas_sync()
+    if grupos:
+        verificar_cache() # Envia o estado atual do DB, mesmo que alterado por outro worker
+    enviadas = 0
+    for grupo in grupos:
+        aba = grupo['aba']
+        # Se outro processo enviou esta aba por último, o snapshot local pode estar defasado
+        modo = 'incremental' if ultimos_pids.get(aba) == os.getpid() else 'completo'
+        stats = sync_data_to_sheets(modo=modo, abas=[aba])
         conn = get_db_connection()
-        cursor = conn.cursor()
-        carros = [dict(row) for row in cursor.execute("SELECT * FROM carros").fetchall()]
-        usuarios = [dict(row) for row in cursor.execute("SELECT * FROM usuarios").fetchall()]
-        reservas = [dict(row) for row in cursor.execute("SELECT * FROM reservas").fetchall()]
+        try:
+            if stats['erro'] is None:
+                conn.execute("DELETE FROM sync_queue WHERE aba = ? AND id <= ?", (aba, grupo['max_id']))
+                conn.execute(
+                    "INSERT OR REPLACE INTO sync_estado (aba, ultimo_pid, ultimo_flush, ultimo_erro) VALUES (?, ?, ?, NULL)",
+                    (aba, os.getpid(), time.time())
+                )
+                sync_status['ultimo_flush'] = time.time()
+                sync_status['flushes'] += 1
+                enviadas += 1
+            else:
+                conn.execute(
+                    "UPDATE sync_queue SET tentativas = tentativas + 1, proxima_tentativa = ? WHERE aba = ? AND id <= ?",
+                    (time.time() + _backoff_sync(grupo['tentativas']), aba, grupo['max_id'])
+                )
+                conn.execute(
+                    "INSERT INTO sync_estado (aba, ultimo_erro) VALUES (?, ?) ON CONFLICT(aba) DO UPDATE SET ultimo_erro = excluded.ultimo_erro",
+                    (aba, stats['erro'])
+                )
+                sync_status['ultimo_erro'] = stats['erro']
+                sync_status['ultimo_erro_em'] = time.time()
+                sync_status['falhas'] += 1
+                log('WARNING', f"Envio da aba '{aba}' ao Sheets falhou (tentativa {grupo['tentativas'] + 1}). Nova tentativa agendada.")
+            conn.commit()
+        finally:
+            liberar_conexao(conn)
+    return enviadas
+
+def _sync_worker_loop():
+    while True:
+        _sync_evento.wait(SYNC_FLUSH_INTERVAL)
+        _sync_evento.clear()
+        try:
+            flush_sync_queue()
+        except Exception as e:
+            sync_status['ultimo_erro'] = str(e)
+            sync_status['ultimo_erro_em'] = time.time()
+            log('ERROR', f"Erro no worker da fila de sincronização: {e}.")
+
+def iniciar_sync_worker():
+    global _sync_worker
+    if _sync_worker is not None and _sync_worker.is_alive():
+        return
+    _sync_worker = threading.Thread(target=_sync_worker_loop, name='sync-sheets', daemon=True)
+    _sync_worker.start()
+    log('INFO', "Worker da fila de sincronização com Sheets iniciado.")
+
+def get_sync_queue_status():
+    conn = get_db_connection()
+    try:
+        por_aba = {row['aba']: row['total'] for row in conn.execute("SELECT aba, COUNT(*) AS total FROM sync_queue GROUP BY aba")}
+        resumo = conn.execute("SELECT COUNT(*) AS total, MIN(criado_em) AS mais_antiga, MAX(tentativas) AS tentativas FROM sync_queue").fetchone()
+        estados = {row['aba']: dict(row) for row in conn.execute("SELECT * FROM sync_estado")}
+    finally:
+        liberar_conexao(conn)
+    agora = time.time()
+    return {
+        'sheets_ativo': sheet is not None,
+        'sheets_configurado': _sheets_configurado(),
+        'worker_ativo': _sync_worker is not None and _sync_worker.is_alive(),
+        'profundidade': resumo['total'],
+        'por_aba': por_aba,
+        'lag_segundos': round(agora - resumo['mais_antiga'], 1) if resumo['mais_antiga'] else 0.0,
+        'max_tentativas': resumo['tentativas'] or 0,
+        'ultimo_flush': sync_status['ultimo_flush'],
+        'ultimo_erro': sync_status['ultimo_erro'],
+        'ultimo_erro_em': sync_status['ultimo_erro_em'],
+        'flushes': sync_status['flushes'],
+        'falhas': sync_status['falhas'],
+        'abas': estados,
+        'ultima_sincronizacao': ultima_sincronizacao,
+        'ultimo_pull': ultimo_pull,
+        'expiracao_reservas': expiracao_status,
+        'startup': startup_stats,
+        'db_pool': pool_status(),
+        'sheets_cliente': sheets_cliente_status(),
+        'backups': get_backup_status()
+    }
+
+# --- Importação e Exportação em Lote ---
+# Importação de carros: o arquivo (CSV ou JSON, em array ou um objeto por linha) é lido em stream,
+# validado em lotes e gravado com executemany em uma única transação, com uma única entrada na fila
+# de envio: o worker manda todas as linhas novas ao Sheets em uma chamada. É tudo ou nada: havendo
+# linha inválida, nada é gravado. A exportação é um gerador sobre um cursor do SQLite lido em lotes,
+# com memória constante qualquer que seja o tamanho da tabela.
+IMPORTACAO_LOTE = int(os.getenv('IMPORTACAO_LOTE', '500'))
+IMPORTACAO_MAX_ERROS = 50
+EXPORTACAO_LOTE = 500
+TABELAS_EXPORTAVEIS = {
+    'carros': (CARROS_HEADERS, carro_para_linha),
+    'reservas': (RESERVAS_HEADERS, reserva_para_linha),
+}
+# Cabeçalho da planilha (e do CSV exportado) -> campo; a ordem das colunas é a de CAMPOS_TABELA
+_CAMPO_DO_CABECALHO_CARRO = dict(zip(CARROS_HEADERS, ['id'] + CAMPOS_TABELA['carros']))
+
+def _objetos_json(texto, tamanho_bloco=65536):
+    """Objetos de um array JSON ou de JSON Lines, decodificados um a um conforme o arquivo é lido."""
+    decoder = json.JSONDecoder()
+    buffer, pos = '', 0
+    fim = iniciado = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos == len(buffer):
+            if fim:
+                return
+            bloco = texto.read(tamanho_bloco)
+            fim = not bloco
+            buffer, pos = bloco, 0
+            continue
+        if buffer[pos] == '[' and not iniciado:
+            iniciado = True
+            pos += 1
+            continue
+        iniciado = True
+        if buffer[pos] == ']':
+            return
+        try:
+            objeto, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if fim:
+                raise ValueError("JSON inválido")
+            # Objeto cortado no fim do bloco: lê mais e tenta de novo
+            bloco = texto.read(tamanho_bloco)
+            fim = not bloco
+            buffer, pos = buffer[pos:] + bloco, 0
+            continue
+        if not isinstance(objeto, dict):
+            raise ValueError("esperado um objeto JSON por carro")
+        yield objeto
+
+def _linhas_do_upload(arquivo, formato):
+    """(número da linha ou do objeto, dict) para cada registro do arquivo binário."""
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    if formato == 'csv':
+        leitor = csv.DictReader(texto)
+        for linha in leitor:
+            yield leitor.line_num, linha
+    else:
+        yield from enumerate(_objetos_json(texto), 1)
+
+def _carro_importado(linha):
+    """Carro pronto para inserir a partir de uma linha do arquivo. ValueError com o motivo se inválida."""
+    # Aceita os cabeçalhos da planilha/CSV exportado ou os nomes dos campos (JSON exportado); o ID é ignorado
+    dados = {_CAMPO_DO_CABECALHO_CARRO.get(chave, chave): valor for chave, valor in linha.items() if chave}
+    def texto(campo):
+        return '' if dados.get(campo) is None else str(dados[campo]).strip()
+    def numero(campo, tipo, padrao, minimo):
+        bruto = texto(campo).replace(',', '.') if tipo is float else texto(campo)
+        try:
+            valor = tipo(bruto) if bruto else padrao
+        except ValueError:
+            raise ValueError(f"{campo} inválido: '{bruto}'")
+        if valor < minimo:
+            raise ValueError(f"{campo} menor que {minimo}")
+        return valor
+    carro = {
+        'thumbnail_url': texto('thumbnail_url'),
+        'modelo': texto('modelo'),
+        'marca': texto('marca'),
+        'ano': texto('ano'),
+        'quantidade_disponivel': numero('quantidade_disponivel', int, 0, 0),
+        'preco_diaria': numero('preco_diaria', float, 0.0, 0),
+        'observacoes': texto('observacoes'),
+        'max_reservas': numero('max_reservas', int, 1, 1),
+    }
+    if not carro['modelo']:
+        raise ValueError("modelo vazio")
+    return carro
+
+def importar_carros(arquivo, formato):
+    """
+    Importa carros de um arquivo binário (CSV ou JSON), lido em stream. Retorna
+    {'importados', 'erros', 'duracao_ms'}; com qualquer erro nenhum carro é gravado.
+    """
+    inicio = time.perf_counter()
+    campos = CAMPOS_TABELA['carros']
+    sql = f"INSERT INTO carros ({', '.join(campos)}) VALUES ({', '.join('?' for _ in campos)})"
+    erros = []
+    importados = 0
+    lote = []
+    conn = get_db_connection()
+    try:
+        try:
+            for numero, linha in _linhas_do_upload(arquivo, formato):
+                try:
+                    carro = _carro_importado(linha)
+                except ValueError as e:
+                    erros.append(f"Linha {numero}: {e}")
+                    if len(erros) >= IMPORTACAO_MAX_ERROS:
+                        break
+                    continue
+                if erros:
+                    continue # Só valida o resto, para relatar todos os erros de uma vez
+                lote.append([carro[campo] for campo in campos])
+                if len(lote) >= IMPORTACAO_LOTE:
+                    conn.executemany(sql, lote)
+                    importados += len(lote)
+                    lote = []
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            erros.append(f"Arquivo inválido: {e}")
+        if not erros and lote:
+            conn.executemany(sql, lote)
+            importados += len(lote)
+        if erros or not importados:
+            conn.rollback()
+            importados = 0
+        else:
+            enqueue_sync(ABA_DA_TABELA['carros'], 'import', conn=conn)
+            _incrementar_versao(conn, 'carros')
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        liberar_conexao(conn)
+    if importados:
+        verificar_cache() # Recarrega os carros do DB, já com os ids gerados
+        log('INFO', f"{importados} carros importados em lote.")
+    return {'importados': importados, 'erros': erros, 'duracao_ms': round((time.perf_counter() - inicio) * 1000, 1)}
+
+def exportar_tabela(tabela, formato):
+    """Gerador com a tabela em CSV (colunas da planilha) ou JSON (nomes dos campos)."""
+    headers, para_linha = TABELAS_EXPORTAVEIS[tabela]
+    campos = ['id'] + CAMPOS_TABELA[tabela]
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(campos)} FROM {tabela} ORDER BY id")
+        if formato == 'csv':
+            saida = io.StringIO()
+            escritor = csv.writer(saida)
+            escritor.writerow(headers)
+            while True:
+                registros = cursor.fetchmany(EXPORTACAO_LOTE)
+                escritor.writerows(para_linha(dict(r)) for r in registros)
+                yield saida.getvalue()
+                saida.seek(0)
+                saida.truncate()
+                if not registros:
+                    return
+        else:
+            separador = '['
+            while True:
+                registros = cursor.fetchmany(EXPORTACAO_LOTE)
+                if not registros:
+                    yield '[]' if separador == '[' else ']'
+                    return
+                yield separador + ','.join(json.dumps(dict(r), ensure_ascii=False) for r in registros)
+                separador = ','
+    finally:
+        liberar_conexao(conn)
+
+# --- Backups do SQLite ---
+# Snapshots online com a API de backup do SQLite, copiando BACKUP_PAGINAS_POR_PASSO páginas por
+# passo. Com o DB em WAL cada passo é só uma leitura: reservas e edições continuam durante o backup
+# (se o DB muda entre dois passos o SQLite recomeça a cópia, o que aparece como 'reinicios'). O
+# arquivo é gravado como .tmp e renomeado só depois de verificado; os BACKUP_RETENCAO mais recentes
+# são mantidos. A restauração grava o arquivo enviado em disco, confere a integridade e o copia para
+# o DB em uso também pela API de backup: os outros workers veem os dados antigos ou os novos, nunca
+# uma mistura, e recarregam o cache porque as versões de cache_versao são incrementadas.
+BACKUP_DIR = os.getenv('BACKUP_DIR') or os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), 'backups')
+BACKUP_INTERVALO = float(os.getenv('BACKUP_INTERVALO', '3600')) # 0 desativa o agendamento
+BACKUP_RETENCAO = int(os.getenv('BACKUP_RETENCAO', '24'))
+BACKUP_PAGINAS_POR_PASSO = int(os.getenv('BACKUP_PAGINAS_POR_PASSO', '1024'))
+TABELAS_OBRIGATORIAS_BACKUP = ('carros', 'usuarios', 'reservas', 'cache_versao')
+_RE_ARQUIVO_BACKUP = re.compile(r'^jgminis_\d{8}_\d{6}_\d{3}(_[a-z_]+)?\.db$')
+_backup_worker = None
+_backup_lock = threading.Lock()
+backup_status = {'backups': 0, 'falhas': 0, 'ultimo': None, 'ultimo_erro': None, 'ultima_restauracao': None}
+
+def _copiar_db(origem, destino):
+    """Copia com a API de backup, passo a passo. Retorna (passos, reinícios, páginas)."""
+    contagem = {'passos': 0, 'reinicios': 0, 'restantes': None, 'paginas': 0}
+    def progresso(status, restantes, total):
+        if contagem['restantes'] is not None and restantes > contagem['restantes']:
+            contagem['reinicios'] += 1 # Origem alterada entre dois passos: o SQLite recomeçou
+        contagem.update(passos=contagem['passos'] + 1, restantes=restantes, paginas=total)
+    origem.backup(destino, pages=BACKUP_PAGINAS_POR_PASSO, progress=progresso)
+    return contagem['passos'], contagem['reinicios'], contagem['paginas']
+
+def _verificar_arquivo_db(caminho):
+    """Levanta ValueError se o arquivo não for um DB íntegro do app."""
+    with open(caminho, 'rb') as f:
+        if f.read(16) != b'SQLite format 3\x00':
+            raise ValueError("o arquivo não é um banco SQLite")
+    conn = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+    try:
+        resultado = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if resultado != 'ok':
+            raise ValueError(f"falha na verificação de integridade: {resultado}")
+        tabelas = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        faltando = [t for t in TABELAS_OBRIGATORIAS_BACKUP if t not in tabelas]
+        if faltando:
+            raise ValueError(f"tabelas ausentes: {', '.join(faltando)}")
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"arquivo SQLite inválido: {e}")
+    finally:
         conn.close()
-        print(f"INFO - Dados carregados do DB local: {len(carros)} carros, {len(usuarios)} usuários, {len(reservas)} reservas.")
-    print("INFO - App bootado com sucesso.")
+
+def listar_backups():
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    arquivos = []
+    for nome in sorted(os.listdir(BACKUP_DIR), reverse=True):
+        if _RE_ARQUIVO_BACKUP.match(nome):
+            info = os.stat(os.path.join(BACKUP_DIR, nome))
+            arquivos.append({'arquivo': nome, 'tamanho': info.st_size, 'criado_em': info.st_mtime})
+    return arquivos
+
+def _aplicar_retencao():
+    # Backups feitos antes de uma restauração contam na retenção como os demais
+    removidos = []
+    for backup in listar_backups()[BACKUP_RETENCAO:]:
+        os.remove(os.path.join(BACKUP_DIR, backup['arquivo']))
+        removidos.append(backup['arquivo'])
+    return removidos
+
+def criar_backup(sufixo=''):
+    """Grava um snapshot do DB em BACKUP_DIR. Retorna as estatísticas do backup."""
+    inicio = time.perf_counter()
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    nome = f"jgminis_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]}{sufixo}.db"
+    caminho = os.path.join(BACKUP_DIR, nome)
+    temporario = caminho + '.tmp'
+    with _backup_lock:
+        try:
+            origem = sqlite3.connect(DATABASE_PATH, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+            destino = sqlite3.connect(temporario)
+            try:
+                passos, reinicios, paginas = _copiar_db(origem, destino)
+            finally:
+                destino.close()
+                origem.close()
+            _verificar_arquivo_db(temporario)
+            os.replace(temporario, caminho)
+        except Exception as e:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            backup_status['falhas'] += 1
+            backup_status['ultimo_erro'] = f"{datetime.now().isoformat(timespec='seconds')}: {e}"
+            log('ERROR', f"Falha no backup do DB: {e}.")
+            raise
+        removidos = _aplicar_retencao()
+    stats = {
+        'arquivo': nome,
+        'tamanho': os.path.getsize(caminho),
+        'paginas': paginas,
+        'passos': passos,
+        'reinicios': reinicios,
+        'duracao_ms': round((time.perf_counter() - inicio) * 1000, 1),
+        'criado_em': time.time(),
+        'removidos_pela_retencao': removidos,
+    }
+    backup_status['backups'] += 1
+    backup_status['ultimo'] = stats
+    observar('jgminis_backup_duracao_segundos', stats['duracao_ms'] / 1000)
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.execute(
+                "UPDATE backup_estado SET ultimo_backup = ? WHERE id = 1", (json.dumps(stats),)
+            )
+    finally:
+        liberar_conexao(conn)
+    log('INFO', f"Backup do DB gravado em {nome} ({stats['tamanho']} bytes, {passos} passos) em {stats['duracao_ms']} ms.")
+    return stats
+
+def restaurar_backup(arquivo):
+    """
+    Substitui o conteúdo do DB pelo backup enviado (arquivo binário, lido em blocos). Um backup do
+    estado atual é feito antes. Levanta ValueError se o arquivo for inválido. Retorna as estatísticas.
+    """
+    inicio = time.perf_counter()
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    recebido = os.path.join(BACKUP_DIR, f"restauracao_{os.getpid()}_{int(time.time() * 1000)}.db.tmp")
+    try:
+        with open(recebido, 'wb') as f:
+            shutil.copyfileobj(arquivo, f, 1024 * 1024)
+        _verificar_arquivo_db(recebido)
+        anterior = criar_backup('_antes_da_restauracao')
+
+        versoes = {}
+        def ler_versoes_vigentes(status, restantes, total):
+            # Chamado a cada passo da cópia. Do primeiro passo em diante a cópia segura o lock de
+            # escrita (ninguém mais incrementa versões) e as outras conexões ainda leem o DB antigo:
+            # são as últimas versões que qualquer worker pode ter visto
+            if versoes or not restantes:
+                return
+            conn = get_db_connection()
+            try:
+                versoes.update((row['tabela'], row['versao']) for row in conn.execute("SELECT tabela, versao FROM cache_versao"))
+            finally:
+                liberar_conexao(conn)
+
+        # Conexão própria: a cópia toma o lock de escrita do DB e troca todas as páginas de uma vez
+        origem = sqlite3.connect(f"file:{recebido}?mode=ro", uri=True)
+        destino = sqlite3.connect(DATABASE_PATH, timeout=RESERVA_BUSY_TIMEOUT_MS / 1000)
+        try:
+            origem.backup(destino, pages=1, progress=ler_versoes_vigentes)
+            destino.execute("PRAGMA journal_mode=WAL")
+        finally:
+            destino.close()
+            origem.close()
+    finally:
+        if os.path.exists(recebido):
+            os.remove(recebido)
+
+    conn = get_db_connection()
+    try:
+        aplicar_migracoes(conn) # Backup de uma versão anterior do esquema
+        _criar_admin_padrao_se_faltar(conn)
+        with conn:
+            # Versões acima das que qualquer worker já viu (as do DB antigo e os incrementos feitos
+            # no restaurado desde a cópia): todos recarregam o cache
+            for tabela in CAMPOS_TABELA:
+                conn.execute(
+                    "INSERT INTO cache_versao (tabela, versao) VALUES (?, ?) "
+                    "ON CONFLICT(tabela) DO UPDATE SET versao = MAX(versao, excluded.versao - 1) + 1",
+                    (tabela, versoes.get(tabela, 0) + 1)
+                )
+            # O DB restaurado passa a ser a verdade: a planilha é reescrita inteira a partir dele
+            conn.execute("DELETE FROM sync_estado")
+            conn.execute("UPDATE sheets_pull SET checksums = NULL WHERE id = 1")
+            for aba in ABA_DA_TABELA.values():
+                enqueue_sync(aba, 'restauracao', conn=conn)
+    finally:
+        liberar_conexao(conn)
+    with _sheets_lock:
+        sheets_snapshot.clear()
+    verificar_cache()
+    stats = {
+        'backup_anterior': anterior['arquivo'],
+        'linhas': {tabela: len(_cache_da_tabela(tabela)) for tabela in CAMPOS_TABELA},
+        'duracao_ms': round((time.perf_counter() - inicio) * 1000, 1),
+        'restaurado_em': time.time(),
+    }
+    backup_status['ultima_restauracao'] = stats
+    log('WARNING', f"DB restaurado de backup enviado em {stats['duracao_ms']} ms; estado anterior salvo em {anterior['arquivo']}.")
+    return stats
+
+def _reivindicar_backup():
+    # Só um worker por intervalo faz o backup agendado
+    conn = get_db_connection()
+    try:
+        with conn:
+            cursor = conn.execute(
+                "UPDATE backup_estado SET ultimo_inicio = ?, ultimo_pid = ? WHERE id = 1 AND COALESCE(ultimo_inicio, 0) <= ?",
+                (time.time(), os.getpid(), time.time() - BACKUP_INTERVALO * 0.9)
+            )
+            return cursor.rowcount == 1
+    finally:
+        liberar_conexao(conn)
+
+def _backup_loop():
+    while True:
+        time.sleep(BACKUP_INTERVALO)
+        try:
+            if _reivindicar_backup():
+                criar_backup()
+        except Exception as e:
+            log('ERROR', f"Erro no backup agendado: {e}.")
+
+def iniciar_backups_agendados():
+    global _backup_worker
+    if BACKUP_INTERVALO <= 0 or (_backup_worker is not None and _backup_worker.is_alive()):
+        return
+    _backup_worker = threading.Thread(target=_backup_loop, name='backup-db', daemon=True)
+    _backup_worker.start()
+    log('INFO', f"Backup do DB a cada {BACKUP_INTERVALO:.0f}s em {BACKUP_DIR} (mantendo {BACKUP_RETENCAO}).")
+
+def get_backup_status():
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT ultimo_inicio, ultimo_pid, ultimo_backup FROM backup_estado WHERE id = 1").fetchone()
+    finally:
+        liberar_conexao(conn)
+    return {
+        'diretorio': BACKUP_DIR,
+        'intervalo_segundos': BACKUP_INTERVALO,
+        'retencao': BACKUP_RETENCAO,
+        'ultimo': json.loads(row['ultimo_backup']) if row and row['ultimo_backup'] else None,
+        'ultimo_pid': row['ultimo_pid'] if row else None,
+        'arquivos': listar_backups(),
+        'neste_worker': dict(backup_status),
+    }
+
+# --- Prontidão (/ready) ---
+# /health só diz que o processo responde; /ready diz se este worker deve receber tráfego:
+# cache carregado e em dia com o DB, DB aceitando escritas rápido, dados do Sheets recentes
+# e fila de envio andando. Responde 503 quando algo está degradado, para o balanceador desviar.
+READY_DB_LATENCIA_MAX_MS = float(os.getenv('READY_DB_LATENCIA_MAX_MS', '500'))
+READY_PULL_IDADE_MAX = float(os.getenv('READY_PULL_IDADE_MAX', str(SHEETS_REFRESH_INTERVAL * 3))) # 0 desativa
+READY_FILA_LAG_MAX = float(os.getenv('READY_FILA_LAG_MAX', '600'))
+
+READY_DB_CACHE_SEGUNDOS = float(os.getenv('READY_DB_CACHE_SEGUNDOS', '5'))
+_escrita_db_medida = {'resultado': None, 'medido_em': 0.0}
+_escrita_db_lock = threading.Lock()
+
+def _testar_lock_de_escrita():
+    # Toma o lock de escrita (BEGIN IMMEDIATE) e desfaz sem gravar nada: mede a espera pelo lock e
+    # detecta DB somente leitura sem commit, com busy_timeout curto para não pendurar o probe
+    conn = get_db_connection()
+    inicio = time.perf_counter()
+    try:
+        conn.execute(f"PRAGMA busy_timeout = {int(READY_DB_LATENCIA_MAX_MS * 2)}")
+        conn.execute("BEGIN IMMEDIATE")
+        conn.rollback()
+        return {'ok': True, 'latencia_escrita_ms': round((time.perf_counter() - inicio) * 1000, 2), 'erro': None}
+    except sqlite3.Error as e:
+        return {'ok': False, 'latencia_escrita_ms': round((time.perf_counter() - inicio) * 1000, 2), 'erro': str(e)}
+    finally:
+        conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        liberar_conexao(conn)
+
+def _medir_escrita_db():
+    # O /ready é público: a medição é reaproveitada por READY_DB_CACHE_SEGUNDOS, e probes
+    # simultâneos esperam a mesma medição em vez de disputar o lock de escrita com as reservas
+    with _escrita_db_lock:
+        if _escrita_db_medida['resultado'] is None or time.monotonic() - _escrita_db_medida['medido_em'] >= READY_DB_CACHE_SEGUNDOS:
+            _escrita_db_medida['resultado'] = _testar_lock_de_escrita()
+            _escrita_db_medida['medido_em'] = time.monotonic()
+        return dict(_escrita_db_medida['resultado'])
+
+def verificar_prontidao():
+    """Estado de prontidão deste worker. Retorna (pronto, detalhes)."""
+    agora = time.time()
+    problemas = []
+
+    db = _medir_escrita_db()
+    if not db['ok']:
+        problemas.append(f"DB não aceita escrita: {db['erro']}")
+    elif db['latencia_escrita_ms'] > READY_DB_LATENCIA_MAX_MS:
+        problemas.append(f"Escrita no DB lenta: {db['latencia_escrita_ms']} ms")
+
+    conn = get_db_connection()
+    try:
+        versoes_db = {row['tabela']: row['versao'] for row in conn.execute("SELECT tabela, versao FROM cache_versao")}
+        pull = conn.execute("SELECT ultimo_sucesso, ultimo_pid FROM sheets_pull WHERE id = 1").fetchone()
+        fila = conn.execute("SELECT COUNT(*) AS total, MIN(criado_em) AS mais_antiga FROM sync_queue").fetchone()
+        envio = conn.execute("SELECT MAX(ultimo_flush) AS ultimo_flush FROM sync_estado").fetchone()
+    finally:
+        liberar_conexao(conn)
+
+    dados = {
+        tabela: {'linhas': len(_cache_da_tabela(tabela)), 'versao_cache': _versoes_locais.get(tabela), 'versao_db': versoes_db.get(tabela)}
+        for tabela in CAMPOS_TABELA
+    }
+    if not _app_iniciado:
+        problemas.append("App ainda não inicializado")
+    defasadas = [t for t, d in dados.items() if d['versao_cache'] != d['versao_db']]
+    if defasadas:
+        problemas.append(f"Cache defasado em relação ao DB: {', '.join(defasadas)}")
+
+    configurado = _sheets_configurado()
+    ultimo_sucesso = pull['ultimo_sucesso'] if pull else None
+    idade_pull = round(agora - ultimo_sucesso, 1) if ultimo_sucesso else None
+    if configurado:
+        if ultimo_sucesso is None and not carros:
+            problemas.append("Catálogo vazio e nenhuma leitura do Sheets concluída")
+        elif READY_PULL_IDADE_MAX > 0 and (idade_pull is None or idade_pull > READY_PULL_IDADE_MAX):
+            problemas.append(f"Dados do Sheets desatualizados (última leitura há {idade_pull} s)")
+        if sheet is None and _sheet_falhou_em is not None:
+            problemas.append("Conexão com o Sheets falhou neste worker")
+
+    lag_fila = round(agora - fila['mais_antiga'], 1) if fila['mais_antiga'] else 0.0
+    if configurado and lag_fila > READY_FILA_LAG_MAX:
+        problemas.append(f"Fila de envio ao Sheets parada há {lag_fila} s ({fila['total']} pendentes)")
+
+    detalhes = {
+        'status': 'degradado' if problemas else 'pronto',
+        'problemas': problemas,
+        'pid': os.getpid(),
+        'uptime_segundos': round(agora - startup_stats['iniciado_em'], 1) if startup_stats else None,
+        'dados': dados,
+        'db': db,
+        'sheets': {
+            'configurado': configurado,
+            'conectado': sheet is not None,
+            'ultima_falha_conexao': _sheet_falhou_em,
+            'circuito': circuito_sheets['estado'],
+            'ultima_leitura_sucesso': ultimo_sucesso,
+            'ultima_leitura_pid': pull['ultimo_pid'] if pull else None,
+            'idade_leitura_segundos': idade_pull,
+            'ultimo_envio': envio['ultimo_flush'],
+        },
+        'fila_envio': {
+            'pendentes': fila['total'],
+            'lag_segundos': lag_fila,
+            'ultimo_erro': sync_status['ultimo_erro'],
+        },
+    }
+    return not problemas, detalhes
+
+# --- Inicialização do App ---
+# Importar este módulo não tem efeitos colaterais: create_app() prepara o DB, carrega o cache do
+# snapshot local do SQLite e inicia as threads de background. O Sheets só é lido depois, pelo
+# refresh em background, com o worker já atendendo requests.
+_app_iniciado = False
+_inicializacao_lock = threading.Lock()
+startup_stats = {}
+
+def create_app(tarefas_em_background=True):
+    """
+    Prepara o app uma vez por processo. tarefas_em_background=False não inicia as threads (fila
+    de envio, refresh do Sheets, expiração e backups): quem chama roda essas tarefas por conta própria,
+    como o adaptador de edge em functions/, onde não há threads.
+    """
+    global _app_iniciado, startup_stats
+    with _inicializacao_lock:
+        if _app_iniciado:
+            return app
+        inicio = time.perf_counter()
+        etapas = {}
+        with app.app_context():
+            for nome, etapa in (
+                ('init_db', init_db),
+                ('carregar_db', carregar_dados_do_db),
+                ('templates', precompilar_templates),
+            ):
+                t0 = time.perf_counter()
+                etapa()
+                etapas[nome] = round((time.perf_counter() - t0) * 1000, 1)
+            if tarefas_em_background:
+                iniciar_sync_worker()
+                iniciar_sheets_refresher()
+                iniciar_expiracao_reservas()
+                iniciar_backups_agendados()
+        startup_stats = {
+            'pid': os.getpid(),
+            'iniciado_em': time.time(),
+            'etapas_ms': etapas,
+            'total_ms': round((time.perf_counter() - inicio) * 1000, 1)
+        }
+        _app_iniciado = True
+    log('INFO', f"App bootado com sucesso em {startup_stats['total_ms']} ms ({etapas}).")
+    return app
 
 # --- Rotas do Aplicativo ---
 
+@app.errorhandler(404)
+def pagina_nao_encontrada(e):
+    return render_template('404.html'), 404
+
+@app.errorhandler(500)
+def erro_interno(e):
+    return render_template('500.html'), 500
+
+@app.before_request
+def iniciar_medicao_do_request():
+    g.inicio_request = time.perf_counter()
+    # Profiler opcional por request: ?profile=1 (só admins) devolve o relatório no lugar da página
+    if request.args.get('profile') == '1' and session.get('is_admin'):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def registrar_medicao_do_request(resposta):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        resposta.get_data() # Consome páginas em streaming para o relatório incluir a renderização
+        profiler.disable()
+        relatorio = io.StringIO()
+        pstats.Stats(profiler, stream=relatorio).sort_stats('cumulative').print_stats(40)
+        resposta = Response(relatorio.getvalue(), mimetype='text/plain')
+    inicio = g.pop('inicio_request', None)
+    if inicio is None:
+        return resposta
+    duracao = time.perf_counter() - inicio
+    rota = request.url_rule.rule if request.url_rule else 'desconhecida'
+    observar('jgminis_http_request_duration_seconds', duracao, rota=rota, metodo=request.method)
+    incrementar('jgminis_http_requests_total', rota=rota, metodo=request.method, status=resposta.status_code)
+    if LOG_REQUESTS:
+        log('INFO', 'request', rota=rota, metodo=request.method, status=resposta.status_code, duracao_ms=round(duracao * 1000, 2))
+    return resposta
+
+@app.before_request
+def sincronizar_cache_do_worker():
+    if not _app_iniciado:
+        create_app() # Servido como 'app:app' ou pelo 'flask run', sem passar pela factory
+    verificar_cache()
+
 @app.route('/health')
 def health():
     return 'OK'
 
+@app.route('/ready')
+def ready():
+    pronto, detalhes = verificar_prontidao()
+    return jsonify(detalhes), 200 if pronto else 503
+
+@app.route('/metrics')
+def metrics():
+    if METRICS_TOKEN:
+        token = request.args.get('token') or request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(token, METRICS_TOKEN):
+            return 'Não autorizado', 401
+    return Response(metricas_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form['email']
         senha = request.form['senha']
-        senha_hash = hashlib.sha256(senha.encode()).hexdigest()
-
-        # Tenta autenticar com usuários da planilha/DB
-        user_found = False
-        for user in usuarios:
-            if user['email'] == email and user['senha_hash'] == senha_hash:
-                session['logged_in'] = True
-                session['user_email'] = email
-                session['is_admin'] = user.get('is_admin', 0) == 1
-                user_found = True
-                break
-        
-        if user_found:
+
+        # Busca pelo índice de email (o admin padrão é garantido no DB por init_db)
+        try:
+            user = autenticar(email, senha)
+        except SenhaOcupada: # Contado em jgminis_senhas_recusadas_total; sem log para não inundar sob carga
+            return render_template('login.html', erro='ocupado'), 503, {'Retry-After': '1'}
+        if user:
+            session['logged_in'] = True
+            session['user_email'] = email
+            session['user_id'] = user['id']
+            session['is_admin'] = user.get('is_admin', 0) == 1
             return redirect(url_for('home'))
-        else:
-            # Fallback para admin padrão se não encontrado na lista
-            if email == 'admin@jgminis.com.br' and senha_hash == hashlib.sha256('admin123'.encode()).hexdigest():
-                session['logged_in'] = True
-                session['user_email'] = email
-                session['is_admin'] = True
-                return redirect(url_for('home'))
-            
-        return render_template_string('''
-            <style>
-                body { font-family: Arial, sans-serif; background-color: #f8f9fa; display: flex; justify-content: center; align-items: center; height: 100vh; margin: 0; }
-                .login-container { background-color: #ffffff; padding: 30px; border-radius: 8px; box-shadow: 0 4px 8px rgba(0,0,0,0.1); width: 300px; text-align: center; }
-                .login-container h2 { color: #343a40; margin-bottom: 20px; }
-                .login-container input[type="email"], .login-container input[type="password"] { width: calc(100% - 20px); padding: 10px; margin-bottom: 15px; border: 1px solid #ced4da; border-radius: 4px; box-sizing: border-box; }
-                .login-container input[type="submit"] { background-color: #007bff; color: white; padding: 10px 15px; border: none; border-radius: 4px; cursor: pointer; font-size: 16px; width: 100%; }
-                .login-container input[type="submit"]:hover { background-color: #0056b3; }
-                .error-message { color: #dc3545; margin-top: 10px; }
-            </style>
-            <div class="login-container">
-                <h2>Login</h2>
-                <form method="post">
-                    <input type="email" name="email" placeholder="Email" required><br>
-                    <input type="password" name="senha" placeholder="Senha" required><br>
-                    <input type="submit" value="Entrar">
-                </form>
-                <p class="error-message">Login falhou. Verifique seu email e senha.</p>
-            </div>
-        ''')
-    
-    return render_template_string('''
-        <style>
-            body { font-family: Arial, sans-serif; background-color: #f8f9fa; display: flex; justify-content: center; align-items: center; height: 100vh; margin: 0; }
-            .login-container { background-color: #ffffff; padding: 30px; border-radius: 8px; box-shadow: 0 4px 8px rgba(0,0,0,0.1); width: 300px; text-align: center; }
-            .login-container h2 { color: #343a40; margin-bottom: 20px; }
-            .login-container input[type="email"], .login-container input[type="password"] { width: calc(100% - 20px); padding: 10px; margin-bottom: 15px; border: 1px solid #ced4da; border-radius: 4px; box-sizing: border-box; }
-            .login-container input[type="submit"] { background-color: #007bff; color: white; padding: 10px 15px; border: none; border-radius: 4px; cursor: pointer; font-size: 16px; width: 100%; }
-            .login-container input[type="submit"]:hover { background-color: #0056b3; }
-        </style>
-        <div class="login-container">
-            <h2>Login</h2>
-            <form method="post">
-                <input type="email" name="email" placeholder="Email" required><br>
-                <input type="password" name="senha" placeholder="Senha" required><br>
-                <input type="submit" value="Entrar">
-            </form>
-        </div>
-    ''')
+
+        return render_template('login.html', erro=True)
+
+    return render_template('login.html')
 
 @app.route('/logout')
 def logout():
     session.pop('logged_in', None)
     session.pop('user_email', None)
+    session.pop('user_id', None)
     session.pop('is_admin', None)
     return redirect(url_for('login'))
 
 @app.route('/home')
+@cache_de_pagina('carros')
 def home():
     if not session.get('logged_in'):
         return redirect(url_for('login'))
-    
-    if not carros:
-        return render_template_string('''
-            <style>
-                body { font-family: Arial, sans-serif; background-color: #f8f9fa; margin: 0; padding: 0; }
-                .navbar { background-color: #007bff; color: white; padding: 15px 20px; display: flex; justify-content: space-between; align-items: center; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
-                .navbar h1 { margin: 0; font-size: 24px; }
-                .navbar a { color: white; text-decoration: none; margin-left: 20px; font-size: 16px; }
-                .navbar a:hover { text-decoration: underline; }
-                .content { padding: 40px 20px; text-align: center; }
-                .content h2 { color: #343a40; margin-bottom: 20px; }
-                .no-items { color: #6c757d; font-size: 18px; }
-            </style>
-            <div class="navbar">
-                <h1>Bem-vindo ao JG Minis!</h1>
-                <div>
-                    <a href="/admin">Admin</a>
-                    <a href="/logout">Sair</a>
-                </div>
-            </div>
-            <div class="content">
-                <h2>Nossas Miniaturas Disponíveis</h2>
-                <p class="no-items">Nenhuma miniatura disponível no momento.</p>
-            </div>
-        ''')
-
-    html_content = '''
-    <!DOCTYPE html>
-    <html lang="pt-br">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>JG Minis - Miniaturas</title>
-        <style>
-            body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f8f9fa; margin: 0; padding: 0; color: #343a40; }
-            .navbar { background-color: #007bff; color: white; padding: 15px 20px; display: flex; justify-content: space-between; align-items: center; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
-            .navbar h1 { margin: 0; font-size: 24px; }
-            .navbar a { color: white; text-decoration: none; margin-left: 20px; font-size: 16px; }
-            .navbar a:hover { text-decoration: underline; }
-            .content { padding: 40px 20px; text-align: center; }
-            .content h2 { color: #343a40; margin-bottom: 30px; font-size: 28px; }
-            .grid-container {
-                display: grid;
-                grid-template-columns: repeat(auto-fill, minmax(280px, 1fr));
-                gap: 25px;
-                max-width: 1200px;
-                margin: 0 auto;
-                padding: 20px 0;
-            }
-            .card {
-                background-color: #ffffff;
-                border-radius: 10px;
-                box-shadow: 0 4px 12px rgba(0,0,0,0.08);
-                overflow: hidden;
-                transition: transform 0.2s ease-in-out, box-shadow 0.2s ease-in-out;
-                display: flex;
-                flex-direction: column;
-                align-items: center;
-                text-align: center;
-                padding-bottom: 15px;
-            }
-            .card:hover {
-                transform: translateY(-5px);
-                box-shadow: 0 6px 16px rgba(0,0,0,0.12);
-            }
-            .card-image {
-                width: 100%;
-                height: 200px;
-                object-fit: cover;
-                border-bottom: 1px solid #eee;
-            }
-            .card-body {
-                padding: 15px;
-                width: 100%;
-            }
-            .card-body h3 {
-                font-size: 20px;
-                margin-top: 0;
-                margin-bottom: 10px;
-                color: #007bff;
-            }
-            .card-body p {
-                font-size: 14px;
-                margin: 5px 0;
-                color: #555;
-            }
-            .card-body .price {
-                font-size: 18px;
-                font-weight: bold;
-                color: #28a745;
-                margin-top: 10px;
-            }
-            .card-body button {
-                background-color: #28a745;
-                color: white;
-                border: none;
-                padding: 10px 20px;
-                border-radius: 5px;
-                cursor: pointer;
-                font-size: 16px;
-                margin-top: 15px;
-                transition: background-color 0.2s ease-in-out;
-            }
-            .card-body button:hover {
-                background-color: #218838;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="navbar">
-            <h1>Bem-vindo ao JG Minis!</h1>
-            <div>
-                <a href="/admin">Admin</a>
-                <a href="/logout">Sair</a>
-            </div>
-        </div>
-        <div class="content">
-            <h2>Nossas Miniaturas Disponíveis</h2>
-            <div class="grid-container">
-    '''
-    for carro in carros:
-        html_content += f'''
-                <div class="card">
-                    <img src="{carro.get('thumbnail_url', 'https://via.placeholder.com/200x150?text=Sem+Imagem')}" class="card-image" alt="{carro.get('modelo', 'Miniatura')}">
-                    <div class="card-body">
-                        <h3>{carro.get('modelo', 'N/A')}</h3>
-                        <p><strong>Marca:</strong> {carro.get('marca', 'N/A')}</p>
-                        <p><strong>Previsão:</strong> {carro.get('ano', 'N/A')}</p>
-                        <p><strong>Disponível:</strong> {carro.get('quantidade_disponivel', 0)}</p>
-                        <p class="price">R$ {carro.get('preco_diaria', 0.0):.2f}</p>
-                        <button onclick="alert('Reserva para {carro.get('modelo', 'Miniatura')} solicitada!')">Reservar</button>
-                    </div>
-                </div>
-        '''
-    html_content += '''
-            </div>
-        </div>
-    </body>
-    </html>
-    '''
-    return html_content
+    try:
+        filtros = filtros_catalogo_da_request(request.args)
+    except ValueError:
+        filtros = filtros_catalogo_da_request({})
+    resultado = consultar_catalogo(**filtros)
+    # Página enviada em partes conforme o template é renderizado
+    return Response(stream_with_context(stream_template(
+        'home.html',
+        carros=resultado['itens'],
+        resultado=resultado,
+        filtros=filtros,
+        marcas=marcas_do_catalogo(),
+        args_pagina=_args_pagina,
+        card_carro_html=card_carro_html
+    )), mimetype='text/html')
+
+def _args_pagina(pagina):
+    # Mantém os filtros atuais nos links de paginação
+    args = request.args.to_dict()
+    args['pagina'] = pagina
+    return args
+
+@app.route('/api/carros')
+@cache_de_pagina('carros')
+def api_carros():
+    if not session.get('logged_in'):
+        return jsonify({'erro': 'login necessário'}), 401
+    try:
+        filtros = filtros_catalogo_da_request(request.args)
+    except ValueError as e:
+        return jsonify({'erro': f'parâmetro inválido: {e}'}), 400
+    resultado = consultar_catalogo(**filtros)
+    resultado['ordem'] = filtros['ordem']
+    resultado['direcao'] = filtros['direcao']
+    return jsonify(resultado)
 
 @app.route('/admin')
+@cache_de_pagina('carros', 'usuarios', 'reservas')
 def admin():
     if not session.get('logged_in') or not session.get('is_admin'):
         return redirect(url_for('login'))
-    
-    html_content = '''
-    <!DOCTYPE html>
-    <html lang="pt-br">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Admin JG Minis</title>
-        <style>
-            body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f8f9fa; margin: 0; padding: 0; color: #343a40; }
-            .navbar { background-color: #007bff; color: white; padding: 15px 20px; display: flex; justify-content: space-between; align-items: center; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
-            .navbar h1 { margin: 0; font-size: 24px; }
-            .navbar a { color: white; text-decoration: none; margin-left: 20px; font-size: 16px; }
-            .navbar a:hover { text-decoration: underline; }
-            .admin-container { max-width: 1200px; margin: 40px auto; padding: 20px; background-color: #ffffff; border-radius: 8px; box-shadow: 0 4px 12px rgba(0,0,0,0.08); }
-            .admin-container h2 { color: #007bff; margin-bottom: 25px; border-bottom: 2px solid #eee; padding-bottom: 10px; }
-            .admin-container h3 { color: #343a40; margin-top: 30px; margin-bottom: 15px; }
-            .table-responsive { overflow-x: auto; margin-bottom: 30px; }
-            table { width: 100%; border-collapse: collapse; margin-top: 10px; }
-            th, td { border: 1px solid #dee2e6; padding: 10px; text-align: left; font-size: 14px; }
-            th { background-color: #e9ecef; font-weight: bold; color: #495057; }
-            tr:nth-child(even) { background-color: #f2f2f2; }
-            .actions a { color: #007bff; text-decoration: none; margin-right: 10px; }
-            .actions a:hover { text-decoration: underline; }
-            .add-button { background-color: #28a745; color: white; padding: 8px 15px; border: none; border-radius: 5px; cursor: pointer; text-decoration: none; font-size: 14px; display: inline-block; margin-top: 10px; }
-            .add-button:hover { background-color: #218838; }
-            .sync-button { background-color: #ffc107; color: #343a40; padding: 10px 20px; border: none; border-radius: 5px; cursor: pointer; text-decoration: none; font-size: 16px; display: inline-block; margin-top: 30px; }
-            .sync-button:hover { background-color: #e0a800; }
-        </style>
-    </head>
-    <body>
-        <div class="navbar">
-            <h1>Admin JG Minis</h1>
-            <div>
-                <a href="/home">Home</a>
-                <a href="/logout">Sair</a>
-            </div>
-        </div>
-        <div class="admin-container">
-            <h2>Painel Administrativo</h2>
-
-            <h3>Carros</h3>
-            <div class="table-responsive">
-                <table>
-                    <thead>
-                        <tr>
-                            <th>ID</th>
-                            <th>Modelo</th>
-                            <th>Marca</th>
-                            <th>Preço Diária</th>
-                            <th>Disponível</th>
-                            <th>Ações</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-    '''
-    for carro in carros:
-        html_content += f'''
-                        <tr>
-                            <td>{carro.get('id', 'N/A')}</td>
-                            <td>{carro.get('modelo', 'N/A')}</td>
-                            <td>{carro.get('marca', 'N/A')}</td>
-                            <td>R$ {carro.get('preco_diaria', 0.0):.2f}</td>
-                            <td>{carro.get('quantidade_disponivel', 0)}</td>
-                            <td class="actions">
-                                <a href="/admin/edit_carro/{carro.get('id', '')}">Editar</a>
-                                <a href="/admin/delete_carro/{carro.get('id', '')}" onclick="return confirm('Tem certeza que deseja deletar este carro?');">Deletar</a>
-                            </td>
-                        </tr>
-        '''
-    html_content += '''
-                    </tbody>
-                </table>
-            </div>
-            <a href="/admin/add_carro" class="add-button">Adicionar Carro</a>
-
-            <h3>Usuários</h3>
-            <div class="table-responsive">
-                <table>
-                    <thead>
-                        <tr>
-                            <th>ID</th>
-                            <th>Nome</th>
-                            <th>Email</th>
-                            <th>Admin</th>
-                            <th>Ações</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-    '''
-    for usuario in usuarios:
-        html_content += f'''
-                        <tr>
-                            <td>{usuario.get('id', 'N/A')}</td>
-                            <td>{usuario.get('nome', 'N/A')}</td>
-                            <td>{usuario.get('email', 'N/A')}</td>
-                            <td>{'Sim' if usuario.get('is_admin', 0) == 1 else 'Não'}</td>
-                            <td class="actions">
-                                <a href="/admin/edit_usuario/{usuario.get('id', '')}">Editar</a>
-                                <a href="/admin/delete_usuario/{usuario.get('id', '')}" onclick="return confirm('Tem certeza que deseja deletar este usuário?');">Deletar</a>
-                            </td>
-                        </tr>
-        '''
-    html_content += '''
-                    </tbody>
-                </table>
-            </div>
-            <a href="/admin/add_usuario" class="add-button">Adicionar Usuário</a>
-
-            <h3>Reservas</h3>
-            <div class="table-responsive">
-                <table>
-                    <thead>
-                        <tr>
-                            <th>ID</th>
-                            <th>Usuário ID</th>
-                            <th>Carro ID</th>
-                            <th>Data</th>
-                            <th>Status</th>
-                            <th>Ações</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-    '''
-    for reserva in reservas:
-        html_content += f'''
-                        <tr>
-                            <td>{reserva.get('id', 'N/A')}</td>
-                            <td>{reserva.get('usuario_id', 'N/A')}</td>
-                            <td>{reserva.get('carro_id', 'N/A')}</td>
-                            <td>{reserva.get('data_reserva', 'N/A')}</td>
-                            <td>{reserva.get('status', 'N/A')}</td>
-                            <td class="actions">
-                                <a href="/admin/edit_reserva/{reserva.get('id', '')}">Editar</a>
-                                <a href="/admin/delete_reserva/{reserva.get('id', '')}" onclick="return confirm('Tem certeza que deseja deletar esta reserva?');">Deletar</a>
-                            </td>
-                        </tr>
-        '''
-    html_content += '''
-                    </tbody>
-                </table>
-            </div>
-            <a href="/admin/add_reserva" class="add-button">Adicionar Reserva</a>
-            <br>
-            <a href="/admin/sync_sheets" class="sync-button">Sincronizar com Google Sheets</a>
-        </div>
-    </body>
-    </html>
-    '''
-    return html_content
+    # Cada tabela tem a sua página (?carros_pagina=, ?usuarios_pagina=, ?reservas_pagina=)
+    paginas = {}
+    for tabela in ('carros', 'usuarios', 'reservas'):
+        try:
+            pagina = int(request.args.get(f'{tabela}_pagina', 1))
+        except ValueError:
+            pagina = 1
+        paginas[tabela] = pagina_da_tabela(tabela, pagina, POR_PAGINA_ADMIN)
+    return render_template(
+        'admin.html',
+        resumo=resumo_admin(),
+        carros=paginas['carros'],
+        usuarios=paginas['usuarios'],
+        reservas=paginas['reservas'],
+        reservas_por_carro=agregados['reservas_por_carro'],
+        reservas_ativas_por_carro=agregados['reservas_ativas_por_carro'],
+        reservas_ativas_por_usuario=agregados['reservas_ativas_por_usuario'],
+        args_pagina_admin=_args_pagina_admin
+    )
+
+def _args_pagina_admin(tabela, pagina):
+    # Mantém a página das outras tabelas nos links de paginação
+    args = request.args.to_dict()
+    args[f'{tabela}_pagina'] = pagina
+    return args
 
 @app.route('/admin/sync_sheets')
 def sync_sheets():
     if not session.get('logged_in') or not session.get('is_admin'):
         return redirect(url_for('login'))
     
+    flush_sync_queue() # Envia alterações locais pendentes antes de puxar a planilha
     if load_data_from_sheets(): # Tenta carregar do Sheets
-        sync_data_to_sheets() # Se carregou, sincroniza de volta (bidirecional)
-        return "Sincronização com Google Sheets concluída com sucesso!"
+        # Se carregou, sincroniza de volta (bidirecional); ?modo=completo força reescrita das abas
+        modo = 'completo' if request.args.get('modo') == 'completo' else 'incremental'
+        stats = sync_data_to_sheets(modo=modo)
+        if stats['erro']:
+            return f"Falha na sincronização com Google Sheets: {stats['erro']}"
+        return f"Sincronização com Google Sheets concluída com sucesso! ({stats['api_calls']} chamadas à API em {stats['duracao_ms']} ms)"
     else:
         return "Falha na sincronização com Google Sheets. Verifique logs e credenciais."
 
+@app.route('/admin/sync_status')
+def sync_status_view():
+    if not session.get('logged_in') or not session.get('is_admin'):
+        return redirect(url_for('login'))
+    return jsonify(get_sync_queue_status())
+
+# --- Rotas de Reserva ---
+
+def _usuario_logado_id():
+    # Sessões abertas antes de o id ser guardado no login caem na busca por email
+    if 'user_id' not in session:
+        usuario = buscar_usuario_por_email(session.get('user_email'))
+        if usuario is None:
+            return None
+        session['user_id'] = usuario['id']
+    return session['user_id']
+
+@app.route('/reservar/<int:carro_id>', methods=['GET', 'POST'])
+def reservar(carro_id):
+    if not session.get('logged_in'):
+        return redirect(url_for('login'))
+    usuario_id = _usuario_logado_id()
+    if usuario_id is None:
+        return redirect(url_for('logout'))
+
+    carro = carros.get(carro_id)
+    if not carro:
+        return "Carro não encontrado", 404
+
+    if request.method == 'POST':
+        try:
+            reservar_carro(usuario_id, carro_id, request.form.get('observacoes', ''))
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('reservar', carro_id=carro_id))
+        aviso = f" Sem a confirmação da loja em {RESERVA_TTL_MINUTOS:.0f} min, ela expira." if RESERVA_TTL_MINUTOS > 0 else ""
+        flash(f"Reserva de {carro['modelo']} registrada e pendente de confirmação.{aviso}", 'success')
+        return redirect(url_for('minhas_reservas'))
+
+    return render_template('reservar.html', car=carro)
+
+@app.route('/minhas_reservas')
+def minhas_reservas():
+    if not session.get('logged_in'):
+        return redirect(url_for('login'))
+    usuario_id = _usuario_logado_id()
+    if usuario_id is None:
+        return redirect(url_for('logout'))
+    return render_template('minhas_reservas.html', reservas=reservas_do_usuario(usuario_id))
+
+@app.route('/cancelar_reserva/<int:reserva_id>', methods=['POST'])
+def cancelar_reserva(reserva_id):
+    if not session.get('logged_in'):
+        return redirect(url_for('login'))
+    # Admin pode cancelar qualquer reserva; usuários só as próprias
+    dono = None if session.get('is_admin') else _usuario_logado_id()
+    if cancelar_reserva_ativa(reserva_id, usuario_id=dono) is None:
+        flash("Reserva não encontrada ou já encerrada.", 'error')
+    else:
+        flash("Reserva cancelada.", 'success')
+    return redirect(url_for('admin') if request.form.get('voltar') == 'admin' else url_for('minhas_reservas'))
+
+@app.route('/admin/confirmar_reserva/<int:reserva_id>', methods=['POST'])
+def confirmar_reserva(reserva_id):
+    if not session.get('logged_in') or not session.get('is_admin'):
+        return redirect(url_for('login'))
+    if confirmar_reserva_pendente(reserva_id) is None:
+        flash("Reserva não encontrada ou não está mais pendente.", 'error')
+    else:
+        flash("Reserva confirmada.", 'success')
+    return redirect(url_for('admin'))
+
+# --- Rotas de Importação e Exportação ---
+def _upload_da_request():
+    """(arquivo binário, formato) do upload: campo 'arquivo' do formulário ou o corpo da request."""
+    enviado = request.files.get('arquivo')
+    if enviado is not None:
+        nome = (enviado.filename or '').lower()
+        formato = 'json' if nome.endswith(('.json', '.jsonl', '.ndjson')) or 'json' in (enviado.mimetype or '') else 'csv'
+        return enviado.stream, formato
+    # Corpo enviado direto (curl --data-binary @carros.csv): copiado para disco antes da transação,
+    # para um cliente lento não segurar o lock de escrita do SQLite
+    copia = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    shutil.copyfileobj(request.stream, copia)
+    copia.seek(0)
+    return copia, 'json' if 'json' in (request.mimetype or '') else 'csv'
+
+@app.route('/admin/importar/carros', methods=['GET', 'POST'])
+def importar_carros_view():
+    if not session.get('logged_in') or not session.get('is_admin'):
+        return redirect(url_for('login'))
+
+    if request.method == 'GET':
+        return render_template('admin_importar_carros.html')
+    por_formulario = 'arquivo' in request.files
+    arquivo, formato = _upload_da_request()
+    resultado = importar_carros(arquivo, formato)
+    status = 400 if resultado['erros'] else 200
+    if por_formulario:
+        return render_template('admin_importar_carros.html', resultado=resultado), status
+    return jsonify(resultado), status
+
+@app.route('/admin/exportar/<tabela>.<formato>')
+def exportar(tabela, formato):
+    if not session.get('logged_in') or not session.get('is_admin'):
+        return redirect(url_for('login'))
+    if tabela not in TABELAS_EXPORTAVEIS or formato not in ('csv', 'json'):
+        return "Exportação não encontrada", 404
+
+    nome = f"{tabela}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    return Response(
+        stream_with_context(exportar_tabela(tabela, formato)),
+        mimetype='text/csv' if formato == 'csv' else 'application/json',
+        headers={'Content-Disposition': f'attachment; filename="{nome}"'}
+    )
+
+# --- Rotas de Backup ---
+@app.route('/admin/backups', methods=['GET', 'POST'])
+def admin_backups():
+    if not session.get('logged_in') or not session.get('is_admin'):
+        return redirect(url_for('login'))
+
+    if request.method == 'POST':
+        try:
+            stats = criar_backup()
+            flash(f"Backup {stats['arquivo']} criado em {stats['duracao_ms']} ms.", 'success')
+        except Exception as e:
+            flash(f"Falha no backup: {e}", 'error')
+        return redirect(url_for('admin_backups'))
+    return render_template('admin_restore_backup.html', status=get_backup_status())
+
+@app.route('/admin/backups/<nome>')
+def baixar_backup(nome):
+    if not session.get('logged_in') or not session.get('is_admin'):
+        return redirect(url_for('login'))
+    if not _RE_ARQUIVO_BACKUP.match(nome):
+        return "Backup não encontrado", 404
+    return send_from_directory(BACKUP_DIR, nome, as_attachment=True)
+
+@app.route('/admin/restore_backup', methods=['POST'])
+def admin_restore_backup():
+    if not session.get('logged_in') or not session.get('is_admin'):
+        return redirect(url_for('login'))
+
+    enviado = request.files.get('backup_file')
+    if enviado is None or not enviado.filename:
+        flash("Selecione o arquivo de backup.", 'error')
+        return redirect(url_for('admin_backups'))
+    try:
+        stats = restaurar_backup(enviado.stream)
+    except ValueError as e:
+        flash(f"Backup recusado, nada foi alterado: {e}", 'error')
+        return redirect(url_for('admin_backups'))
+    linhas = ', '.join(f"{total} {tabela}" for tabela, total in stats['linhas'].items())
+    flash(f"Backup restaurado em {stats['duracao_ms']} ms ({linhas}). Estado anterior salvo em {stats['backup_anterior']}.", 'success')
+    return redirect(url_for('admin_backups'))
+
 # --- Rotas CRUD Básicas (Exemplos Simplificados) ---
 
+def _carro_do_form(form):
+    return {
+        'thumbnail_url': form.get('thumbnail_url', ''),
+        'modelo': form.get('modelo', ''),
+        'marca': form.get('marca', ''),
+        'ano': form.get('ano', ''),
+        'quantidade_disponivel': int(form.get('quantidade_disponivel', 0)),
+        'preco_diaria': float(form.get('preco_diaria', 0.0)),
+        'observacoes': form.get('observacoes', ''),
+        'max_reservas': int(form.get('max_reservas', 1))
+    }
+
 @app.route('/admin/add_carro', methods=['GET', 'POST'])
 def add_carro():
     if not session.get('logged_in') or not session.get('is_admin'):
         return redirect(url_for('login'))
     
     if request.method == 'POST':
-        new_id = max([c['id'] for c in carros] + [0]) + 1 if carros else 1
-        novo_carro = {
-            'id': new_id,
-            'thumbnail_url': request.form.get('thumbnail_url', ''),
-            'modelo': request.form.get('modelo', ''),
-            'marca': request.form.get('marca', ''),
-            'ano': request.form.get('ano', ''),
-            'quantidade_disponivel': int(request.form.get('quantidade_disponivel', 0)),
-            'preco_diaria': float(request.form.get('preco_diaria', 0.0)),
-            'observacoes': request.form.get('observacoes', ''),
-            'max_reservas': int(request.form.get('max_reservas', 1))
-        }
-        carros.append(novo_carro)
-        sync_data_to_sheets() # Sincroniza após adicionar
+        db_inserir_carro(_carro_do_form(request.form)) # Enviado ao Sheets em background
         return redirect(url_for('admin'))
     
-    return render_template_string('''
-        <style>
-            body { font-family: Arial, sans-serif; background-color: #f8f9fa; margin: 0; padding: 20px; }
-            .form-container { background-color: #ffffff; padding: 30px; border-radius: 8px; box-shadow: 0 4px 8px rgba(0,0,0,0.1); max-width: 600px; margin: 20px auto; }
-            .form-container h2 { color: #007bff; margin-bottom: 20px; text-align: center; }
-            .form-group { margin-bottom: 15px; }
-            .form-group label { display: block; margin-bottom: 5px; font-weight: bold; color: #343a40; }
-            .form-group input[type="text"], .form-group input[type="number"] { width: calc(100% - 22px); padding: 10px; border: 1px solid #ced4da; border-radius: 4px; box-sizing: border-box; }
-            .form-group input[type="submit"] { background-color: #28a745; color: white; padding: 10px 20px; border: none; border-radius: 5px; cursor: pointer; font-size: 16px; width: auto; margin-top: 10px; }
-            .form-group input[type="submit"]:hover { background-color: #218838; }
-            .back-link { display: block; text-align: center; margin-top: 20px; color: #007bff; text-decoration: none; }
-            .back-link:hover { text-decoration: underline; }
-        </style>
-        <div class="form-container">
-            <h2>Adicionar Novo Carro</h2>
-            <form method="post">
-                <div class="form-group"><label for="thumbnail_url">URL da Imagem (Thumbnail):</label><input type="text" id="thumbnail_url" name="thumbnail_url"></div>
-                <div class="form-group"><label for="modelo">Modelo:</label><input type="text" id="modelo" name="modelo" required></div>
-                <div class="form-group"><label for="marca">Marca:</label><input type="text" id="marca" name="marca"></div>
-                <div class="form-group"><label for="ano">Previsão de Chegada:</label><input type="text" id="ano" name="ano"></div>
-                <div class="form-group"><label for="quantidade_disponivel">Quantidade Disponível:</label><input type="number" id="quantidade_disponivel" name="quantidade_disponivel" value="0"></div>
-                <div class="form-group"><label for="preco_diaria">Preço Diária:</label><input type="number" id="preco_diaria" name="preco_diaria" step="0.01" value="0.00"></div>
-                <div class="form-group"><label for="observacoes">Observações:</label><input type="text" id="observacoes" name="observacoes"></div>
-                <div class="form-group"><label for="max_reservas">Máx. Reservas por Usuário:</label><input type="number" id="max_reservas" name="max_reservas" value="1"></div>
-                <div class="form-group"><input type="submit" value="Adicionar Carro"></div>
-            </form>
-            <a href="/admin" class="back-link">Voltar para Admin</a>
-        </div>
-    ''')
+    return render_template('admin_add_carro.html')
 
 @app.route('/admin/edit_carro/<int:carro_id>', methods=['GET', 'POST'])
 def edit_carro(carro_id):
     if not session.get('logged_in') or not session.get('is_admin'):
         return redirect(url_for('login'))
     
-    carro_to_edit = next((c for c in carros if c['id'] == carro_id), None)
+    carro_to_edit = carros.get(carro_id)
     if not carro_to_edit:
         return "Carro não encontrado", 404
 
     if request.method == 'POST':
-        carro_to_edit['thumbnail_url'] = request.form.get('thumbnail_url', '')
-        carro_to_edit['modelo'] = request.form.get('modelo', '')
-        carro_to_edit['marca'] = request.form.get('marca', '')
-        carro_to_edit['ano'] = request.form.get('ano', '')
-        carro_to_edit['quantidade_disponivel'] = int(request.form.get('quantidade_disponivel', 0))
-        carro_to_edit['preco_diaria'] = float(request.form.get('preco_diaria', 0.0))
-        carro_to_edit['observacoes'] = request.form.get('observacoes', '')
-        carro_to_edit['max_reservas'] = int(request.form.get('max_reservas', 1))
-        sync_data_to_sheets()
+        if db_atualizar_carro(carro_id, _carro_do_form(request.form)) is None:
+            return "Carro não encontrado", 404
         return redirect(url_for('admin'))
     
-    return render_template_string(f'''
-        <style>
-            body { font-family: Arial, sans-serif; background-color: #f8f9fa; margin: 0; padding: 20px; }
-            .form-container { background-color: #ffffff; padding: 30px; border-radius: 8px; box-shadow: 0 4px 8px rgba(0,0,0,0.1); max-width: 600px; margin: 20px auto; }
-            .form-container h2 { color: #007bff; margin-bottom: 20px; text-align: center; }
-            .form-group { margin-bottom: 15px; }
-            .form-group label { display: block; margin-bottom: 5px; font-weight: bold; color: #343a40; }
-            .form-group input[type="text"], .form-group input[type="number"] { width: calc(100% - 22px); padding: 10px; border: 1px solid #ced4da; border-radius: 4px; box-sizing: border-box; }
-            .form-group input[type="submit"] { background-color: #ffc107; color: #343a40; padding: 10px 20px; border: none; border-radius: 5px; cursor: pointer; font-size: 16px; width: auto; margin-top: 10px; }
-            .form-group input[type="submit"]:hover { background-color: #e0a800; }
-            .back-link { display: block; text-align: center; margin-top: 20px; color: #007bff; text-decoration: none; }
-            .back-link:hover { text-decoration: underline; }
-        </style>
-        <div class="form-container">
-            <h2>Editar Carro (ID: {carro_id})</h2>
-            <form method="post">
-                <div class="form-group"><label for="thumbnail_url">URL da Imagem (Thumbnail):</label><input type="text" id="thumbnail_url" name="thumbnail_url" value="{carro_to_edit.get('thumbnail_url', '')}"></div>
-                <div class="form-group"><label for="modelo">Modelo:</label><input type="text" id="modelo" name="modelo" value="{carro_to_edit.get('modelo', '')}" required></div>
-                <div class="form-group"><label for="marca">Marca:</label><input type="text" id="marca" name="marca" value="{carro_to_edit.get('marca', '')}"></div>
-                <div class="form-group"><label for="ano">Previsão de Chegada:</label><input type="text" id="ano" name="ano" value="{carro_to_edit.get('ano', '')}"></div>
-                <div class="form-group"><label for="quantidade_disponivel">Quantidade Disponível:</label><input type="number" id="quantidade_disponivel" name="quantidade_disponivel" value="{carro_to_edit.get('quantidade_disponivel', 0)}"></div>
-                <div class="form-group"><label for="preco_diaria">Preço Diária:</label><input type="number" id="preco_diaria" name="preco_diaria" step="0.01" value="{carro_to_edit.get('preco_diaria', 0.0):.2f}"></div>
-                <div class="form-group"><label for="observacoes">Observações:</label><input type="text" id="observacoes" name="observacoes" value="{carro_to_edit.get('observacoes', '')}"></div>
-                <div class="form-group"><label for="max_reservas">Máx. Reservas por Usuário:</label><input type="number" id="max_reservas" name="max_reservas" value="{carro_to_edit.get('max_reservas', 1)}"></div>
-                <div class="form-group"><input type="submit" value="Salvar Alterações"></div>
-            </form>
-            <a href="/admin" class="back-link">Voltar para Admin</a>
-        </div>
-    ''')
+    return render_template('admin_edit_carro.html', carro=carro_to_edit)
 
 @app.route('/admin/delete_carro/<int:carro_id>')
 def delete_carro(carro_id):
     if not session.get('logged_in') or not session.get('is_admin'):
         return redirect(url_for('login'))
     
-    global carros
-    carros = [c for c in carros if c['id'] != carro_id]
-    sync_data_to_sheets()
+    db_remover_carro(carro_id)
     return redirect(url_for('admin'))
 
 # Rotas de CRUD para Usuários e Reservas (simplificadas, apenas redirecionam para admin)
@@ -832,4 +3347,4 @@ def delete_reserva(reserva_id):
     return "Funcionalidade de deletar reserva não implementada. Delete via planilha."
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,173 @@
+"""
+Harness local do adaptador de edge (functions/[[path]].py) e medição do custo a frio.
+
+Uso: python benchmarks/bench_edge.py [--carros 1000] [--frios 5] [--repeticoes 50]
+
+Sobe o Sheets falso (benchmarks/fake_sheets.py) em outro processo e chama on_fetch com
+requisições no formato do runtime de edge (method, url, headers, bytes()):
+  - a frio: cada medição em um processo novo, com DB vazio como em um isolate recém-criado;
+    mostra import, create_app, leitura do Sheets e geração do snapshot, e a 1ª invocação
+  - a quente: mesma invocação repetida no isolate já aquecido, com o snapshot do catálogo
+    e com EDGE_SNAPSHOT desligado (tudo pela ponte WSGI)
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(BENCH_DIR)
+ADAPTADOR = os.path.join(RAIZ, 'functions', '[[path]].py')
+LOGIN = {'email': 'usuario1@example.com', 'senha': 'senha123'}
+
+
+class RequisicaoLocal:
+    """O mínimo da Request do runtime de edge que o adaptador usa."""
+
+    def __init__(self, method, url, headers=None, body=b''):
+        self.method = method
+        self.url = url
+        self.headers = dict(headers or {})
+        self._body = body
+
+    async def bytes(self):
+        return self._body
+
+
+def carregar_adaptador():
+    spec = importlib.util.spec_from_file_location('edge_adapter', ADAPTADOR)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+_loop = asyncio.new_event_loop() # Um só loop, como no isolate: asyncio.run criaria um por chamada
+
+
+def invocar(adaptador, metodo, caminho, headers=None, body=b''):
+    return _loop.run_until_complete(adaptador.on_fetch(RequisicaoLocal(metodo, f'https://jgminis.example{caminho}', headers, body)))
+
+
+def _cabecalho(resposta, nome):
+    return next((v for k, v in resposta['headers'] if k.lower() == nome.lower()), None)
+
+
+def _login(adaptador):
+    resposta = invocar(adaptador, 'POST', '/login', {'Content-Type': 'application/x-www-form-urlencoded'},
+                       urlencode(LOGIN).encode())
+    assert resposta['status'] == 302, resposta['status']
+    return {'Cookie': _cabecalho(resposta, 'Set-Cookie').split(';', 1)[0]}
+
+
+def medir_frio():
+    """Roda em um processo novo. Mede do carregamento do módulo até a 1ª resposta."""
+    inicio = time.perf_counter()
+    adaptador = carregar_adaptador()
+    carregado = time.perf_counter()
+    resposta = invocar(adaptador, 'GET', '/login')
+    fim = time.perf_counter()
+    assert resposta['status'] == 200, resposta['status']
+    return {
+        'carregar_modulo_ms': round((carregado - inicio) * 1000, 1),
+        'primeira_invocacao_ms': round((fim - carregado) * 1000, 1),
+        'etapas_ms': adaptador.estado_do_isolate()['frio_ms'],
+    }
+
+
+def medir_quente(repeticoes):
+    adaptador = carregar_adaptador()
+    invocar(adaptador, 'GET', '/login') # Início a frio fora das medições
+    sessao = _login(adaptador)
+    rotas = {
+        'GET /home': ('GET', '/home', sessao, b''),
+        'GET /home?pagina=2': ('GET', '/home?pagina=2', sessao, b''),
+        'GET /api/carros': ('GET', '/api/carros', sessao, b''),
+        'GET /login': ('GET', '/login', {}, b''),
+        'POST /login': ('POST', '/login', {'Content-Type': 'application/x-www-form-urlencoded'}, urlencode(LOGIN).encode()),
+    }
+    resultado = {}
+    for snapshot in (True, False):
+        adaptador.EDGE_SNAPSHOT = snapshot
+        for nome, (metodo, caminho, headers, body) in rotas.items():
+            tempos = []
+            origens = set()
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                resposta = invocar(adaptador, metodo, caminho, headers, body)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+                origens.add(_cabecalho(resposta, 'Server-Timing').split(';', 1)[0])
+            resultado[f"{nome} ({'snapshot' if snapshot else 'sem snapshot'})"] = {
+                'mediana_ms': round(statistics.median(tempos), 3),
+                'origem': '/'.join(sorted(origens)),
+            }
+    resultado['isolate'] = adaptador.estado_do_isolate()
+    return resultado
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--carros', type=int, default=1000)
+    parser.add_argument('--frios', type=int, default=5)
+    parser.add_argument('--repeticoes', type=int, default=50)
+    parser.add_argument('--_modo', choices=['frio', 'quente'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._modo:
+        print(json.dumps(medir_frio() if args._modo == 'frio' else medir_quente(args.repeticoes)))
+        return
+
+    porta = _porta_livre()
+    servidor = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'fake_sheets.py'), '--porta', str(porta),
+         '--carros', str(args.carros), '--usuarios', str(max(10, args.carros // 10))],
+        stdout=subprocess.PIPE, text=True
+    )
+    try:
+        servidor.stdout.readline() # Pronto para conexões
+        env = dict(os.environ)
+        env.pop('GOOGLE_CREDENTIALS_JSON', None)
+        env.update(SHEETS_API_URL=f'http://127.0.0.1:{porta}', GOOGLE_SHEET_ID='fake',
+                   SHEETS_QUOTA_LEITURA_POR_MINUTO='0', SHEETS_QUOTA_ESCRITA_POR_MINUTO='0')
+
+        def rodar(modo):
+            env['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='jgminis-edge-'), 'edge.db')
+            saida = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--_modo', modo, '--repeticoes', str(args.repeticoes)],
+                cwd=RAIZ, env=env, capture_output=True, text=True, check=True
+            )
+            return json.loads(saida.stdout.strip().splitlines()[-1])
+
+        frios = [rodar('frio') for _ in range(args.frios)]
+        print(f"== Início a frio ({args.carros} carros no Sheets, DB vazio; mediana de {args.frios}) ==")
+        print(f"{'carregar módulo':<28} {statistics.median(f['carregar_modulo_ms'] for f in frios):>10.1f} ms")
+        for etapa in frios[0]['etapas_ms']:
+            print(f"  {etapa:<26} {statistics.median(f['etapas_ms'][etapa] for f in frios):>10.1f} ms")
+        print(f"{'1ª invocação (total)':<28} {statistics.median(f['primeira_invocacao_ms'] for f in frios):>10.1f} ms")
+
+        quente = rodar('quente')
+        isolate = quente.pop('isolate')
+        print(f"\n== Isolate aquecido ({args.repeticoes} invocações por rota) ==")
+        print(f"{'rota':<42} {'mediana ms':>11}  origem")
+        for nome, m in quente.items():
+            print(f"{nome:<42} {m['mediana_ms']:>11.3f}  {m['origem']}")
+        print(f"\n{isolate['invocacoes']} invocações no isolate, {isolate['snapshot_hits']} respondidas pelo snapshot.")
+    finally:
+        servidor.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Vazão de login (logins/s por core) com o hash de senha adaptativo e o pool limitado.
+
+Uso: python benchmarks/bench_login.py [--clientes 1,4,16] [--duracao 5] [--usuarios 200]
+     [--scrypt-n 16384,32768]
+
+Roda o app em processo, com DB temporário e sem Sheets, e mede:
+  - custo de uma verificação por formato de hash (scrypt com cada --scrypt-n e SHA-256 legado)
+  - POST /login com --clientes threads por --duracao segundos, com a verificação no pool
+    (SENHA_POOL_WORKERS) e direto na thread do request: logins/s, logins/s por core, p50/p99
+    e 503 por fila cheia, além da latência de GET /health medida ao mesmo tempo
+  - migração transparente: 1º login de usuários com hash SHA-256 (verificação + rehash) e o 2º
+    login, já com scrypt
+"""
+import argparse
+import hashlib
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SENHA = 'senha123'
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))] if ordenados else 0.0
+
+
+def preparar_app(usuarios):
+    os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='jgminis-login-'), 'login.db')
+    os.environ.pop('GOOGLE_CREDENTIALS_JSON', None)
+    sys.path.insert(0, RAIZ)
+    import app as jg
+    jg.create_app(tarefas_em_background=False)
+    senha_hash = jg.hash_senha(SENHA)
+    for i in range(usuarios):
+        jg.db_inserir_usuario({'nome': f'Usuário {i}', 'email': f'usuario{i}@example.com', 'senha_hash': senha_hash,
+                               'data_cadastro': '2025-01-01 00:00:00', 'is_admin': 0})
+    jg.verificar_cache()
+    return jg
+
+
+def medir_hashes(jg, valores_n, repeticoes=5):
+    print(f"== Custo de uma verificação (mediana de {repeticoes}) ==")
+    formatos = [(f'scrypt N={n}', jg.generate_password_hash(SENHA, method=f'scrypt:{n}:8:1')) for n in valores_n]
+    formatos.append(('SHA-256 legado', hashlib.sha256(SENHA.encode()).hexdigest()))
+    for nome, senha_hash in formatos:
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            assert jg._senha_confere(SENHA, senha_hash)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        print(f"{nome:<18} {statistics.median(tempos):>9.2f} ms")
+
+
+def carga_de_login(jg, clientes, duracao, usuarios):
+    """Logins com `clientes` threads e uma sonda em /health; retorna as métricas."""
+    latencias, sonda, erros = [], [], {'503': 0, 'falhou': 0}
+    lock = threading.Lock()
+    fim = time.perf_counter() + duracao
+
+    def cliente(indice):
+        http = jg.app.test_client()
+        i = indice
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            resposta = http.post('/login', data={'email': f'usuario{i % usuarios}@example.com', 'senha': SENHA})
+            decorrido = (time.perf_counter() - inicio) * 1000
+            with lock:
+                if resposta.status_code == 302:
+                    latencias.append(decorrido)
+                elif resposta.status_code == 503:
+                    erros['503'] += 1
+                else:
+                    erros['falhou'] += 1
+            if resposta.status_code == 503: # Como um cliente de verdade, respeita o Retry-After
+                time.sleep(float(resposta.headers.get('Retry-After', 1)))
+            i += clientes
+
+    def sondar():
+        http = jg.app.test_client()
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            http.get('/health')
+            sonda.append((time.perf_counter() - inicio) * 1000)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=cliente, args=(i,)) for i in range(clientes)] + [threading.Thread(target=sondar)]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - inicio
+    return {
+        'logins_s': len(latencias) / total,
+        'p50': _percentil(latencias, 50), 'p99': _percentil(latencias, 99),
+        'health_p99': _percentil(sonda, 99), **erros,
+    }
+
+
+def medir_vazao(jg, lista_clientes, duracao, usuarios):
+    cores = os.cpu_count() or 1
+    print(f"\n== POST /login por {duracao:.0f}s ({jg.METODO_SENHA}, {cores} core(s), "
+          f"pool de {jg.SENHA_POOL_WORKERS}, fila máx. {jg.SENHA_FILA_MAX}) ==")
+    print(f"{'modo':<8} {'clientes':>8} {'logins/s':>9} {'/core':>7} {'p50 ms':>8} {'p99 ms':>8} {'503':>5} {'health p99':>11}")
+    no_pool = jg._no_pool_de_senhas
+    for modo in ('pool', 'inline'):
+        if modo == 'inline':
+            jg._no_pool_de_senhas = lambda operacao, func, *args: func(*args)
+        try:
+            for clientes in lista_clientes:
+                r = carga_de_login(jg, clientes, duracao, usuarios)
+                assert r['falhou'] == 0, r
+                print(f"{modo:<8} {clientes:>8} {r['logins_s']:>9.1f} {r['logins_s'] / cores:>7.1f} {r['p50']:>8.1f} "
+                      f"{r['p99']:>8.1f} {r['503']:>5} {r['health_p99']:>9.1f} ms")
+        finally:
+            jg._no_pool_de_senhas = no_pool
+
+
+def medir_migracao(jg, quantidade=20):
+    legado = hashlib.sha256(SENHA.encode()).hexdigest()
+    for i in range(quantidade):
+        jg.db_inserir_usuario({'nome': f'Legado {i}', 'email': f'legado{i}@example.com', 'senha_hash': legado,
+                               'data_cadastro': '2025-01-01 00:00:00', 'is_admin': 0})
+    jg.verificar_cache()
+    http = jg.app.test_client()
+    rodadas = []
+    for _ in range(2):
+        tempos = []
+        for i in range(quantidade):
+            inicio = time.perf_counter()
+            assert http.post('/login', data={'email': f'legado{i}@example.com', 'senha': SENHA}).status_code == 302
+            tempos.append((time.perf_counter() - inicio) * 1000)
+            jg.verificar_cache()
+        rodadas.append(statistics.median(tempos))
+    migrados = sum(not jg.senha_precisa_rehash(jg.db_buscar_usuario_por_email(f'legado{i}@example.com')['senha_hash'])
+                   for i in range(quantidade))
+    print(f"\n== Migração de {quantidade} usuários com SHA-256 legado ==")
+    print(f"1º login (SHA-256 + rehash) {rodadas[0]:>9.2f} ms")
+    print(f"2º login (scrypt)           {rodadas[1]:>9.2f} ms")
+    print(f"hashes migrados: {migrados}/{quantidade}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clientes', default='1,4,16')
+    parser.add_argument('--duracao', type=float, default=5)
+    parser.add_argument('--usuarios', type=int, default=200)
+    parser.add_argument('--scrypt-n', default='16384,32768')
+    args = parser.parse_args()
+
+    jg = preparar_app(args.usuarios)
+    medir_hashes(jg, [int(n) for n in args.scrypt_n.split(',')])
+    medir_vazao(jg, [int(c) for c in args.clientes.split(',')], args.duracao, args.usuarios)
+    medir_migracao(jg)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark de renderização de /home e /admin em função do tamanho do catálogo.
+
+Uso: python benchmarks/bench_render.py [--tamanhos 10,100,1000,5000] [--repeticoes 20]
+
+Roda contra um DB temporário e preenche o cache em memória com carros sintéticos,
+então mede só o custo da view + template (sem Sheets). O cache de páginas é limpo antes de
+cada request medido; a coluna "cache ms" é a mesma rota servida do cache de páginas.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(prefix='jgminis-bench-'), 'bench.db'))
+os.environ.pop('GOOGLE_CREDENTIALS_JSON', None)
+
+import app as jgminis # noqa: E402
+
+
+def carros_sinteticos(n):
+    return [{
+        'id': i,
+        'thumbnail_url': f'https://example.com/img/{i}.jpg',
+        'modelo': f'Miniatura {i}',
+        'marca': ('Hot Wheels', 'Matchbox', 'Maisto', 'Greenlight')[i % 4],
+        'ano': '2025-01',
+        'quantidade_disponivel': i % 7,
+        'preco_diaria': 10.0 + (i % 50),
+        'observacoes': '',
+        'max_reservas': 1
+    } for i in range(1, n + 1)]
+
+
+def limpar_cache_de_paginas():
+    # Os carros sintéticos não passam pelo DB, então o carimbo de versões não muda entre tamanhos
+    with jgminis._cache_paginas_lock:
+        jgminis._cache_paginas.clear()
+
+
+def medir(client, rota, repeticoes, renderizar=True):
+    tempos = []
+    tamanho = 0
+    for _ in range(repeticoes):
+        if renderizar:
+            limpar_cache_de_paginas()
+        inicio = time.perf_counter()
+        resposta = client.get(rota)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        tamanho = len(resposta.data)
+    return statistics.median(tempos), max(tempos), tamanho
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tamanhos', default='10,100,1000,5000')
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    client = jgminis.create_app(tarefas_em_background=False).test_client()
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+        sess['is_admin'] = True
+
+    print(f"{'carros':>8} {'rota':<7} {'mediana ms':>11} {'max ms':>8} {'cache ms':>9} {'KB':>8}")
+    for n in [int(t) for t in args.tamanhos.split(',')]:
+        jgminis._definir_cache('carros', carros_sinteticos(n))
+        jgminis._cache_cards.clear()
+        limpar_cache_de_paginas()
+        for rota in ('/home', '/admin'):
+            client.get(rota) # aquecimento
+            mediana, maximo, tamanho = medir(client, rota, args.repeticoes)
+            em_cache = medir(client, rota, args.repeticoes, renderizar=False)[0]
+            print(f"{n:>8} {rota:<7} {mediana:>11.2f} {maximo:>8.2f} {em_cache:>9.2f} {tamanho / 1024:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark do tempo de boot de um worker: import do módulo e create_app().
+
+Uso: python benchmarks/bench_startup.py [--carros 1000] [--repeticoes 10]
+
+Cada medição roda em um processo Python novo (como um worker do gunicorn recém-criado),
+contra um DB temporário já populado, sem credenciais do Sheets.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEDICAO = """
+import json, time
+inicio = time.perf_counter()
+import app
+importado = time.perf_counter()
+app.create_app()
+pronto = time.perf_counter()
+print(json.dumps({
+    'import_ms': (importado - inicio) * 1000,
+    'create_app_ms': (pronto - importado) * 1000,
+    'etapas_ms': app.startup_stats['etapas_ms']
+}))
+"""
+
+POPULAR = """
+import app
+app.create_app()
+for i in range({n}):
+    app.db_inserir_carro({{'modelo': f'Miniatura {{i}}', 'marca': 'Hot Wheels', 'ano': '2025-01',
+                          'quantidade_disponivel': 3, 'preco_diaria': 10.0, 'observacoes': '',
+                          'thumbnail_url': '', 'max_reservas': 1}})
+"""
+
+
+def rodar(codigo, env):
+    saida = subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ, env=env, capture_output=True, text=True, check=True)
+    return saida.stdout.strip().splitlines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--carros', type=int, default=1000)
+    parser.add_argument('--repeticoes', type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop('GOOGLE_CREDENTIALS_JSON', None)
+    env['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='jgminis-bench-'), 'bench.db')
+    env['SHEETS_REFRESH_INTERVAL'] = '0'
+    rodar(POPULAR.format(n=args.carros), env)
+
+    medicoes = []
+    for _ in range(args.repeticoes):
+        linha = [l for l in rodar(MEDICAO, env) if l.startswith('{')][-1]
+        medicoes.append(json.loads(linha))
+
+    print(f"{args.carros} carros no DB, {args.repeticoes} boots")
+    print(f"{'fase':<14} {'mediana ms':>11} {'max ms':>8}")
+    for fase in ('import_ms', 'create_app_ms'):
+        valores = [m[fase] for m in medicoes]
+        print(f"{fase[:-3]:<14} {statistics.median(valores):>11.1f} {max(valores):>8.1f}")
+    for etapa in medicoes[0]['etapas_ms']:
+        valores = [m['etapas_ms'][etapa] for m in medicoes]
+        print(f"  {etapa:<12} {statistics.median(valores):>11.1f} {max(valores):>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
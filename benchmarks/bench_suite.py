@@ -0,0 +1,238 @@
+"""
+Suíte de benchmarks contra o Sheets falso: sincronização, chamadas à API e latência das rotas.
+
+Uso: python benchmarks/bench_suite.py [--tamanhos 100,1000,10000] [--repeticoes 20]
+     [--latencia-ms 0] [--sem-salvar] [--comparar-com benchmarks/results/<arquivo>.json]
+
+Para cada tamanho (linhas na aba Carros; Usuarios = 10% e Reservas = 50% disso) roda, em um
+processo novo com DB temporário e o Sheets falso de benchmarks/fake_sheets.py:
+  - sincronização: pull inicial, pull sem mudanças, sync incremental de 1 linha, sync completo,
+    flush da fila com 10 alterações (duração e chamadas à API)
+  - rotas: /home, /admin, /api/carros, /login e CRUD de carros, /admin/sync_sheets
+    (mediana e p95 em ms)
+O resultado é salvo em benchmarks/results/ e comparado com o resultado anterior mais recente;
+métricas mais de 25% piores são marcadas como REGRESSÃO.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(BENCH_DIR)
+RESULTADOS_DIR = os.path.join(BENCH_DIR, 'results')
+LIMITE_REGRESSAO = 1.25
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def medir_tamanho(tamanho, repeticoes, latencia_ms):
+    """Roda dentro do processo filho. Retorna as métricas de um tamanho."""
+    sys.path.insert(0, RAIZ)
+    sys.path.insert(0, BENCH_DIR)
+    import fake_sheets
+    _, planilha, url = fake_sheets.iniciar(
+        latencia_ms=latencia_ms, carros=tamanho, usuarios=max(10, tamanho // 10), reservas=tamanho // 2
+    )
+    import app as jgminis
+    jgminis.SHEETS_API_URL = url
+    jgminis.sheet_id = 'bench'
+    # Sem as threads de background, para medir cada operação isolada
+    jgminis.init_db()
+    jgminis.carregar_dados_do_db()
+    jgminis.precompilar_templates()
+    jgminis._app_iniciado = True
+
+    def chamadas():
+        return sum(planilha.chamadas.values())
+
+    sincronizacao = {}
+
+    def medir_sync(nome, funcao):
+        antes = chamadas()
+        inicio = time.perf_counter()
+        funcao()
+        sincronizacao[nome] = {
+            'duracao_ms': round((time.perf_counter() - inicio) * 1000, 2),
+            'api_calls': chamadas() - antes
+        }
+
+    jgminis.get_sheet() # Conexão fora das medições
+    medir_sync('pull_inicial', jgminis.load_data_from_sheets)
+    medir_sync('pull_sem_mudancas', jgminis.load_data_from_sheets)
+    primeiro = next(iter(jgminis.carros))
+    jgminis.db_atualizar_carro(primeiro, {'observacoes': 'bench'})
+    medir_sync('sync_incremental_1_linha', lambda: jgminis.sync_data_to_sheets(abas=['Carros']))
+    medir_sync('sync_completo', lambda: jgminis.sync_data_to_sheets(modo='completo'))
+    for carro_id in list(jgminis.carros)[:10]:
+        jgminis.db_atualizar_carro(carro_id, {'observacoes': 'bench 2'})
+    medir_sync('flush_fila_10_alteracoes', jgminis.flush_sync_queue)
+
+    client = jgminis.app.test_client()
+    login = {'email': 'usuario1@example.com', 'senha': 'senha123'}
+    client.post('/login', data=login)
+    with client.session_transaction() as sess:
+        sess['is_admin'] = True # Mesmo client navega como admin
+
+    form_carro = {
+        'modelo': 'Bench', 'marca': 'Hot Wheels', 'ano': '2025-01', 'quantidade_disponivel': '3',
+        'preco_diaria': '19.9', 'observacoes': '', 'thumbnail_url': '', 'max_reservas': '1'
+    }
+    criados = []
+
+    def add_carro():
+        client.post('/admin/add_carro', data=form_carro)
+        criados.append(max(jgminis.carros))
+
+    rotas = {
+        'GET /home': lambda: client.get('/home'),
+        'GET /home?pagina=5&ordem=preco': lambda: client.get('/home?pagina=5&ordem=preco&direcao=desc'),
+        'GET /admin': lambda: client.get('/admin'),
+        'GET /api/carros': lambda: client.get('/api/carros?por_pagina=50&marca=matchbox'),
+        'POST /login': lambda: jgminis.app.test_client().post('/login', data=login),
+        'POST /admin/add_carro': add_carro,
+        'POST /admin/edit_carro': lambda: client.post(f'/admin/edit_carro/{primeiro}', data=form_carro),
+        'GET /admin/delete_carro': lambda: client.get(f'/admin/delete_carro/{criados.pop()}'),
+        'GET /admin/sync_sheets': lambda: client.get('/admin/sync_sheets'),
+    }
+    resultado_rotas = {}
+    for nome, rota in rotas.items():
+        n = max(3, repeticoes // 5) if nome == 'GET /admin/sync_sheets' else repeticoes
+        tempos = []
+        for _ in range(n):
+            inicio = time.perf_counter()
+            rota()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        resultado_rotas[nome] = {
+            'mediana_ms': round(statistics.median(tempos), 3),
+            'p95_ms': round(_percentil(tempos, 95), 3)
+        }
+
+    return {
+        'linhas': {'carros': tamanho, 'usuarios': max(10, tamanho // 10), 'reservas': tamanho // 2},
+        'sincronizacao': sincronizacao,
+        'rotas': resultado_rotas,
+        'erros_quota': planilha.erros_quota
+    }
+
+
+def _revisao():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecida'
+
+
+def _metricas(resultado):
+    # Achata em {(tamanho, métrica): valor} para comparar execuções
+    planas = {}
+    for tamanho, dados in resultado['tamanhos'].items():
+        for nome, m in dados['sincronizacao'].items():
+            planas[(tamanho, f'sync {nome} ms')] = m['duracao_ms']
+            planas[(tamanho, f'sync {nome} api_calls')] = m['api_calls']
+        for nome, m in dados['rotas'].items():
+            planas[(tamanho, f'{nome} mediana ms')] = m['mediana_ms']
+    return planas
+
+
+def _resultado_mais_recente():
+    # Pela data gravada no resultado: no mesmo dia o nome do arquivo só difere pela revisão
+    mais_recente = None
+    for caminho in glob.glob(os.path.join(RESULTADOS_DIR, '*.json')):
+        with open(caminho) as f:
+            data = json.load(f).get('data', '')
+        if mais_recente is None or data > mais_recente[0]:
+            mais_recente = (data, caminho)
+    return mais_recente[1] if mais_recente else None
+
+
+def comparar(anterior, atual):
+    antes = _metricas(anterior)
+    regressoes = 0
+    print(f"\nComparação com {anterior['revisao']} ({anterior['data']}):")
+    for chave, valor in sorted(_metricas(atual).items(), key=lambda x: (int(x[0][0]), x[0][1])):
+        base = antes.get(chave)
+        if not base:
+            continue
+        razao = valor / base
+        marca = ''
+        # Ruído de poucos ms não conta como regressão
+        if razao > LIMITE_REGRESSAO and valor - base > 1:
+            marca = '  REGRESSÃO'
+            regressoes += 1
+        print(f"  {chave[0]:>6} {chave[1]:<45} {base:>10.2f} -> {valor:>10.2f} ({razao:>5.2f}x){marca}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tamanhos', default='100,1000,10000')
+    parser.add_argument('--repeticoes', type=int, default=20)
+    parser.add_argument('--latencia-ms', type=float, default=0)
+    parser.add_argument('--sem-salvar', action='store_true')
+    parser.add_argument('--comparar-com')
+    parser.add_argument('--_filho', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._filho:
+        print(json.dumps(medir_tamanho(args._filho, args.repeticoes, args.latencia_ms)))
+        return
+
+    resultado = {
+        'revisao': _revisao(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'latencia_ms': args.latencia_ms,
+        'repeticoes': args.repeticoes,
+        'tamanhos': {}
+    }
+    for tamanho in [int(t) for t in args.tamanhos.split(',')]:
+        env = dict(os.environ)
+        env.pop('GOOGLE_CREDENTIALS_JSON', None)
+        env['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='jgminis-bench-'), 'bench.db')
+        # O Sheets falso não tem quota: o balde de tokens só mediria as esperas dele mesmo
+        env['SHEETS_QUOTA_LEITURA_POR_MINUTO'] = env['SHEETS_QUOTA_ESCRITA_POR_MINUTO'] = '0'
+        saida = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--_filho', str(tamanho),
+             '--repeticoes', str(args.repeticoes), '--latencia-ms', str(args.latencia_ms)],
+            cwd=RAIZ, env=env, capture_output=True, text=True, check=True
+        )
+        dados = json.loads(saida.stdout.strip().splitlines()[-1])
+        resultado['tamanhos'][str(tamanho)] = dados
+
+        print(f"\n== {tamanho} linhas ==")
+        print(f"{'sincronização':<28} {'ms':>10} {'chamadas':>9}")
+        for nome, m in dados['sincronizacao'].items():
+            print(f"{nome:<28} {m['duracao_ms']:>10.2f} {m['api_calls']:>9}")
+        print(f"{'rota':<32} {'mediana ms':>11} {'p95 ms':>9}")
+        for nome, m in dados['rotas'].items():
+            print(f"{nome:<32} {m['mediana_ms']:>11.2f} {m['p95_ms']:>9.2f}")
+
+    referencia = args.comparar_com or _resultado_mais_recente()
+    regressoes = 0
+    if referencia:
+        with open(referencia) as f:
+            regressoes = comparar(json.load(f), resultado)
+
+    if not args.sem_salvar:
+        os.makedirs(RESULTADOS_DIR, exist_ok=True)
+        caminho = os.path.join(RESULTADOS_DIR, f"{resultado['data'][:10]}_{resultado['revisao']}.json")
+        with open(caminho, 'w') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\nResultado salvo em {os.path.relpath(caminho, RAIZ)}")
+    if regressoes:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
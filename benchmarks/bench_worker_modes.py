@@ -0,0 +1,178 @@
+"""
+Teste de carga comparando os modos de worker do gunicorn (WORKER_MODE) com o Sheets lento.
+
+Uso: python benchmarks/bench_worker_modes.py [--modos sync,gthread,gevent] [--duracao 10]
+     [--clientes 16] [--lentos 2] [--latencia-sheets 2.0] [--carros 500] [--workers 2]
+
+Para cada modo sobe o gunicorn com gunicorn.conf.py contra um DB temporário. Em cada worker
+o Sheets é trocado por um falso que demora --latencia-sheets segundos por chamada. Enquanto
+--lentos clientes chamam /admin/sync_sheets sem parar, --clientes navegam pelo catálogo
+(/home). O resultado são as requests por segundo e a latência (p50/p99) do catálogo.
+"""
+import argparse
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+POPULAR = """
+import app
+app.create_app()
+for i in range({n}):
+    app.db_inserir_carro({{'modelo': f'Miniatura {{i}}', 'marca': ('Hot Wheels', 'Matchbox', 'Maisto')[i % 3],
+                          'ano': '2025-01', 'quantidade_disponivel': 3, 'preco_diaria': 10.0 + i % 40,
+                          'observacoes': '', 'thumbnail_url': '', 'max_reservas': 1}})
+"""
+
+CONFIG_BENCH = """
+exec(open({config!r}).read())
+
+def post_worker_init(worker):
+    # Sheets falso e lento: cada chamada segura a thread/greenlet por LATENCIA segundos
+    import time
+    import app
+    latencia = {latencia!r}
+
+    class PlanilhaLenta:
+        def values_batch_get(self, *args, **kwargs):
+            time.sleep(latencia)
+            raise TimeoutError('Sheets lento (benchmark)')
+
+        def worksheet(self, *args, **kwargs):
+            time.sleep(latencia)
+            raise TimeoutError('Sheets lento (benchmark)')
+
+    app.sheet = PlanilhaLenta()
+"""
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def esperar_servidor(url, processo, limite=30):
+    fim = time.time() + limite
+    while time.time() < fim:
+        if processo.poll() is not None:
+            raise RuntimeError('gunicorn terminou antes de responder')
+        try:
+            if requests.get(url + '/health', timeout=1).ok:
+                return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn não respondeu a tempo')
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def carga(url, cookies, args):
+    latencias = []
+    erros = [0]
+    lentas = [0]
+    fim = time.time() + args.duracao
+    lock = threading.Lock()
+
+    def navegar():
+        sessao = requests.Session()
+        sessao.cookies.update(cookies)
+        while time.time() < fim:
+            inicio = time.perf_counter()
+            try:
+                ok = sessao.get(f"{url}/home?pagina={random.randint(1, 10)}", timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            with lock:
+                if ok:
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                else:
+                    erros[0] += 1
+
+    def sincronizar():
+        sessao = requests.Session()
+        sessao.cookies.update(cookies)
+        while time.time() < fim:
+            try:
+                sessao.get(f"{url}/admin/sync_sheets", timeout=60)
+                with lock:
+                    lentas[0] += 1
+            except requests.RequestException:
+                pass
+
+    threads = [threading.Thread(target=navegar) for _ in range(args.clientes)]
+    threads += [threading.Thread(target=sincronizar) for _ in range(args.lentos)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencias, erros[0], lentas[0]
+
+
+def rodar_modo(modo, args, diretorio, env_base):
+    porta = porta_livre()
+    url = f"http://127.0.0.1:{porta}"
+    config = os.path.join(diretorio, f'gunicorn_{modo}.conf.py')
+    with open(config, 'w') as f:
+        f.write(CONFIG_BENCH.format(config=os.path.join(RAIZ, 'gunicorn.conf.py'), latencia=args.latencia_sheets))
+    env = dict(env_base, WORKER_MODE=modo, PORT=str(porta), WEB_CONCURRENCY=str(args.workers))
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', config, 'app:create_app()'],
+        cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        esperar_servidor(url, processo)
+        login = requests.post(f"{url}/login", data={'email': 'admin@jgminis.com.br', 'senha': 'admin123'}, allow_redirects=False)
+        latencias, erros, lentas = carga(url, login.cookies, args)
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+    return {
+        'rps': len(latencias) / args.duracao,
+        'p50': statistics.median(latencias) if latencias else float('nan'),
+        'p99': percentil(latencias, 99) if latencias else float('nan'),
+        'erros': erros,
+        'syncs': lentas
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modos', default='sync,gthread')
+    parser.add_argument('--duracao', type=float, default=10)
+    parser.add_argument('--clientes', type=int, default=16)
+    parser.add_argument('--lentos', type=int, default=2)
+    parser.add_argument('--latencia-sheets', type=float, default=2.0)
+    parser.add_argument('--carros', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix='jgminis-bench-')
+    env = dict(os.environ)
+    env.pop('GOOGLE_CREDENTIALS_JSON', None)
+    env['DATABASE_PATH'] = os.path.join(diretorio, 'bench.db')
+    env['SHEETS_REFRESH_INTERVAL'] = '0'
+    subprocess.run([sys.executable, '-c', POPULAR.format(n=args.carros)], cwd=RAIZ, env=env, check=True, capture_output=True)
+
+    print(f"{args.workers} workers, {args.clientes} clientes no catálogo, {args.lentos} em /admin/sync_sheets "
+          f"(Sheets com {args.latencia_sheets}s por chamada), {args.duracao:.0f}s por modo")
+    print(f"{'modo':<8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>9} {'erros':>6} {'syncs':>6}")
+    for modo in args.modos.split(','):
+        r = rodar_modo(modo, args, diretorio, env)
+        print(f"{modo:<8} {r['rps']:>8.1f} {r['p50']:>8.1f} {r['p99']:>9.1f} {r['erros']:>6} {r['syncs']:>6}")
+
+
+if __name__ == '__main__':
+    main()
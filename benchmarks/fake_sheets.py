@@ -0,0 +1,278 @@
+"""
+Servidor HTTP local que imita a API v4 do Google Sheets, para benchmarks sem quota nem rede.
+
+Uso: python benchmarks/fake_sheets.py [--porta 8765] [--latencia-ms 0] [--taxa-erro 0]
+     [--quota-por-minuto 0] [--carros 100] [--usuarios 10] [--reservas 0]
+
+O app é apontado para ele com SHEETS_API_URL=http://127.0.0.1:8765 e GOOGLE_SHEET_ID=qualquer
+(sem GOOGLE_CREDENTIALS_JSON o cliente usa acesso anônimo). Implementa só o que o app usa:
+metadados da planilha, addSheet/repeatCell/updateSheetProperties, values:batchGet,
+values:batchUpdate e values:append. --latencia-ms atrasa cada chamada; --taxa-erro e
+--quota-por-minuto devolvem 429 RESOURCE_EXHAUSTED como a API real.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as jgminis # noqa: E402
+
+RE_RANGE = re.compile(r"^(?:'((?:[^']|'')+)'|([^!]+))(?:!([A-Z]+)?(\d+)?(?::[A-Z]*\d*)?)?$")
+
+
+def _coluna_para_indice(letras):
+    indice = 0
+    for letra in letras:
+        indice = indice * 26 + ord(letra) - ord('A') + 1
+    return indice - 1
+
+
+def _formatar(valor):
+    # Como o FORMATTED_VALUE da API: tudo volta como texto
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return '' if valor is None else str(valor)
+
+
+class PlanilhaFalsa:
+    def __init__(self, latencia_ms=0, taxa_erro=0.0, quota_por_minuto=0):
+        self.latencia_ms = latencia_ms
+        self.taxa_erro = taxa_erro
+        self.quota_por_minuto = quota_por_minuto
+        self.abas = {} # titulo -> {'id', 'linhas', 'colunas', 'valores'}
+        self.lock = threading.Lock()
+        self.chamadas = {}
+        self.erros_quota = 0
+        self._janela = deque()
+
+    def popular(self, carros=100, usuarios=10, reservas=0):
+        self.abas.clear()
+        senha_hash = jgminis.hash_senha('senha123') # Um hash só: scrypt por usuário custaria segundos
+        self.adicionar_aba('Carros', [jgminis.CARROS_HEADERS] + [[
+            i, '', f'Miniatura {i}', ('Hot Wheels', 'Matchbox', 'Maisto', 'Greenlight')[i % 4],
+            '2025-01', i % 7, 10.0 + i % 50, '', 1
+        ] for i in range(1, carros + 1)])
+        self.adicionar_aba('Usuarios', [jgminis.USUARIOS_HEADERS] + [[
+            i, f'Usuário {i}', f'usuario{i}@example.com', senha_hash, '', '', '2025-01-01 00:00:00', 0
+        ] for i in range(1, usuarios + 1)])
+        self.adicionar_aba('Reservas', [jgminis.RESERVAS_HEADERS] + [[
+            i, 1 + i % max(usuarios, 1), 1 + i % max(carros, 1), '2025-01-01', '10:00:00', '', 'confirmada', ''
+        ] for i in range(1, reservas + 1)])
+
+    def adicionar_aba(self, titulo, valores=None, linhas=1000, colunas=26):
+        aba = {
+            'id': len(self.abas) + 1,
+            'linhas': max(linhas, len(valores or [])),
+            'colunas': colunas,
+            'valores': [[_formatar(v) for v in linha] for linha in (valores or [])]
+        }
+        self.abas[titulo] = aba
+        return aba
+
+    def metadados(self, titulo, aba):
+        return {
+            'sheetId': aba['id'], 'title': titulo, 'index': aba['id'] - 1, 'sheetType': 'GRID',
+            'gridProperties': {'rowCount': aba['linhas'], 'columnCount': aba['colunas']}
+        }
+
+    def _aba_do_range(self, range_):
+        m = RE_RANGE.match(range_)
+        if not m:
+            return None, 0, 0
+        titulo = (m.group(1) or '').replace("''", "'") or m.group(2)
+        coluna = _coluna_para_indice(m.group(3)) if m.group(3) else 0
+        linha = int(m.group(4)) - 1 if m.group(4) else 0
+        return self.abas.get(titulo), linha, coluna
+
+    def ler(self, range_):
+        aba, _, _ = self._aba_do_range(range_)
+        if aba is None:
+            return None
+        valores = [list(linha) for linha in aba['valores']]
+        # A API omite células e linhas vazias no fim
+        for linha in valores:
+            while linha and linha[-1] == '':
+                linha.pop()
+        while valores and not valores[-1]:
+            valores.pop()
+        return valores
+
+    def escrever(self, range_, valores):
+        aba, linha, coluna = self._aba_do_range(range_)
+        if aba is None:
+            return False
+        grade = aba['valores']
+        for i, valores_linha in enumerate(valores):
+            while len(grade) <= linha + i:
+                grade.append([])
+            atual = grade[linha + i]
+            if len(atual) < coluna + len(valores_linha):
+                atual.extend([''] * (coluna + len(valores_linha) - len(atual)))
+            atual[coluna:coluna + len(valores_linha)] = [_formatar(v) for v in valores_linha]
+        aba['linhas'] = max(aba['linhas'], len(grade))
+        return True
+
+    def consumir_quota(self):
+        """True se a chamada deve falhar com 429."""
+        if self.taxa_erro and random.random() < self.taxa_erro:
+            self.erros_quota += 1
+            return True
+        if self.quota_por_minuto:
+            agora = time.time()
+            while self._janela and self._janela[0] < agora - 60:
+                self._janela.popleft()
+            if len(self._janela) >= self.quota_por_minuto:
+                self.erros_quota += 1
+                return True
+            self._janela.append(agora)
+        return False
+
+
+def criar_handler(planilha):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1' # keep-alive, como a API real
+        disable_nagle_algorithm = True # Cabeçalho e corpo saem em writes separados
+
+        def log_message(self, *args):
+            pass
+
+        def _responder(self, status, corpo):
+            dados = json.dumps(corpo).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def _erro(self, status, mensagem, estado):
+            self._responder(status, {'error': {'code': status, 'message': mensagem, 'status': estado}})
+
+        def _corpo(self):
+            tamanho = int(self.headers.get('Content-Length') or 0)
+            return json.loads(self.rfile.read(tamanho) or b'{}')
+
+        def _rota(self, metodo):
+            url = urlparse(self.path)
+            if url.path == '/_stats':
+                return self._responder(200, {'chamadas': planilha.chamadas, 'erros_quota': planilha.erros_quota})
+            caminho = unquote(url.path)
+            m = re.match(r'^/v4/spreadsheets/([^/:]+)(.*)$', caminho)
+            if not m:
+                return self._erro(404, 'Not found', 'NOT_FOUND')
+            resto = m.group(2)
+            operacao = f"{metodo} {re.sub(r'/values/[^:]+', '/values/<range>', resto) or '/'}"
+            corpo = self._corpo() if metodo == 'POST' else {}
+            if planilha.latencia_ms:
+                time.sleep(planilha.latencia_ms / 1000)
+            with planilha.lock:
+                planilha.chamadas[operacao] = planilha.chamadas.get(operacao, 0) + 1
+                if planilha.consumir_quota():
+                    return self._erro(429, "Quota exceeded for quota metric 'Read requests'", 'RESOURCE_EXHAUSTED')
+                return self._executar(m.group(1), metodo, resto, parse_qs(url.query), corpo)
+
+        def _executar(self, planilha_id, metodo, resto, params, corpo):
+            if metodo == 'GET' and resto == '':
+                return self._responder(200, {
+                    'spreadsheetId': planilha_id,
+                    'properties': {'title': 'JG Minis (fake)', 'locale': 'pt_BR', 'timeZone': 'America/Sao_Paulo'},
+                    'sheets': [{'properties': planilha.metadados(t, a)} for t, a in planilha.abas.items()]
+                })
+            if metodo == 'GET' and resto == '/values:batchGet':
+                ranges = params.get('ranges', [])
+                value_ranges = []
+                for range_ in ranges:
+                    valores = planilha.ler(range_)
+                    if valores is None:
+                        return self._erro(400, f'Unable to parse range: {range_}', 'INVALID_ARGUMENT')
+                    value_ranges.append({'range': range_, 'majorDimension': 'ROWS', 'values': valores})
+                return self._responder(200, {'spreadsheetId': planilha_id, 'valueRanges': value_ranges})
+            if metodo == 'GET' and resto.startswith('/values/'):
+                valores = planilha.ler(resto[len('/values/'):])
+                if valores is None:
+                    return self._erro(400, 'Unable to parse range', 'INVALID_ARGUMENT')
+                return self._responder(200, {'range': resto, 'majorDimension': 'ROWS', 'values': valores})
+            if metodo == 'POST' and resto == '/values:batchUpdate':
+                total = 0
+                for item in corpo.get('data', []):
+                    if not planilha.escrever(item['range'], item.get('values', [])):
+                        return self._erro(400, f"Unable to parse range: {item['range']}", 'INVALID_ARGUMENT')
+                    total += sum(len(linha) for linha in item.get('values', []))
+                return self._responder(200, {'spreadsheetId': planilha_id, 'totalUpdatedCells': total})
+            if metodo == 'POST' and resto.startswith('/values/') and resto.endswith(':append'):
+                range_ = resto[len('/values/'):-len(':append')]
+                aba, _, _ = planilha._aba_do_range(range_)
+                if aba is None:
+                    return self._erro(400, 'Unable to parse range', 'INVALID_ARGUMENT')
+                titulo = next(t for t, a in planilha.abas.items() if a is aba)
+                proxima = len(planilha.ler(f"'{titulo}'") or []) + 1
+                planilha.escrever(f"'{titulo}'!A{proxima}", corpo.get('values', []))
+                return self._responder(200, {'spreadsheetId': planilha_id, 'updates': {'updatedRange': f"'{titulo}'!A{proxima}"}})
+            if metodo == 'POST' and resto == ':batchUpdate':
+                return self._responder(200, {'spreadsheetId': planilha_id, 'replies': [self._requisicao(r) for r in corpo.get('requests', [])]})
+            return self._erro(404, 'Not found', 'NOT_FOUND')
+
+        def _requisicao(self, requisicao):
+            if 'addSheet' in requisicao:
+                props = requisicao['addSheet']['properties']
+                grade = props.get('gridProperties', {})
+                aba = planilha.adicionar_aba(props['title'], linhas=grade.get('rowCount', 1000), colunas=grade.get('columnCount', 26))
+                return {'addSheet': {'properties': planilha.metadados(props['title'], aba)}}
+            if 'updateSheetProperties' in requisicao:
+                props = requisicao['updateSheetProperties']['properties']
+                for aba in planilha.abas.values():
+                    if aba['id'] == props.get('sheetId'):
+                        aba['linhas'] = props.get('gridProperties', {}).get('rowCount', aba['linhas'])
+                        aba['colunas'] = props.get('gridProperties', {}).get('columnCount', aba['colunas'])
+            return {} # repeatCell (formatação) e demais pedidos não mudam os valores
+
+        def do_GET(self):
+            self._rota('GET')
+
+        def do_POST(self):
+            self._rota('POST')
+
+    return Handler
+
+
+def iniciar(porta=0, latencia_ms=0, taxa_erro=0.0, quota_por_minuto=0, carros=100, usuarios=10, reservas=0):
+    """Sobe o servidor em uma thread daemon. Retorna (servidor, planilha, url)."""
+    planilha = PlanilhaFalsa(latencia_ms, taxa_erro, quota_por_minuto)
+    planilha.popular(carros, usuarios, reservas)
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), criar_handler(planilha))
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name='fake-sheets', daemon=True).start()
+    return servidor, planilha, f"http://127.0.0.1:{servidor.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--latencia-ms', type=float, default=0)
+    parser.add_argument('--taxa-erro', type=float, default=0.0)
+    parser.add_argument('--quota-por-minuto', type=int, default=0)
+    parser.add_argument('--carros', type=int, default=100)
+    parser.add_argument('--usuarios', type=int, default=10)
+    parser.add_argument('--reservas', type=int, default=0)
+    args = parser.parse_args()
+
+    servidor, _, url = iniciar(args.porta, args.latencia_ms, args.taxa_erro, args.quota_por_minuto,
+                               args.carros, args.usuarios, args.reservas)
+    print(f"Sheets falso em {url} (SHEETS_API_URL={url} GOOGLE_SHEET_ID=fake). Ctrl+C para sair.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
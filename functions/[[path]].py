@@ -1,84 +1,257 @@
-import json
-from flask import Flask, request, Response
-from io import BytesIO
-from werkzeug.wrappers import Request as WerkRequest
-
-# Seu Flask app (cole todo o código do app.py original aqui)
-app = Flask(__name__)
-app.secret_key = 'jgminis_v4_secret_2025'  # SECRET_KEY
-
-# Cole aqui TODAS as suas rotas do app.py original
-# Exemplo (substitua pela sua lógica completa):
-@app.route('/', methods=['GET'])
-def home():
-    return "JG MINIS v4.2 - Bem-vindo! <a href='/login'>Login</a> <a href='/register'>Register</a>"
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    # Sua lógica de login (email, senha, BD)
-    if request.method == 'POST':
-        # Exemplo: if email == 'admin@jgminis.com.br' and senha == 'admin123': return redirect('/admin')
-        return "Login realizado!"
-    return "Página de login"  # Seu template HTML
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    # Sua lógica de registro (nome, email, phone, senha, hash bcrypt)
-    if request.method == 'POST':
-        # Exemplo: save to DB, flash "Registrado!"
-        return "Usuário registrado!"
-    return "Página de registro"  # Seu form HTML
-
-@app.route('/admin', methods=['GET'])
-def admin():
-    # Sua lógica de admin (lista usuários/reservas)
-    return "Painel Admin"
-
-@app.route('/reservar', methods=['GET', 'POST'])
-def reservar():
-    # Sua lógica de reserva (Sheets backup, email)
-    if request.method == 'POST':
-        # Exemplo: save to Sheets, "Reserva realizada!"
-        return "Reserva OK!"
-    return "Página de reserva"
-
-# Adicione TODAS as outras rotas do seu app.py (@app.route('/index'), /backup, etc.)
-# ... (cole o resto aqui, incluindo imports como from flask_bcrypt import Bcrypt, gspread, etc.)
-
-# Adaptador para Cloudflare Pages Functions (converte request para Flask)
-async def fetch(request, env, ctx):
+"""
+Adaptador de edge/serverless: serve o app completo de app.py por uma ponte WSGI.
+
+Cada isolate importa o app uma vez (início a frio) e mantém entre as invocações o cache do
+catálogo em memória, o cliente do Sheets e a conexão SQLite da thread. GETs das rotas de
+catálogo (ROTAS_SNAPSHOT) de usuários logados são respondidos direto do cache de páginas do
+app, sem passar pelo Flask, enquanto as versões das tabelas (cache_versao) não mudarem; o
+snapshot é pré-gerado no início a frio. Não há threads no edge: fila de envio ao Sheets,
+refresh e expiração de reservas rodam a cada EDGE_MANUTENCAO_INTERVALO segundos, dentro de
+uma invocação.
+
+Entradas: on_fetch(request, env, ctx) (Python Workers) e a classe Default, quando o módulo
+`workers` existe. Fora do edge, on_fetch aceita qualquer objeto com method, url, headers e
+bytes()/arrayBuffer() e devolve um dict {'status', 'headers', 'body'} (ver
+benchmarks/bench_edge.py, que também mede o custo a frio).
+"""
+import io
+import os
+import sys
+import time
+from urllib.parse import parse_qsl, unquote_to_bytes, urlsplit
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from workers import Response as RespostaEdge, WorkerEntrypoint
+except ImportError: # Fora do runtime do Cloudflare (harness local)
+    RespostaEdge = WorkerEntrypoint = None
+
+ROTAS_SNAPSHOT = ('home', 'api_carros') # Endpoints servidos do snapshot
+EDGE_MANUTENCAO_INTERVALO = float(os.getenv('EDGE_MANUTENCAO_INTERVALO', '30'))
+EDGE_SNAPSHOT = os.getenv('EDGE_SNAPSHOT', '1') == '1'
+
+# Estado do isolate: sobrevive entre invocações enquanto o runtime reaproveitar o módulo
+_isolate = {
+    'jg': None,
+    'iniciado_em': None,
+    'frio_ms': {},
+    'invocacoes': 0,
+    'snapshot_hits': 0,
+    'ultima_manutencao': 0.0,
+}
+
+
+def _aplicar_env(env):
+    # Variáveis e secrets do edge chegam em `env`, não no ambiente do processo
+    if env is None:
+        return
+    for nome in dir(env):
+        valor = getattr(env, nome, None)
+        if nome.isupper() and isinstance(valor, str):
+            os.environ.setdefault(nome, valor)
+
+
+def _app_aquecido(env):
+    """Módulo app.py pronto para uso; no início a frio importa, inicializa e pré-gera o snapshot."""
+    if _isolate['jg'] is not None:
+        return _isolate['jg']
+    frio = {}
+    inicio = time.perf_counter()
+    _aplicar_env(env)
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    import app as jg
+    frio['import'] = round((time.perf_counter() - inicio) * 1000, 1)
+    t0 = time.perf_counter()
+    jg.create_app(tarefas_em_background=False)
+    frio['create_app'] = round((time.perf_counter() - t0) * 1000, 1)
+    t0 = time.perf_counter()
+    _manutencao(jg) # Catálogo vazio no isolate novo: lê o Sheets antes do snapshot
+    frio['manutencao'] = round((time.perf_counter() - t0) * 1000, 1)
+    t0 = time.perf_counter()
+    if EDGE_SNAPSHOT:
+        _gerar_snapshot(jg)
+    frio['snapshot'] = round((time.perf_counter() - t0) * 1000, 1)
+    frio['total'] = round((time.perf_counter() - inicio) * 1000, 1)
+    _isolate.update(jg=jg, iniciado_em=time.time(), frio_ms=frio)
+    jg.log('INFO', f"Isolate de edge iniciado a frio em {frio['total']} ms ({frio}).")
+    return jg
+
+
+def _manutencao(jg):
+    # O que as threads de background fazem no gunicorn, aqui no máximo uma vez por intervalo
+    _isolate['ultima_manutencao'] = time.time()
+    for nome, tarefa in (
+        ('expiração de reservas', jg.expirar_reservas_vencidas),
+        ('fila de envio ao Sheets', jg.flush_sync_queue),
+        ('refresh do Sheets', lambda: jg._sheets_refresh_loop(uma_vez=True)),
+    ):
+        try:
+            tarefa()
+        except Exception as e:
+            jg.log('ERROR', f"Erro na manutenção do edge ({nome}): {e}.")
+
+
+def _gerar_snapshot(jg):
+    # Primeira página padrão de cada rota de catálogo, para usuário comum e admin
+    serializador = jg.app.session_interface.get_signing_serializer(jg.app)
+    for is_admin in (False, True):
+        cookie = serializador.dumps({'logged_in': True, 'is_admin': is_admin})
+        cabecalhos = [('Cookie', f"{jg.app.config['SESSION_COOKIE_NAME']}={cookie}")]
+        for endpoint in ROTAS_SNAPSHOT:
+            with jg.app.test_request_context():
+                caminho = jg.url_for(endpoint)
+            _chamar_wsgi(jg.app, _environ('GET', f'https://localhost{caminho}', cabecalhos, b''))
+
+
+def _environ(metodo, url, cabecalhos, corpo):
+    partes = urlsplit(url)
+    https = partes.scheme == 'https'
+    environ = {
+        'REQUEST_METHOD': metodo,
+        'SCRIPT_NAME': '',
+        # PEP 3333: bytes do caminho decodificados como latin-1
+        'PATH_INFO': unquote_to_bytes(partes.path or '/').decode('latin-1'),
+        'QUERY_STRING': partes.query,
+        'SERVER_NAME': partes.hostname or 'localhost',
+        'SERVER_PORT': str(partes.port or (443 if https else 80)),
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '',
+        'CONTENT_LENGTH': str(len(corpo)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': partes.scheme or 'https',
+        'wsgi.input': io.BytesIO(corpo),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for nome, valor in cabecalhos:
+        chave = nome.upper().replace('-', '_')
+        if chave == 'CONTENT_LENGTH':
+            continue
+        if chave == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = valor
+            continue
+        chave = 'HTTP_' + chave
+        if chave == 'HTTP_X_FORWARDED_FOR':
+            environ['REMOTE_ADDR'] = valor.split(',')[0].strip()
+        if chave in environ:
+            environ[chave] += ('; ' if chave == 'HTTP_COOKIE' else ', ') + valor
+        else:
+            environ[chave] = valor
+    return environ
+
+
+def _chamar_wsgi(wsgi_app, environ):
+    """Executa o app WSGI e devolve (status, cabeçalhos, corpo), consumindo respostas em streaming."""
+    estado = {}
+    corpo = []
+
+    def start_response(status, cabecalhos, exc_info=None):
+        if exc_info and estado:
+            raise exc_info[1].with_traceback(exc_info[2])
+        estado['status'] = int(status.split(' ', 1)[0])
+        estado['cabecalhos'] = list(cabecalhos)
+        return corpo.append
+
+    resultado = wsgi_app(environ, start_response)
+    try:
+        for parte in resultado:
+            if parte:
+                corpo.append(parte)
+    finally:
+        if hasattr(resultado, 'close'):
+            resultado.close()
+    return estado['status'], estado['cabecalhos'], b''.join(corpo)
+
+
+def _resposta_do_snapshot(jg, metodo, url, cabecalhos):
+    """Resposta pronta para GETs de catálogo com os dados atuais, ou None para seguir pelo Flask."""
+    if metodo != 'GET':
+        return None
+    partes = urlsplit(url)
+    try:
+        endpoint, _ = jg.app.url_map.bind(partes.hostname or 'localhost').match(partes.path or '/', 'GET')
+    except Exception: # 404, 405, redirects: o Flask responde
+        return None
+    if endpoint not in ROTAS_SNAPSHOT:
+        return None
+    cabecalhos = {nome.lower(): valor for nome, valor in cabecalhos}
+    sessao = jg.app.session_interface.open_session(jg.app, jg.app.request_class({'HTTP_COOKIE': cabecalhos.get('cookie', '')}))
+    if not sessao or not sessao.get('logged_in') or '_flashes' in sessao:
+        return None # Mensagens flash pendentes: a página é renderizada pelo Flask
+    jg.verificar_cache() # Mesmo passo do before_request: pega alterações de outros processos
+    pagina = jg.pagina_do_cache(endpoint, partes.path, parse_qsl(partes.query, keep_blank_values=True), sessao.get('is_admin'))
+    if pagina is None:
+        return None
+    corpo, mimetype, etag = pagina
+    comuns = [('ETag', f'"{etag}"'), ('Cache-Control', 'private, no-cache'), ('Vary', 'Cookie')]
+    if f'"{etag}"' in cabecalhos.get('if-none-match', ''):
+        return 304, comuns, b''
+    tipo = f'{mimetype}; charset=utf-8' if mimetype.startswith('text/') else mimetype
+    return 200, [('Content-Type', tipo), ('Content-Length', str(len(corpo)))] + comuns, corpo
+
+
+async def _ler_requisicao(request):
+    metodo = str(request.method).upper()
+    url = str(request.url)
+    cabecalhos = request.headers.items() if hasattr(request.headers, 'items') else request.headers
+    cabecalhos = [(str(nome), str(valor)) for nome, valor in cabecalhos]
+    corpo = b''
+    if metodo not in ('GET', 'HEAD'):
+        if hasattr(request, 'bytes'):
+            corpo = await request.bytes()
+        else:
+            corpo = await request.arrayBuffer()
+        corpo = corpo.to_bytes() if hasattr(corpo, 'to_bytes') else bytes(corpo)
+    return metodo, url, cabecalhos, corpo
+
+
+def _montar_resposta(status, cabecalhos, corpo):
+    if RespostaEdge is not None:
+        return RespostaEdge(corpo, status=status, headers=cabecalhos)
+    return {'status': status, 'headers': cabecalhos, 'body': corpo}
+
+
+async def on_fetch(request, env=None, ctx=None):
+    inicio = time.perf_counter()
+    frio = _isolate['jg'] is None
+    jg = _app_aquecido(env)
+    _isolate['invocacoes'] += 1
     try:
-        # Cria WerkRequest para Flask
-        body = await request.arrayBuffer()
-        flask_request = WerkRequest(
-            environ={
-                'REQUEST_METHOD': request.method,
-                'PATH_INFO': request.url.pathname,
-                'QUERY_STRING': request.url.search[1:] if request.url.search else '',
-                'CONTENT_TYPE': request.headers.get('Content-Type', ''),
-                'CONTENT_LENGTH': str(len(body)),
-                'wsgi.input': BytesIO(body),
-                'SERVER_NAME': 'pages.dev',
-                'SERVER_PORT': '443',
-            },
-            charset='utf-8'
-        )
-
-        # Despacha para Flask
-        response = app.test_request_context(flask_request.path, method=flask_request.method, data=body).application_response(flask_request)
-
-        # Retorna Response do Pages
-        return Response(
-            content=response.get_data(),
-            status=response.status_code,
-            headers=dict(response.headers)
-        )
+        if time.time() - _isolate['ultima_manutencao'] >= EDGE_MANUTENCAO_INTERVALO:
+            _manutencao(jg)
+        metodo, url, cabecalhos, corpo = await _ler_requisicao(request)
+        resposta = _resposta_do_snapshot(jg, metodo, url, cabecalhos) if EDGE_SNAPSHOT else None
+        origem = 'snapshot'
+        if resposta is None:
+            origem = 'wsgi'
+            resposta = _chamar_wsgi(jg.app, _environ(metodo, url, cabecalhos, corpo))
+        else:
+            _isolate['snapshot_hits'] += 1
+        status, cabecalhos_resposta, corpo_resposta = resposta
     except Exception as e:
-        return Response(f"Erro interno: {str(e)}", status=500)
-
-# Export para Wrangler/Pages (resolve "no routes")
-export default {
-    async fetch(request, env, ctx) {
-        return await fetch(request, env, ctx);
-    },
-};
+        jg.log('ERROR', f"Erro no adaptador de edge: {e}.")
+        status, cabecalhos_resposta, corpo_resposta, origem = 500, [('Content-Type', 'text/plain; charset=utf-8')], b'Erro interno', 'erro'
+    # Custo desta invocação (e do início a frio, se houve) visível no navegador e no harness
+    tempos = [f"{origem};dur={(time.perf_counter() - inicio) * 1000:.2f}"]
+    if frio:
+        tempos.append(f"frio;dur={_isolate['frio_ms']['total']}")
+    cabecalhos_resposta = cabecalhos_resposta + [('Server-Timing', ', '.join(tempos)), ('X-Isolate', 'frio' if frio else 'quente')]
+    return _montar_resposta(status, cabecalhos_resposta, corpo_resposta)
+
+
+# Nome usado pela versão anterior deste arquivo
+fetch = on_fetch
+
+
+def estado_do_isolate():
+    return {chave: valor for chave, valor in _isolate.items() if chave != 'jg'}
+
+
+if WorkerEntrypoint is not None:
+    class Default(WorkerEntrypoint):
+        async def fetch(self, request):
+            return await on_fetch(request, self.env, self.ctx)
@@ -1,3 +1,2 @@
-from [[path]] import handler
-
-export default handler
+# O adaptador de edge fica em [[path]].py (nome de rota catch-all do Cloudflare, que não é
+# importável com `import`); o runtime e benchmarks/bench_edge.py o carregam pelo caminho do arquivo.
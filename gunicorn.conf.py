@@ -0,0 +1,36 @@
+# Configuração do gunicorn (Procfile: gunicorn -c gunicorn.conf.py 'app:create_app()')
+#
+# WORKER_MODE escolhe como cada worker atende requests concorrentes:
+#   gthread (padrão) - N threads por worker; uma chamada lenta ao Sheets (ex.: /admin/sync_sheets)
+#                      ocupa uma thread, não o worker inteiro
+#   gevent           - greenlets com I/O cooperativo (requer `pip install gevent`)
+#   sync             - uma request por vez por worker (modo antigo)
+# O envio/leitura do Sheets em background (fila write-behind e refresh) roda em threads do
+# próprio worker, que no modo gevent viram greenlets.
+import multiprocessing
+import os
+
+WORKER_MODE = os.getenv('WORKER_MODE', 'gthread')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 4)))
+# Os workers herdam o total: o app divide a quota do Sheets por ele (SHEETS_QUOTA_* em app.py)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = 30
+keepalive = 5
+
+if WORKER_MODE == 'gthread':
+    worker_class = 'gthread'
+    threads = int(os.getenv('GUNICORN_THREADS', '8'))
+elif WORKER_MODE == 'gevent':
+    try:
+        import gevent # noqa: F401
+    except ImportError:
+        raise RuntimeError("WORKER_MODE=gevent requer o pacote gevent (pip install gevent).")
+    worker_class = 'gevent'
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+elif WORKER_MODE == 'sync':
+    worker_class = 'sync'
+else:
+    raise RuntimeError(f"WORKER_MODE inválido: {WORKER_MODE!r} (use gthread, gevent ou sync).")
@@ -1,96 +1,68 @@
-import sqlite3
-import bcrypt
-import os
+import sys
+from datetime import datetime
 
-# --- Configurações do Banco de Dados ---
-DATABASE_FILE = 'database.db'
-
-# --- Função para HASH de Senha ---
-def hash_password(password):
-    """Gera um hash bcrypt para a senha fornecida."""
-    # bcrypt.hashpw espera bytes para a senha e o salt
-    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-    return hashed.decode('utf-8') # Decodifica para string para armazenar no DB
+import app
 
 # --- Usuários Padrão ---
 DEFAULT_USERS = [
-    {'email': 'admin@jgminis.com.br', 'password': 'admin123', 'name': 'Admin'},
-    {'email': 'usuario@example.com', 'password': 'usuario123', 'name': 'Usuário Teste'}
+    {'email': 'admin@jgminis.com.br', 'password': 'admin123', 'name': 'Admin', 'is_admin': 1},
+    {'email': 'usuario@example.com', 'password': 'usuario123', 'name': 'Usuário Teste', 'is_admin': 0}
 ]
 
 # --- Script de Limpeza e Recriação de Usuários ---
 def reset_users_database():
     """
-    Conecta ao banco de dados, limpa a tabela de usuários,
-    e recria os usuários padrão com senhas hasheadas corretamente.
+    Limpa a tabela 'usuarios' do DB do app (DATABASE_PATH) e recria os usuários padrão,
+    com o mesmo hash de senha usado no login. O esquema é o das migrações do app, e a
+    alteração é propagada aos workers (cache_versao) e à planilha (fila de sincronização).
+    Usuários com reservas são mantidos, para as reservas não ficarem sem dono.
     """
-    conn = None
+    app.init_db() # Aplica migrações pendentes (inclusive a da antiga tabela 'usuario')
+    # Hashes calculados antes da transação: o scrypt não segura o lock de escrita do DB
+    senhas = {user_data['email']: app.hash_senha(user_data['password']) for user_data in DEFAULT_USERS}
+    conn = app.get_db_connection()
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-
-        print(f"Conectado ao banco de dados: {DATABASE_FILE}")
-
-        # 1. Limpa os usuários antigos do banco (exclui a tabela e recria)
-        print("Excluindo tabela 'usuario' existente (se houver)...")
-        cursor.execute("DROP TABLE IF EXISTS usuario")
-        print("Tabela 'usuario' excluída.")
-
-        # 2. Recria a tabela 'usuario'
-        print("Recriando tabela 'usuario'...")
-        cursor.execute("""
-            CREATE TABLE usuario (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                senha TEXT NOT NULL,
-                nome TEXT NOT NULL
-            )
-        """)
-        print("Tabela 'usuario' recriada.")
+        print(f"Conectado ao banco de dados: {app.DATABASE_PATH}")
+        with conn:
+            print("Excluindo usuários existentes...")
+            cursor = conn.execute("DELETE FROM usuarios WHERE id NOT IN (SELECT usuario_id FROM reservas)")
+            mantidos = conn.execute("SELECT COUNT(*) FROM usuarios").fetchone()[0]
+            print(f"  - {cursor.rowcount} excluídos; {mantidos} mantidos por terem reservas.")
 
-        # 3. Insere os usuários novamente com hash correto
-        print("Inserindo usuários padrão com senhas hasheadas...")
-        for user_data in DEFAULT_USERS:
-            hashed_pw = hash_password(user_data['password'])
-            cursor.execute(
-                "INSERT INTO usuario (email, senha, nome) VALUES (?, ?, ?)",
-                (user_data['email'], hashed_pw, user_data['name'])
-            )
-            print(f"  - Usuário '{user_data['email']}' inserido.")
+            print("Inserindo usuários padrão...")
+            agora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            for user_data in DEFAULT_USERS:
+                conn.execute(
+                    "INSERT INTO usuarios (nome, email, senha_hash, data_cadastro, is_admin) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (email) DO UPDATE SET nome = excluded.nome, senha_hash = excluded.senha_hash, "
+                    "is_admin = excluded.is_admin",
+                    (user_data['name'], user_data['email'], senhas[user_data['email']], agora, user_data['is_admin'])
+                )
+                print(f"  - Usuário '{user_data['email']}' recriado.")
 
-        conn.commit()
+            app.enqueue_sync('Usuarios', 'reset', conn=conn)
+            app._incrementar_versao(conn, 'usuarios')
         print("Operação concluída com sucesso! Usuários padrão recriados.")
-
-    except sqlite3.Error as e:
+        return True
+    except app.sqlite3.Error as e:
         print(f"Erro no banco de dados: {e}")
-        if conn:
-            conn.rollback()
+        return False
     finally:
-        if conn:
-            conn.close()
-            print("Conexão com o banco de dados fechada.")
+        app.liberar_conexao(conn)
 
 # --- Execução do Script ---
 if __name__ == "__main__":
     print("Iniciando script de reset de usuários...")
-    reset_users_database()
+    if not reset_users_database():
+        sys.exit(1)
     print("\nVerificação de login (apenas para teste local):")
-    
-    # Teste de login (apenas para verificar se o hash funciona)
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT email, senha FROM usuario WHERE email = ?", ('admin@jgminis.com.br',))
-    user_data = cursor.fetchone()
-    conn.close()
 
-    if user_data:
-        stored_email, stored_hash_str = user_data
-        test_password = 'admin123'
-        
-        # O hash armazenado é uma string, precisa ser encodado para bytes para checkpw
-        if bcrypt.checkpw(test_password.encode('utf-8'), stored_hash_str.encode('utf-8')):
-            print(f"  - Teste de login para '{stored_email}' com senha '{test_password}': SUCESSO!")
-        else:
-            print(f"  - Teste de login para '{stored_email}' com senha '{test_password}': FALHA!")
-    else:
+    # Teste de login com a mesma verificação da rota /login
+    usuario = app.db_buscar_usuario_por_email('admin@jgminis.com.br')
+    test_password = 'admin123'
+    if usuario is None:
         print("  - Usuário 'admin@jgminis.com.br' não encontrado para teste.")
+    elif app.verificar_senha(test_password, usuario['senha_hash']):
+        print(f"  - Teste de login para '{usuario['email']}' com senha '{test_password}': SUCESSO!")
+    else:
+        print(f"  - Teste de login para '{usuario['email']}' com senha '{test_password}': FALHA!")